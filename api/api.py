@@ -2,28 +2,50 @@
 FastAPI wrapper for existing HIV Prevention Backend
 Does NOT backend files - APi endpoints for connecting with Firebase database (backend.py - which includes other existing backend files like llm_planner.py are all connected to this api.py)
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 import sys
 import os
 import json
+import time
+import asyncio
 from typing import Dict, List, Any, Optional
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
 
-# 1. Initialize Firebase (Ensure serviceAccountKey.json is in your api folder)
+# 1. Firebase (Ensure serviceAccountKey.json is in your api folder)
 # You get this file from Firebase Console > Project Settings > Service Accounts
-cred = credentials.Certificate(os.path.join(os.path.dirname(__file__), "serviceAccountKey.json"))
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+# Initialized in startup_event, i.e. inside each worker: gRPC channels must not be created
+# before a pre-fork master forks (api/serve_prefork.py)
+db = None
+
+def init_firestore():
+    """Initialize Firebase once per process and return the Firestore client"""
+    global db
+    if db is None:
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(os.path.join(os.path.dirname(__file__), "serviceAccountKey.json"))
+            firebase_admin.initialize_app(cred)
+        db = firestore.client()
+    return db
 
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import your EXISTING backend
-from backend.backend import HIVPreventionSystem
+from backend.backend import HIVPreventionSystem, history_score
+from backend import plan_model
+from backend.personalization_analysis import StreamingPersonalizationStats
+from backend.metrics import REGISTRY, timed
+from backend.job_queue import FINISHED as JOB_FINISHED, JobQueue, JobWorkerPool
+from backend.warmup import REQUIRED_DEPENDENCIES, warm_up_system
+from backend.memory_profiling import REQUEST_MEMORY, SNAPSHOTS, memory_report, start_tracing, stop_tracing
+from backend.profiling import PROFILE_STORE, SAMPLING_PROFILER, admin_token_valid, profile_request, profile_trigger
+from backend.request_capture import REQUEST_CAPTURE
 
 app = FastAPI(title="HIV Prevention API", version="1.0")
 
@@ -38,27 +60,157 @@ app.add_middleware(
 
 # Initialize your existing backend ONCE
 system = None
+# Durable queue + workers for async assessments (/assess with async_mode, /jobs/{job_id})
+job_queue = None
+job_workers = None
+# Set by startup_event once warm-up has finished (served by /ready)
+readiness = {"ready": False, "dependencies": {}, "warmed_up_at": None}
+
+# Request latency per route (route templates, not raw paths, to keep label cardinality bounded)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "hiv_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge("hiv_http_requests_in_flight", "HTTP requests being handled")
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    arrived_at = time.time()
+    memory_state = REQUEST_MEMORY.start()
+    HTTP_IN_FLIGHT.inc()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_FLIGHT.dec()
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, method=request.method, route=route, status=status
+        )
+        # RSS / peak RSS per request class, and the worker memory budget check
+        REQUEST_MEMORY.finish(f"{request.method} {route}", memory_state)
+        # Opt-in traffic capture (HIV_CAPTURE_PATH): handlers mark the requests to record
+        capture = request.scope.get("state", {}).get("capture")
+        if capture is not None:
+            REQUEST_CAPTURE.record_request(route, arrived_at, time.perf_counter() - started, status, capture)
+
+def _pool_gauge(field):
+    def collect():
+        if not system:
+            return []
+        return [({"pool": stats["name"]}, stats[field]) for stats in system.pool_stats()]
+    return collect
+
+# The pools limit concurrent Gemini calls per worker (clients share one process-wide transport)
+for _field in ("in_use", "idle", "waiting", "utilization"):
+    REGISTRY.gauge(
+        f"hiv_gemini_concurrency_{_field}", f"Gemini concurrency limiter slots: {_field.replace('_', ' ')}", ["pool"]
+    ).set_function(_pool_gauge(_field))
+REGISTRY.gauge(
+    "hiv_scheduler_waiting", "Calls waiting for an LLM slot", ["scheduler", "priority"]
+).set_function(lambda: [
+    ({"scheduler": stats["name"], "priority": priority}, count)
+    for stats in (system.scheduler_stats() if system else []) for priority, count in stats["waiting"].items()
+])
+REGISTRY.gauge("hiv_scheduler_in_use", "LLM slots in use", ["scheduler"]).set_function(
+    lambda: [({"scheduler": stats["name"]}, stats["in_use"]) for stats in (system.scheduler_stats() if system else [])]
+)
+REGISTRY.gauge("hiv_job_queue_jobs", "Async assessment jobs by status", ["status"]).set_function(
+    lambda: [({"status": status}, count) for status, count in job_queue.counts().items()] if job_queue else []
+)
+REGISTRY.gauge("hiv_result_store_entries", "Recent results held for /assess/result").set_function(
+    lambda: [({}, len(system.result_store))] if system else []
+)
 
 @app.on_event("startup")
 def startup_event():
     """Initialize your existing backend system"""
-    global system
+    global system, job_queue, job_workers
+    if os.getenv("HIV_TRACEMALLOC") == "1":
+        start_tracing()
     try:
+        init_firestore()
+        # Under api/serve_prefork.py the model, scorer and bundles were already loaded by the master
+        # (shared copy-on-write); only the per-worker parts (Gemini clients, thread pools) are built here
         system = HIVPreventionSystem()
         print("✅ Backend system initialized successfully")
     except Exception as e:
         print(f"❌ Failed to initialize backend: {e}")
         raise
 
+    job_queue = JobQueue()
+    # Before any job thread exists: warm-up silences the predictor by swapping sys.stdout process-wide.
+    # It runs before uvicorn accepts connections, so the port only opens once the worker is warm.
+    warm_up()
+
+    # Jobs left over from a previous run (queued, or running under an expired lease) are picked up here
+    job_workers = JobWorkerPool(job_queue, run_assessment_job)
+    job_workers.start()
+
+def warm_up():
+    """Warm the backend and probe Firestore/job queue; /ready turns 200 only after this"""
+    samples = int(os.getenv("HIV_WARMUP_SAMPLES", "16"))
+    dependencies = warm_up_system(system, samples=samples) if samples > 0 else {}
+
+    for name, probe in (
+        # One-document read: opens the gRPC channel and checks credentials
+        ("firestore", lambda: db.collection("users").limit(1).get()),
+        ("job_queue", lambda: job_queue.counts()),
+    ):
+        started = time.perf_counter()
+        try:
+            probe()
+            dependencies[name] = {"status": "ok", "seconds": round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            print(f"   ⚠️  {name} probe failed: {e}")
+            dependencies[name] = {"status": "degraded", "error": f"{type(e).__name__}: {e}"}
+
+    readiness["dependencies"] = dependencies
+    readiness["warmed_up_at"] = datetime.now().isoformat()
+    readiness["ready"] = all(
+        dependencies.get(name, {}).get("status", "ok") != "failed" for name in REQUIRED_DEPENDENCIES
+    )
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if job_workers:
+        job_workers.stop()
+    # Buffered translation memory recency/hit counts
+    if system is not None and system.translation_memory is not None:
+        system.translation_memory.flush()
+
+def run_assessment_job(payload: Dict) -> Dict:
+    """Job handler for async /assess requests"""
+    return system.process_user(payload["data"], clinic_id=payload.get("clinic_id"))
+
+class PlanJSONResponse(JSONResponse):
+    """Serializes results (including plan overlays) directly, skipping FastAPI's jsonable_encoder copy"""
+    def render(self, content: Any) -> bytes:
+        return plan_model.dumps(
+            content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
 # Pydantic models for request/response
 class UserInput(BaseModel):
     """Matches your existing user_input format"""
     data: Dict[str, Any]
     preferred_language: Optional[str] = "en"
     preferred_culture: Optional[str] = "English-speaking"
+    # Optional latency budget. If the Gemini plan misses it, a provisional rule-based plan is returned
+    # and the final plan can be fetched later from /assess/result/{result_id}
+    latency_budget_ms: Optional[int] = None
+    # Queue the assessment and return a job_id right away (poll GET /jobs/{job_id} for the result)
+    async_mode: bool = False
+    # Clinic submitting the assessment (fair share of Gemini capacity between clinics)
+    clinic_id: Optional[str] = None
 
 class BatchInput(BaseModel):
     users: List[Dict[str, Any]]
+    # Per-pair comparisons are O(n^2); by default only the aggregate analysis is returned
+    include_comparisons: bool = False
+    clinic_id: Optional[str] = None
 
 # API Endpoints
 # Add this endpoint to your api.py
@@ -69,7 +221,8 @@ def login_user(payload: dict):
         code = payload.get("access_code") # e.g., 1234
         
         # Pulls the document from /users/research_user_001
-        user_ref = db.collection("users").document(p_id).get()
+        with timed("firestore_login_read"):
+            user_ref = db.collection("users").document(p_id).get()
         
         if not user_ref.exists:
             raise HTTPException(
@@ -100,17 +253,134 @@ def root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "backend_loaded": system is not None}
+    return {
+        "status": "healthy",
+        "backend_loaded": system is not None,
+        "client_pools": system.pool_stats() if system else [],
+        "schedulers": system.scheduler_stats() if system else [],
+        "load_shedding": system.load_shedding_state() if system else None
+    }
+
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness for load balancers: 200 when warm, 503 if a required dependency is broken.
+    Warm-up runs in the startup event, before the worker accepts connections.
+    """
+    dependencies = readiness["dependencies"]
+    ready = readiness["ready"] and not REQUEST_MEMORY.over_budget
+    if not readiness["ready"]:
+        status = "failed"
+    elif REQUEST_MEMORY.over_budget:
+        status = "over_memory_budget"  # drain this worker (pre-fork workers exit instead, see serve_prefork)
+    elif any(d["status"] == "degraded" for d in dependencies.values()):
+        status = "degraded"
+    else:
+        status = "ready"
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "ready": ready,
+        "status": status,
+        "warmed_up_at": readiness["warmed_up_at"],
+        "dependencies": dependencies
+    })
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint (per-stage latency histograms, counters, pool gauges)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/profiles")
+def list_profiles(request: Request):
+    """Recent request profiles in this worker (newest first)"""
+    require_admin(request)
+    return {"profiles": PROFILE_STORE.list()}
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request):
+    """One request profile: stage timeline and top functions by cumulative time"""
+    require_admin(request)
+    profile = PROFILE_STORE.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found (evicted, or taken by another worker)")
+    return profile
+
+@app.get("/admin/profile/sample")
+def sample_profile(request: Request, seconds: float = 10.0, interval_ms: float = 5.0, idle: bool = False,
+                   format: str = "collapsed"):
+    """
+    Sample every thread of this worker for `seconds` (max 60). format=collapsed returns flamegraph
+    input ("frame;frame;frame count" per line); format=json also returns the sample counts.
+    """
+    require_admin(request)
+    try:
+        result = SAMPLING_PROFILER.run(seconds, interval_ms=interval_ms, idle=idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "json":
+        return result
+    return PlainTextResponse(result["collapsed"] + "\n", headers={"X-Profile-Samples": str(result["samples"])})
+
+@app.get("/admin/shadow")
+def shadow_model_status(request: Request):
+    """Candidate vs serving model on this worker's live traffic (HIV_SHADOW_MODEL_PATH)"""
+    require_admin(request)
+    shadow = system.risk_predictor.shadow if system else None
+    if shadow is None:
+        return {"enabled": False}
+    return dict(shadow.stats(), enabled=True)
+
+@app.get("/admin/memory")
+def memory_status(request: Request):
+    """RSS, peak RSS, budget, per-stage and per-request-class memory accounting for this worker"""
+    require_admin(request)
+    return memory_report()
+
+@app.post("/admin/memory/tracing")
+def memory_tracing(request: Request, enable: bool = True, frames: int = 1):
+    """Start/stop tracemalloc (needed for per-stage accounting and snapshots; slows allocations)"""
+    require_admin(request)
+    if enable:
+        start_tracing(frames)
+    else:
+        stop_tracing()
+    return memory_report()["tracemalloc"]
+
+@app.post("/admin/memory/snapshots")
+def take_memory_snapshot(request: Request, label: Optional[str] = None):
+    require_admin(request)
+    try:
+        return SNAPSHOTS.take(label)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/admin/memory/snapshots")
+def list_memory_snapshots(request: Request):
+    require_admin(request)
+    return {"snapshots": SNAPSHOTS.list()}
+
+@app.get("/admin/memory/diff")
+def diff_memory_snapshots(request: Request, from_id: Optional[str] = None, to_id: Optional[str] = None,
+                          key_type: str = "lineno", limit: int = 25):
+    """Allocation sites that grew between two snapshots (default: the last two)"""
+    require_admin(request)
+    if key_type not in ("lineno", "filename", "traceback"):
+        raise HTTPException(status_code=400, detail="key_type must be lineno, filename or traceback")
+    try:
+        return SNAPSHOTS.diff(from_id, to_id, key_type=key_type, limit=limit)
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 @app.get("/features")
-def get_features():
-    """Get all feature definitions (from your existing JSON)"""
+def get_features(language: str = "en"):
+    """Get all feature definitions (from your existing JSON), localized if a bundle exists for language"""
     try:
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         json_path = os.path.join(base_dir, 'data', 'feature_dictionary.json')
         
         with open(json_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
+        if system and language != "en":
+            data = system.localized_content.localize_feature_dictionary(data, language)
         
         return {
             "feature_definitions": data["feature_definitions"],
@@ -120,36 +390,77 @@ def get_features():
         raise HTTPException(status_code=500, detail=f"Failed to load features: {str(e)}")
 
 @app.get("/schema")
-def get_schema():
-    """Builds the dynamic form for the React Native mobile app"""
+def get_schema(language: str = "en"):
+    """Builds the dynamic form for the React Native mobile app (localized if a bundle exists for language)"""
     try:
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         json_path = os.path.join(base_dir, 'data', 'feature_dictionary.json')
         with open(json_path, 'r', encoding='utf-8') as f:
             data = json.load(f)
+        if system and language != "en":
+            data = system.localized_content.localize_feature_dictionary(data, language)
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load schema: {str(e)}")
     
+def require_admin(request: Request):
+    """Admin endpoints need X-Admin-Token matching HIV_ADMIN_TOKEN (disabled when it is not set)"""
+    if not admin_token_valid(request.headers.get("X-Admin-Token")):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
 @app.post("/assess")
-def assess_risk(user_input: UserInput):
+def assess_risk(user_input: UserInput, request: Request):
     if not system:
         raise HTTPException(status_code=503, detail="Backend not initialized")
+    capture = None
+    if REQUEST_CAPTURE.should_capture():
+        capture = request.state.capture = {"body": REQUEST_CAPTURE.anonymize(user_input.model_dump())}
     try:
         input_data = user_input.data.copy()
+
+        if user_input.async_mode:
+            job_id = job_queue.enqueue({"data": input_data, "clinic_id": user_input.clinic_id})
+            return JSONResponse(status_code=202, content={
+                "success": True,
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/jobs/{job_id}"
+            })
         
+        deadline_seconds = None
+        if user_input.latency_budget_ms is not None:
+            deadline_seconds = max(0, user_input.latency_budget_ms) / 1000.0
+
+        # Opt-in profiling: X-Profile: 1 with the admin token, or sampled (HIV_PROFILE_SAMPLE_RATE)
+        trigger = profile_trigger(request.headers.get("X-Profile"), request.headers.get("X-Admin-Token"))
+        profile = None
         # The error happens here. Let's make it flexible:
-        result = system.process_user(input_data)
+        if trigger:
+            with profile_request("/assess", trigger) as profile:
+                result = system.process_user(input_data, deadline_seconds=deadline_seconds, clinic_id=user_input.clinic_id)
+        else:
+            result = system.process_user(input_data, deadline_seconds=deadline_seconds, clinic_id=user_input.clinic_id)
         
         # If your backend returns a tuple like (risk_results, intervention_plan)
         # but you are getting an error, print it to see what's inside:
         print(f"DEBUG: Result Type: {type(result)}")
         print(f"DEBUG: Backend Result: {result}") 
 
-        return {
+        if capture is not None:
+            capture["risk_stage"] = result["risk_prediction"]["risk_stage"]
+
+        content = {
             "success": True,
+            "degraded": result["system_metadata"].get("degraded", False),
             "result": result  # Send the whole object back to React Native
         }
+        headers = None
+        if profile is not None:
+            headers = {"X-Profile-Id": profile["profile_id"]}
+            # Only the caller who asked gets the profile inline; sampled ones are fetched via /admin/profiles
+            if trigger == "header":
+                content["profile"] = profile
+        return PlanJSONResponse(content, headers=headers)
     except ValueError as ve:
         print(f"UNPACKING ERROR: {str(ve)}")
         # This usually means system.process_user() returned 3 items instead of 2
@@ -158,6 +469,48 @@ def assess_risk(user_input: UserInput):
         print(f"ERROR in /assess: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/assess/result/{result_id}")
+def get_assessment_result(result_id: str):
+    """Latest version of a recent assessment (a provisional plan is replaced once Gemini finishes)"""
+    if not system:
+        raise HTTPException(status_code=503, detail="Backend not initialized")
+    result = system.result_store.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired result_id")
+    return PlanJSONResponse({
+        "success": True,
+        "is_provisional": result["intervention_plan"].get("is_provisional", False),
+        "result": result
+    })
+
+# Longest a GET /jobs/{job_id}?wait=... long-poll may block
+JOB_MAX_WAIT_SECONDS = float(os.getenv("HIV_JOB_MAX_WAIT_S", "30"))
+# How often a long-poll re-reads the job
+JOB_POLL_INTERVAL_SECONDS = 0.25
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Status of an async assessment: queued | running | succeeded (with result) | failed (with error).
+    wait: seconds to long-poll for completion (capped at HIV_JOB_MAX_WAIT_S)
+    """
+    if not job_queue:
+        raise HTTPException(status_code=503, detail="Job queue not initialized")
+    wait = min(max(0.0, wait), JOB_MAX_WAIT_SECONDS)
+    # Reads go to the threadpool (get() can wait on the queue lock while another worker claims a job),
+    # but the long-poll sleeps here: a thread blocked in wait() would hold one of the threadpool
+    # tokens that every sync endpoint (/assess, /save_assessment, ...) shares
+    deadline = time.monotonic() + wait
+    while True:
+        job = await run_in_threadpool(job_queue.get, job_id)
+        remaining = deadline - time.monotonic()
+        if job is None or job["status"] in JOB_FINISHED or remaining <= 0:
+            break
+        await asyncio.sleep(min(JOB_POLL_INTERVAL_SECONDS, remaining))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job_id")
+    return PlanJSONResponse({"success": True, **job})
+
 @app.post("/assess/batch")
 def assess_batch(batch_input: BatchInput):
     """Batch assessment - using your existing backend.batch_process()"""
@@ -166,16 +519,137 @@ def assess_batch(batch_input: BatchInput):
     
     try:
         # Call your EXISTING backend batch method
-        result = system.batch_process(batch_input.users)
+        result = system.batch_process(
+            batch_input.users, include_comparisons=batch_input.include_comparisons, clinic_id=batch_input.clinic_id
+        )
         
-        return {
+        return PlanJSONResponse({
             "success": True,
             "result": result,
             "users_processed": len(batch_input.users)
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Batch assessment failed: {str(e)}")
 
+# Streaming batch limits: users in flight (processing or waiting to be sent) and max bytes per NDJSON line
+STREAM_MAX_IN_FLIGHT = int(os.getenv("HIV_STREAM_MAX_IN_FLIGHT", "16"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("HIV_STREAM_MAX_LINE_BYTES", str(1024 * 1024)))
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves `receive` to the request body reader: the upload is still
+    being read while results stream out (a disconnect surfaces from request.stream() instead)
+    """
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def _read_ndjson_users(request: Request):
+    """Yield (index, user, error) for each line of a (chunked) NDJSON upload, without buffering the body"""
+    buffer = b""
+    index = 0
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > STREAM_MAX_LINE_BYTES:
+            raise ValueError(f"NDJSON line {index} exceeds {STREAM_MAX_LINE_BYTES} bytes")
+        for line in lines:
+            if line.strip():
+                yield (index, *_parse_ndjson_user(line))
+                index += 1
+    if buffer.strip():
+        yield (index, *_parse_ndjson_user(buffer))
+
+def _parse_ndjson_user(line: bytes):
+    """(user, None) or (None, error message) for one NDJSON line"""
+    try:
+        user = json.loads(line)
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
+    if not isinstance(user, dict):
+        return None, "Each line must be a JSON object of answers"
+    return user, None
+
+async def _stream_batch_results(request: Request, clinic_id: Optional[str] = None):
+    """
+    Per-user NDJSON lines in completion order (each carries its input index), then a summary line.
+    At most STREAM_MAX_IN_FLIGHT users are processing or waiting to be sent; the upload is not
+    read further until a slot frees up, so memory does not grow with the batch size.
+    """
+    started = time.monotonic()
+    slots = asyncio.Semaphore(STREAM_MAX_IN_FLIGHT)
+    completed: asyncio.Queue = asyncio.Queue()
+    stats = StreamingPersonalizationStats()
+    upload_errors = []
+
+    async def assess(index, user):
+        try:
+            result = await run_in_threadpool(system.process_user, user, clinic_id=clinic_id)
+            line = {"index": index, "success": True, "result": result}
+        except Exception as e:
+            line = {"index": index, "success": False, "error": str(e)}
+        await completed.put(line)
+
+    async def read_upload():
+        running = set()
+        try:
+            async for index, user, error in _read_ndjson_users(request):
+                await slots.acquire()  # backpressure
+                if error is not None:
+                    await completed.put({"index": index, "success": False, "error": error})
+                    continue
+                task = asyncio.create_task(assess(index, user))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        except Exception as e:
+            upload_errors.append(str(e) or type(e).__name__)
+        if running:
+            await asyncio.gather(*running)
+        await completed.put(None)  # end of results
+
+    reader = asyncio.create_task(read_upload())
+    received = succeeded = 0
+    try:
+        while True:
+            line = await completed.get()
+            if line is None:
+                break
+            received += 1
+            if line["success"]:
+                succeeded += 1
+                stats.add(line["result"])
+            yield plan_model.dumps(line, ensure_ascii=False) + "\n"
+            slots.release()
+
+        summary = {
+            "summary": True,
+            "users_received": received,
+            "users_succeeded": succeeded,
+            "users_failed": received - succeeded,
+            "personalization_analysis": stats.summary(),
+            "elapsed_seconds": round(time.monotonic() - started, 3)
+        }
+        if upload_errors:
+            summary["upload_error"] = upload_errors[0]
+        yield plan_model.dumps(summary, ensure_ascii=False) + "\n"
+    finally:
+        if not reader.done():
+            reader.cancel()
+
+@app.post("/assess/batch/stream")
+async def assess_batch_stream(request: Request, clinic_id: Optional[str] = None):
+    """
+    Streaming batch assessment.
+    Request body: NDJSON, one user's answers per line (chunked uploads are fine).
+    Response: NDJSON, one {"index", "success", "result" | "error"} line per user as it completes,
+    followed by a {"summary": true, ...} line with aggregate personalization statistics.
+    clinic_id (query): clinic submitting the batch, for fair sharing of Gemini capacity
+    """
+    if not system:
+        raise HTTPException(status_code=503, detail="Backend not initialized")
+    return NDJSONStreamingResponse(_stream_batch_results(request, clinic_id))
+
 @app.get("/languages")
 def get_supported_languages():
     """Get supported languages for cultural adaptation"""
@@ -222,15 +696,20 @@ def save_assessment(payload: dict):
         user_id = payload.get("user_id")
         full_result = payload.get("full_result")
         form_data = payload.get("form_data")
+
+        # Clients can send just the result_id of a recent /assess instead of re-uploading the whole result
+        result_id = payload.get("result_id")
+        if not full_result and result_id and system:
+            full_result = system.result_store.get(result_id)
+            if full_result is None:
+                raise HTTPException(status_code=404, detail="Unknown or expired result_id")
         
         if not full_result:
             raise HTTPException(status_code=400, detail="Missing data")
 
         # 1. Map Numeric Score for the Trend Chart
         level_text = full_result["risk_prediction"]["risk_level"]
-        clean_level = level_text.replace(" Risk", "")
-        stage_map = {"Low": 1, "Moderate": 2, "High": 3, "Very High": 4}
-        numeric_score = stage_map.get(clean_level, 1)
+        numeric_score = history_score(level_text)
 
         # 2. Reference the 'history' subcollection
         doc_ref = db.collection("users").document(user_id).collection("history").document()
@@ -256,10 +735,13 @@ def save_assessment(payload: dict):
             "raw_input_data": form_data  # Saves the actual questions/answers
         }
 
-        # 4. Save to Firestore
-        doc_ref.set(clinical_record)
+        # 4. Save to Firestore (plan overlays become plain dicts only here)
+        with timed("firestore_assessment_write"):
+            doc_ref.set(plan_model.to_plain(clinical_record))
         
         return {"success": True, "assessment_id": doc_ref.id}
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Firestore Save Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -269,8 +751,9 @@ def get_history(user_id: str):
     """Retrieves past scores for the line chart with nested field support"""
     try:
         # We must order by the nested metadata timestamp
-        docs = db.collection("users").document(user_id).collection("history")\
-                 .order_by("metadata.timestamp", direction=firestore.Query.ASCENDING).stream()
+        with timed("firestore_history_read"):
+            docs = list(db.collection("users").document(user_id).collection("history")\
+                          .order_by("metadata.timestamp", direction=firestore.Query.ASCENDING).stream())
         
         history = []
         for doc in docs:
@@ -328,7 +811,8 @@ async def update_profile(user_id: str, payload: dict):
             raise HTTPException(status_code=400, detail="No valid data provided to update")
 
         # 4. Perform the update in Firestore
-        user_ref.update(update_data)
+        with timed("firestore_profile_update"):
+            user_ref.update(update_data)
         
         return {
             "success": True, 
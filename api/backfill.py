@@ -0,0 +1,345 @@
+"""
+backfill.py - Re-score stored assessments after a model or scoring-rule change.
+
+Every saved assessment (users/{user_id}/history/{id}) keeps the answers it was scored on in
+raw_input_data and the result in summary.score / summary.risk_level / summary.analysis_strength.
+This job pages through all history documents with a collection-group query (ordered by document
+path, only raw_input_data and summary are fetched), re-scores each page with one vectorized feature
+preparation and one XGBoost call (the same rules as /assess), and updates the documents whose
+summary changed with batched writes (at most 500 per batch) under a write-rate limit. It runs next
+to the API, never inside it, so the request path is not affected.
+
+Progress is checkpointed after every page (last document path + counts, written atomically), so an
+interrupted run resumes where it stopped; a page that failed half-way is simply re-scored, since
+the updates are idempotent. Updated documents get metadata.rescored_at, metadata.rescore_model
+(model file fingerprint) and metadata.previous_summary (the values that were replaced).
+
+--dry-run writes nothing to Firestore: it produces a JSON-lines diff report (one line per document
+that would change or could not be scored) and a summary of risk-level transitions.
+
+Usage (from the project root):
+    python -m api.backfill --dry-run --diff-report rescore_diff.jsonl
+    python -m api.backfill --max-writes-per-second 200 --diff-report rescore_applied.jsonl
+    python -m api.backfill --restart          # ignore the checkpoint and start from the first document
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from backend.backend import HIVRiskPredictor, history_score  # noqa: E402
+
+MODEL_PATH = os.path.join(BASE_DIR, "models", "hiv_risk_model.pkl")
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "data", "cache", "backfill_checkpoint.json")
+MAX_BATCH_WRITES = 500  # Firestore limit per batched write
+SUMMARY_FIELDS = ("score", "risk_level", "analysis_strength")
+
+
+def model_fingerprint(path: str = MODEL_PATH) -> str:
+    """Short content hash of the model file (recorded on rescored documents and in the checkpoint)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class WriteRateLimiter:
+    """
+    Token bucket for document writes. With ramp=True the rate follows Firestore's 500/50/5 guidance
+    for new traffic: start at (at most) 500 writes/s and grow by 50% every 5 minutes up to max_rate.
+    """
+
+    def __init__(self, max_rate: float, ramp: bool = True, start_rate: float = 500.0, ramp_every: float = 300.0):
+        self.max_rate = max_rate
+        self.start_rate = min(start_rate, max_rate) if ramp else max_rate
+        self.ramp_every = ramp_every
+        self._started = time.monotonic()
+        self._available = 0.0
+        self._last = self._started
+        self._lock = threading.Lock()  # shared by the --writers threads
+
+    def rate(self) -> float:
+        steps = int((time.monotonic() - self._started) // self.ramp_every)
+        return min(self.max_rate, self.start_rate * 1.5 ** steps)
+
+    def acquire(self, writes: int) -> None:
+        """Block until `writes` documents may be written"""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                rate = self.rate()
+                # At most one second of burst, but always enough for one full batch
+                self._available = min(max(rate, writes), self._available + (now - self._last) * rate)
+                self._last = now
+                if self._available >= writes:
+                    self._available -= writes
+                    return
+                time.sleep((writes - self._available) / rate)
+
+
+class Checkpoint:
+    """Resume state of a backfill run, saved as JSON after every page"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state: Dict = {}
+
+    def load(self) -> Dict:
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        return self.state
+
+    def save(self, **changes) -> None:
+        self.state.update(changes, updated_at=datetime.now().isoformat())
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        # Atomic: a crash leaves either the previous or the new checkpoint, never half of one
+        os.replace(tmp_path, self.path)
+
+
+def _summary_of(snapshot) -> Dict:
+    summary = snapshot.get("summary") or {}
+    return {field: summary.get(field) for field in SUMMARY_FIELDS}
+
+
+def rescore_page(predictor: HIVRiskPredictor, snapshots: List) -> List[Dict]:
+    """
+    New summary for every document of a page: one feature matrix and one XGBoost call.
+    Returns one dict per snapshot: path, old, new (None if it could not be scored), error, changed.
+    """
+    results = []
+    inputs = []
+    for snapshot in snapshots:
+        raw_input = snapshot.get("raw_input_data")
+        result = {"path": snapshot.reference.path, "old": _summary_of(snapshot), "new": None,
+                  "error": None, "changed": False}
+        if not isinstance(raw_input, dict) or not raw_input:
+            result["error"] = "No raw_input_data"
+            raw_input = None
+        results.append(result)
+        inputs.append(raw_input)
+
+    scorable = [i for i, raw_input in enumerate(inputs) if raw_input is not None]
+    features, errors = predictor._prepare_features_batch([inputs[i] for i in scorable])
+    valid = [row for row, error in enumerate(errors) if error is None]
+    for row, error in enumerate(errors):
+        if error is not None:
+            results[scorable[row]]["error"] = error
+    if not valid:
+        return results
+
+    probabilities = np.asarray(predictor.model.predict_proba(features[valid]), dtype=float)
+    stages = probabilities.argmax(axis=1)
+    for k, row in enumerate(valid):
+        result = results[scorable[row]]
+        stage = int(stages[k])
+        risk_level = HIVRiskPredictor.RISK_DEFINITIONS[stage]["name"]
+        # Same values /save_assessment stores for a fresh /assess result
+        result["new"] = {
+            "score": history_score(risk_level),
+            "risk_level": risk_level,
+            "analysis_strength": f"{probabilities[k, stage] * 100:.1f}%",
+        }
+        result["changed"] = result["new"] != result["old"]
+    return results
+
+
+def commit_updates(db, updates: List[Dict], fingerprint: str, limiter: WriteRateLimiter,
+                   attempts: int = 5) -> None:
+    """One batched write (<= 500 updates), retried with backoff on transient errors"""
+    rescored_at = datetime.now()
+    for attempt in range(attempts):
+        limiter.acquire(len(updates))
+        batch = db.batch()
+        for update in updates:
+            batch.update(db.document(update["path"]), {
+                **{f"summary.{field}": value for field, value in update["new"].items()},
+                "metadata.rescored_at": rescored_at,
+                "metadata.rescore_model": fingerprint,
+                "metadata.previous_summary": update["old"],
+            })
+        try:
+            batch.commit()
+            return
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(30.0, 2 ** attempt)
+            print(f"⚠️  Batch commit failed ({type(e).__name__}: {e}), retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+
+def is_assessment_path(path: str, collection: str) -> bool:
+    """users/{user_id}/{collection}/{id} (a collection group also matches same-named collections elsewhere)"""
+    parts = path.split("/")
+    return len(parts) == 4 and parts[0] == "users" and parts[2] == collection
+
+
+def run(db, predictor: HIVRiskPredictor, checkpoint: Checkpoint, dry_run: bool = False,
+        page_size: int = 500, batch_size: int = MAX_BATCH_WRITES, max_writes_per_second: float = 500.0,
+        ramp: bool = True, writers: int = 1, limit: Optional[int] = None,
+        diff_report: Optional[str] = None, collection: str = "history") -> Dict:
+    """Page through every history document, re-score it and update (or report) the changed ones"""
+    batch_size = max(1, min(batch_size, MAX_BATCH_WRITES))
+    fingerprint = model_fingerprint()
+    state = checkpoint.state
+    counts = Counter(state.get("counts", {}))
+    transitions = Counter(state.get("transitions", {}))
+    cursor = state.get("cursor")
+    if not state:
+        checkpoint.save(started_at=datetime.now().isoformat(), model=fingerprint, dry_run=dry_run,
+                        cursor=None, counts={}, transitions={}, done=False)
+    elif state.get("done"):
+        print(f"✅ Checkpoint {checkpoint.path} is already complete (use --restart to run again)")
+        return state
+    else:
+        print(f"🔁 Resuming after {cursor} ({counts['scanned']} documents already scanned)")
+
+    limiter = WriteRateLimiter(max_writes_per_second, ramp=ramp)
+    report = open(diff_report, "a" if cursor else "w", encoding="utf-8") if diff_report else None
+    pool = ThreadPoolExecutor(max_workers=writers, thread_name_prefix="backfill-writer") if writers > 1 else None
+    started = time.perf_counter()
+    scanned_this_run = 0
+    finished = False
+    try:
+        while limit is None or scanned_this_run < limit:
+            query = db.collection_group(collection).order_by("__name__") \
+                      .select(["raw_input_data", "summary"])
+            if cursor:
+                query = query.start_after(db.document(cursor).get())
+            size = page_size if limit is None else min(page_size, limit - scanned_this_run)
+            snapshots = list(query.limit(size).stream())
+            if not snapshots:
+                finished = True
+                break
+
+            page = [snapshot for snapshot in snapshots if is_assessment_path(snapshot.reference.path, collection)]
+            counts["other_collections"] += len(snapshots) - len(page)
+            results = rescore_page(predictor, page)
+            changed = [result for result in results if result["changed"]]
+            for result in results:
+                if result["error"] is not None:
+                    counts["errors"] += 1
+                elif result["old"]["risk_level"] != result["new"]["risk_level"]:
+                    transitions[f"{result['old']['risk_level']} -> {result['new']['risk_level']}"] += 1
+                elif result["changed"]:
+                    counts["confidence_only"] += 1
+                else:
+                    counts["unchanged"] += 1
+                if report is not None and (result["changed"] or result["error"] is not None):
+                    report.write(json.dumps({key: result[key] for key in ("path", "old", "new", "error")},
+                                            default=str) + "\n")
+
+            if not dry_run and changed:
+                batches = [changed[i:i + batch_size] for i in range(0, len(changed), batch_size)]
+                if pool is None:
+                    for updates in batches:
+                        commit_updates(db, updates, fingerprint, limiter)
+                else:
+                    # All batches of the page must land before the checkpoint moves past it
+                    for future in [pool.submit(commit_updates, db, updates, fingerprint, limiter)
+                                   for updates in batches]:
+                        future.result()
+            counts["changed"] += len(changed)
+            counts["scanned"] += len(snapshots)
+            scanned_this_run += len(snapshots)
+            cursor = snapshots[-1].reference.path
+
+            if report is not None:
+                report.flush()
+            checkpoint.save(cursor=cursor, counts=dict(counts), transitions=dict(transitions))
+            elapsed = time.perf_counter() - started
+            print(f"📄 {counts['scanned']} scanned, {counts['changed']} "
+                  f"{'would change' if dry_run else 'updated'}, {counts['errors']} not scorable "
+                  f"({scanned_this_run / max(elapsed, 1e-9):.0f} docs/s, writes ≤ {limiter.rate():.0f}/s)")
+            if len(snapshots) < size:
+                finished = True
+                break
+        if finished:
+            checkpoint.save(done=True, finished_at=datetime.now().isoformat())
+        return checkpoint.state
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+        if report is not None:
+            report.close()
+
+
+def print_summary(state: Dict, dry_run: bool) -> None:
+    counts = Counter(state.get("counts", {}))
+    print(f"\n{'Dry run' if dry_run else 'Backfill'} ({'complete' if state.get('done') else 'stopped early'}): "
+          f"{counts['scanned']} documents, {counts['changed']} {'would change' if dry_run else 'updated'}, "
+          f"{counts['unchanged']} unchanged, {counts['errors']} not scorable")
+    print(f"   same risk level, new score or confidence: {counts['confidence_only']}")
+    transitions = state.get("transitions", {})
+    if transitions:
+        print("Risk-level changes (old -> new):")
+        for transition, count in sorted(transitions.items(), key=lambda item: -item[1]):
+            print(f"   {transition:<36}{count:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-score stored assessments (users/*/history) with the current model")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change, write nothing to Firestore")
+    parser.add_argument("--diff-report", help="JSON-lines report of changed / unscorable documents")
+    parser.add_argument("--checkpoint", help=f"Resume file (default: {os.path.relpath(CHECKPOINT_PATH, BASE_DIR)}, "
+                                             "a separate one for dry runs)")
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--page-size", type=int, default=500, help="Documents per query page (one XGBoost call)")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_WRITES, help="Updates per batched write (<= 500)")
+    parser.add_argument("--max-writes-per-second", type=float,
+                        default=float(os.getenv("HIV_BACKFILL_MAX_WRITES", "500")))
+    parser.add_argument("--no-ramp", action="store_true", help="Skip the 500/50/5 ramp-up and write at the maximum rate")
+    parser.add_argument("--writers", type=int, default=1, help="Batched writes committed in parallel")
+    parser.add_argument("--limit", type=int, help="Stop after this many documents (this run)")
+    parser.add_argument("--collection", default="history", help="Collection id of the stored assessments")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or (CHECKPOINT_PATH.replace(".json", ".dry_run.json") if args.dry_run
+                                          else CHECKPOINT_PATH)
+    checkpoint = Checkpoint(checkpoint_path)
+    if not args.restart:
+        state = checkpoint.load()
+        if state and not state.get("done") and state.get("model") != model_fingerprint():
+            parser.error(f"{checkpoint_path} was written for model {state.get('model')}, the current model is "
+                         f"{model_fingerprint()}; use --restart so one run does not mix two models")
+        if state and state.get("dry_run", False) != args.dry_run:
+            parser.error(f"{checkpoint_path} belongs to a {'dry' if state.get('dry_run') else 'real'} run")
+
+    from api.api import init_firestore
+    from backend.backend import preload_shared_components
+    db = init_firestore()
+    predictor = preload_shared_components()["risk_predictor"]
+    print(f"🔧 Re-scoring with model {model_fingerprint()}{' (dry run)' if args.dry_run else ''}, "
+          f"checkpoint {checkpoint_path}")
+
+    state = run(db, predictor, checkpoint, dry_run=args.dry_run, page_size=args.page_size,
+                batch_size=args.batch_size, max_writes_per_second=args.max_writes_per_second,
+                ramp=not args.no_ramp, writers=args.writers, limit=args.limit,
+                diff_report=args.diff_report, collection=args.collection)
+    print_summary(state, args.dry_run)
+    if args.diff_report:
+        print(f"📝 Diff report: {args.diff_report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Pre-fork server for the HIV Prevention API.
+
+The master process loads the read-only components (XGBoost model, feature names, clinical scorer,
+localized bundles) once, freezes them out of the garbage collector and forks warm uvicorn workers
+that share one listening socket. Workers share those pages copy-on-write instead of each loading
+its own copy, so memory per extra worker stays small. Firebase, Gemini clients and thread pools are
+still created per worker (in startup_event), since gRPC and threads do not survive fork().
+Recent results (GET /assess/result/{id}, /save_assessment by result_id) and async jobs live in
+SQLite files under data/cache shared by all workers, since a follow-up request can reach any worker
+(results hold health data: see backend/result_store.py for retention and storage).
+
+Usage (from the project root):
+    python -m api.serve_prefork --workers 4 --port 8000
+
+Note: the master must not run predictions before forking (OpenMP thread pools are not fork-safe).
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import uvicorn
+
+from backend.backend import preload_shared_components
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Listening socket created in the master and inherited by every worker"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, args) -> None:
+    """Worker body (runs in the forked child and never returns)"""
+    # Restore default signal handling; uvicorn installs its own graceful-shutdown handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    from api.api import app
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=args.keep_alive)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def preload() -> None:
+    """Load the shared components and move everything allocated so far out of GC tracking"""
+    started = time.time()
+    preload_shared_components()
+    # The app module too, so route tables and pydantic models are shared (this does not start Firebase)
+    import api.api  # noqa: F401
+
+    gc.collect()
+    # Objects that exist now are never scanned by the collector in the children, so GC passes
+    # do not write to (and un-share) their pages
+    gc.freeze()
+    print(f"✅ Master preloaded shared components in {time.time() - started:.1f}s "
+          f"({gc.get_freeze_count()} objects frozen)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Pre-fork uvicorn server with shared model memory")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--keep-alive", type=int, default=5)
+    args = parser.parse_args()
+
+    # Follow-up requests can reach any worker, so recent results go to a shared file instead of
+    # each worker's private in-memory store
+    os.environ.setdefault("HIV_RESULT_STORE_PATH", os.path.join(BASE_DIR, "data", "cache", "results.sqlite3"))
+    # Workers share one socket, so a load balancer cannot drain a single worker that fails /ready:
+    # over its memory budget a worker exits instead and this master forks a fresh one
+    budget_action = os.environ.setdefault("HIV_MEMORY_BUDGET_ACTION", "exit")
+    if budget_action != "exit" and float(os.getenv("HIV_MEMORY_BUDGET_MB", "0")) > 0:
+        print(f"⚠️  HIV_MEMORY_BUDGET_ACTION={budget_action} cannot drain one pre-forked worker "
+              f"(shared socket); over-budget workers will keep serving. Use 'exit' to recycle them.")
+
+    # Keep the garbage collector out of the way while building the shared heap
+    gc.disable()
+    preload()
+    sock = bind_socket(args.host, args.port)
+    gc.enable()
+
+    workers = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, args)
+        workers[pid] = time.time()
+        print(f"🚀 Worker {pid} started")
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"🌐 Serving on http://{args.host}:{args.port} with {args.workers} pre-forked workers")
+    for _ in range(args.workers):
+        spawn()
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"⚠️  Worker {pid} exited (status {status}). Restarting...")
+        if time.time() - started < 1:
+            time.sleep(1)  # avoid a tight crash loop
+        spawn()
+
+    sock.close()
+    print("👋 Pre-fork server stopped")
+
+
+if __name__ == "__main__":
+    main()
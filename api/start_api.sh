@@ -5,4 +5,7 @@
 export PYTHONPATH=$PYTHONPATH:$(pwd)
 
 # Start FastAPI server
-uvicorn api.api:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
+uvicorn api.api:app --host 0.0.0.0 --port 8000 --reload
+
+# Production: pre-fork workers sharing one copy of the model (see api/serve_prefork.py)
+# python -m api.serve_prefork --workers 4 --port 8000
@@ -9,11 +9,26 @@ import pickle
 import json
 import shap
 from datetime import datetime
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 import random
 import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from .llm_planner import LLMInterventionPlanner
 from .plan_adaptor import PlanAdaptor
+from .plan_model import PlanOverlay
+from .result_store import ResultStore
+from .translation_memory import TranslationMemory
+from .client_pool import ClientPool, gemini_health_check
+from .localization import LocalizedContent
+from .personalization_analysis import PersonalizationAnalyzer
+from .batch_lanes import ScoringLane, score_user
+from .metrics import timed
+from .scheduler import PRIORITY_CLASSES, PriorityScheduler, classify_priority
+from .load_shedder import LoadShedder
+from .inference_batcher import InferenceBatcher, configure_model_threads
+from .shadow_model import ShadowEvaluator
 
 # # fallback planner used when GEMINI_API_KEY is not set--> OLD VERSION AND NOT USED ACTUALLY
 # class _FallbackPlanner:
@@ -109,6 +124,46 @@ class PersonalizedInterventionPlanner:
     """Rule-based fallback intervention planner.
     Produces a simple but structured plan compatible with the frontend.
     """
+    # Minimal generic interventions (3 items)
+    CATALOG = [
+        {
+            "id": "GEN_EDU",
+            "name": "HIV Risk Education",
+            "description": "Education on risk factors and safer practices.",
+            "duration_weeks": 2,
+            "intensity": "low",
+            "format": "group_education",
+            "category": "general",
+            "target_features": [],
+            "expected_risk_reduction": 0.10,
+            "evidence_level": "medium",
+        },
+        {
+            "id": "GEN_TEST",
+            "name": "Testing Access Support",
+            "description": "Assistance with finding and scheduling HIV tests.",
+            "duration_weeks": 3,
+            "intensity": "medium",
+            "format": "individual_counseling",
+            "category": "testing",
+            "target_features": [],
+            "expected_risk_reduction": 0.15,
+            "evidence_level": "high",
+        },
+        {
+            "id": "GEN_CONS",
+            "name": "Personal Risk Counseling",
+            "description": "One-on-one counseling to address specific behaviors.",
+            "duration_weeks": 4,
+            "intensity": "high",
+            "format": "individual_counseling",
+            "category": "behavior_change",
+            "target_features": [],
+            "expected_risk_reduction": 0.20,
+            "evidence_level": "high",
+        },
+    ]
+
     def __init__(self):
         pass
 
@@ -116,51 +171,12 @@ class PersonalizedInterventionPlanner:
         risk_stage = risk_prediction["risk_stage"]
         color = risk_prediction.get("color", "#3b82f6")
 
-        # Minimal generic interventions (3 items)
-        catalog = [
-            {
-                "id": "GEN_EDU",
-                "name": "HIV Risk Education",
-                "description": "Education on risk factors and safer practices.",
-                "duration_weeks": 2,
-                "intensity": "low",
-                "format": "group_education",
-                "category": "general",
-                "target_features": [],
-                "expected_risk_reduction": 0.10,
-                "evidence_level": "medium",
-            },
-            {
-                "id": "GEN_TEST",
-                "name": "Testing Access Support",
-                "description": "Assistance with finding and scheduling HIV tests.",
-                "duration_weeks": 3,
-                "intensity": "medium",
-                "format": "individual_counseling",
-                "category": "testing",
-                "target_features": [],
-                "expected_risk_reduction": 0.15,
-                "evidence_level": "high",
-            },
-            {
-                "id": "GEN_CONS",
-                "name": "Personal Risk Counseling",
-                "description": "One-on-one counseling to address specific behaviors.",
-                "duration_weeks": 4,
-                "intensity": "high",
-                "format": "individual_counseling",
-                "category": "behavior_change",
-                "target_features": [],
-                "expected_risk_reduction": 0.20,
-                "evidence_level": "high",
-            },
-        ]
-
         # Simple sequencing (allowing slight overlap for non-high)
         sequenced = [] # Empty list for scheduled interventions
         week = 1 # Start from week 1
-        for item in catalog:
+        for item in self.CATALOG:
             seq = dict(item) # Copy: {"id": "GEN_EDU", "name": "HIV Risk Education", ...}
+            seq["target_features"] = list(item["target_features"]) # Don't share the catalog's list
             seq["start_week"] = week
             seq["end_week"] = week + item["duration_weeks"] - 1 # 1 + 2 - 1 = 2 → end_week = 2
             seq["current_status"] = "pending"  # Not started yet
@@ -223,15 +239,51 @@ class PersonalizedInterventionPlanner:
             "uniqueness_score": 50.0, # hardcoded the personalized score to 50%
         }
 
+
+# Trend-chart score saved with every assessment (users/*/history summary.score)
+HISTORY_SCORES = {"Low": 1, "Moderate": 2, "High": 3, "Very High": 4}
+
+
+def history_score(risk_level: str) -> int:
+    """1-4 history score for a risk level name ("High Risk" -> 3)"""
+    return HISTORY_SCORES.get(risk_level.replace(" Risk", ""), 1)
+
+
 class HIVRiskPredictor:
     """Stage 1: Risk Prediction with XGBoost + Clinical Scoring"""
+
+    # Risk stage definitions
+    RISK_DEFINITIONS = {
+        0: {"name": "Low Risk", "color": "#10B981", "description": "Minimal HIV risk factors present"},
+        1: {"name": "Moderate Risk", "color": "#F59E0B", "description": "Some concerning behaviors identified"},
+        2: {"name": "High Risk", "color": "#EF4444", "description": "Multiple high-risk behaviors present"},
+        3: {"name": "Very High Risk", "color": "#DC2626", "description": "Immediate intervention recommended"}
+    }
     
+    # Mapping of what values were used in training when data was missing
+    #is ONLY for ORIGINAL features, NOT missing indicators 
+    MISSING_VALUE_MAP = {
+        'q89': 1.0,     # if q89_missing=1, q89 assumes as selected the option 1
+        'q82': 2.0,     # When q82_missing=1, q82 assumes as selected the option 2
+        'QN102': 2.0,   # When QN102_missing=1, QN102 assumes as selected the option 2
+        'q66': 3.0,     # When q66_missing=1, q66 was 3
+        'QN106': 2.0,   # When QN106_missing=1, QN106 was 2
+        'q103': 2.0,    # When q103_missing=1, q103 was 2
+        'q104': 5.0,    # When q104_missing=1, q104 was 5 --> HIGHEST risk for this question
+        'q78': 1.0,     # When q78_missing=1, q78 was 1
+    }
+
     def __init__(self, model_path: str, scoring_system, features_path: str):
         print("🔧 Loading HIV Risk Predictor...")
         
         # Load model
         self.model = joblib.load(model_path)
         print(f"   ✅ Model loaded: {type(self.model).__name__}")
+        nthread = configure_model_threads(self.model)
+        # Concurrent single-user predictions share one batched XGBoost call
+        self.inference_batcher = InferenceBatcher(self.model)
+        print(f"   ✅ XGBoost threads: {nthread}, micro-batching: "
+              f"{f'{self.inference_batcher.window_ms:g}ms / {self.inference_batcher.max_batch} rows' if self.inference_batcher.enabled else 'off'}")
         
         # Load scoring system (REPLACES SHAP)
         self.scoring_system = scoring_system
@@ -241,40 +293,101 @@ class HIVRiskPredictor:
         with open(features_path, 'rb') as f:
             self.feature_names = pickle.load(f)
         print(f"   ✅ {len(self.feature_names)} features loaded")
+
+        # Optional candidate model scored in the background on the same rows (HIV_SHADOW_MODEL_PATH)
+        self.shadow = ShadowEvaluator.from_env(self.feature_names)
         
         self.scoring_system = scoring_system
 
         # Risk stage definitions
-        self.risk_definitions = {
-            0: {"name": "Low Risk", "color": "#10B981", "description": "Minimal HIV risk factors present"},
-            1: {"name": "Moderate Risk", "color": "#F59E0B", "description": "Some concerning behaviors identified"},
-            2: {"name": "High Risk", "color": "#EF4444", "description": "Multiple high-risk behaviors present"},
-            3: {"name": "Very High Risk", "color": "#DC2626", "description": "Immediate intervention recommended"}
-        }
+        self.risk_definitions = self.RISK_DEFINITIONS
         
         print("   ✅ HIV Risk Predictor initialized successfully!")
     
-    def predict(self, user_input: Dict) -> Dict:
+    def predict(self, user_input: Dict, record: bool = True) -> Dict:
         """
         Make personalized prediction for a user
         KEEP XGBoost prediction for stage, use scoring only for explanations
+        record=False: synthetic traffic (warm-up), kept out of shadow stats and batching metrics
         """
         # 1. Get XGBoost prediction (UNCHANGED - keep your original)
-        features_array = self._prepare_features(user_input)
-        raw_pred = self.model.predict(features_array)
-        risk_stage = int(np.ravel(raw_pred)[0])  # KEEP XGBoost stage
-        probabilities = np.asarray(self.model.predict_proba(features_array)[0], dtype=float)
-        confidence = probabilities[int(risk_stage)]
+        with timed("prepare_features"):
+            features_array = self._prepare_features(user_input)
+        with timed("model_inference"):
+            # multi:softprob - the XGBoost stage is the most probable class (same as model.predict)
+            probabilities, model_seconds = self.inference_batcher.predict_proba_timed(features_array, record=record)
+            risk_stage = int(np.argmax(probabilities))  # KEEP XGBoost stage
+        if self.shadow is not None and record:
+            # Compared with the candidate's bare predict_proba time, so batching waits are left out
+            self.shadow.submit(features_array, probabilities[np.newaxis, :], model_seconds)
         
         # 2. Get clinical scoring ONLY for explanations (not for stage)
         # score, scoring_stage, scoring_explanations = self.scoring_system.calculate_risk_score(user_input)
-        score, scoring_explanations = self.scoring_system.calculate_risk_score(user_input)
+        with timed("clinical_scoring"):
+            score, scoring_explanations = self.scoring_system.calculate_risk_score(user_input)
+        
+        return self._build_prediction(user_input, risk_stage, probabilities, score, scoring_explanations)
+
+    def predict_batch(self, user_inputs: List[Dict], score_many=None,
+                      record: bool = True) -> Tuple[List[Optional[Dict]], List[Optional[str]]]:
+        """
+        Predict many users at once: one vectorized feature matrix and a single XGBoost call.
+        score_many: optional callable (user_inputs -> [(score, explanations, error)]) so clinical
+        scoring can run elsewhere (e.g. a process pool). Defaults to scoring in this process.
+        record=False: synthetic traffic (warm-up), not handed to the shadow model.
+        Returns (predictions, errors), both in input order; a failed user has prediction None
+        and an error message.
+        """
+        with timed("prepare_features_batch"):
+            features_matrix, errors = self._prepare_features_batch(user_inputs)
+        valid = [i for i, error in enumerate(errors) if error is None]
+        predictions: List[Optional[Dict]] = [None] * len(user_inputs)
+        if not valid:
+            return predictions, errors
+
+        # 1. XGBoost for all valid users in one call
+        valid_features = features_matrix[valid]
+        with timed("model_inference_batch"):
+            inference_started = time.perf_counter()
+            all_probabilities = np.asarray(self.model.predict_proba(valid_features), dtype=float)
+            model_seconds = time.perf_counter() - inference_started
+            risk_stages = np.argmax(all_probabilities, axis=1)
+        if self.shadow is not None and record:
+            self.shadow.submit(valid_features, all_probabilities, model_seconds / len(valid))
+
+        # 2. Clinical scoring (explanations only)
+        valid_inputs = [user_inputs[i] for i in valid]
+        with timed("clinical_scoring_batch"):
+            if score_many is None:
+                scored = [score_user(self.scoring_system, user_input) for user_input in valid_inputs]
+            else:
+                scored = score_many(valid_inputs)
+
+        # 3. Assemble predictions
+        for row, i in enumerate(valid):
+            score, scoring_explanations, error = scored[row]
+            if error is not None:
+                errors[i] = error
+                continue
+            try:
+                predictions[i] = self._build_prediction(
+                    user_inputs[i], int(risk_stages[row]), all_probabilities[row], score, scoring_explanations
+                )
+            except Exception as e:
+                errors[i] = f"{type(e).__name__}: {e}"
+        return predictions, errors
+
+    def _build_prediction(self, user_input: Dict, risk_stage: int, probabilities: np.ndarray,
+                          score: float, scoring_explanations: List[Dict]) -> Dict:
+        """Assemble the prediction dict from the XGBoost stage/probabilities and the clinical scoring"""
+        confidence = probabilities[int(risk_stage)]
         scoring_stage = 0 
         
         # 3. Get personalized factors from scoring (for explanations only)
-        personalized_factors = self._get_personalized_factors_from_scoring(
-            scoring_explanations, user_input, score
-        )
+        with timed("factor_building"):
+            personalized_factors = self._get_personalized_factors_from_scoring(
+                scoring_explanations, user_input, score
+            )
         
         # 4. Verify scoring matches XGBoost (just for debugging)
         if risk_stage != scoring_stage:
@@ -316,20 +429,7 @@ class HIVRiskPredictor:
             reason = factor.get('reason', '')
             
             # Get interpretation based on points (CLINICALLY CORRECT!)
-            if points > 0:
-                if points >= 20:
-                    intensity = "CRITICALLY"
-                elif points >= 10:
-                    intensity = "STRONGLY"
-                elif points >= 5:
-                    intensity = "MODERATELY"
-                else:
-                    intensity = "SLIGHTLY"
-                interpretation = f"{intensity} increases your risk"
-            elif points < 0:
-                interpretation = "PROTECTIVE factor - decreases your risk"
-            else:
-                interpretation = "Neutral impact"
+            interpretation = self.interpret_points(points)
             
             # Get user value
             user_value = factor.get('user_value')
@@ -355,6 +455,23 @@ class HIVRiskPredictor:
         
         return personalized_factors
         
+    @staticmethod
+    def interpret_points(points) -> str:
+        """Fixed interpretation text for a factor's scoring points"""
+        if points > 0:
+            if points >= 20:
+                intensity = "CRITICALLY"
+            elif points >= 10:
+                intensity = "STRONGLY"
+            elif points >= 5:
+                intensity = "MODERATELY"
+            else:
+                intensity = "SLIGHTLY"
+            return f"{intensity} increases your risk"
+        elif points < 0:
+            return "PROTECTIVE factor - decreases your risk"
+        return "Neutral impact"
+
     def _interpret_from_scoring(self, explanation):
         """
         Create interpretation from scoring (clinically correct!)
@@ -378,18 +495,6 @@ class HIVRiskPredictor:
         Convert user input to model-ready features
         USE EXACT VALUES FROM TRAINING DATA
         """
-        # Mapping of what values were used in training when data was missing
-        #is ONLY for ORIGINAL features, NOT missing indicators 
-        MISSING_VALUE_MAP = {
-            'q89': 1.0,     # if q89_missing=1, q89 assumes as selected the option 1
-            'q82': 2.0,     # When q82_missing=1, q82 assumes as selected the option 2
-            'QN102': 2.0,   # When QN102_missing=1, QN102 assumes as selected the option 2
-            'q66': 3.0,     # When q66_missing=1, q66 was 3
-            'QN106': 2.0,   # When QN106_missing=1, QN106 was 2
-            'q103': 2.0,    # When q103_missing=1, q103 was 2
-            'q104': 5.0,    # When q104_missing=1, q104 was 5 --> HIGHEST risk for this question
-            'q78': 1.0,     # When q78_missing=1, q78 was 1
-        }
         features = []
         
         # loop through all feature_names -> ['q1', 'q2', 'q89', 'q89_missing', ...]
@@ -401,7 +506,7 @@ class HIVRiskPredictor:
                 
                 # Check if user answered for the original feature
                 if original_feature in user_input:
-                    value = user_input[original_feature] # value = 99 (user's answer)
+                    value = self._numeric_answer(original_feature, user_input[original_feature]) # value = 99.0 (user's answer)
                     # Check if value is 99 (Prefer not to answer)
                     if value == 99:
                         # User selected "Prefer not to answer" → missing = 1--> So, added 1.0 to features list; but not a risk factor; So, not impact for risk stage
@@ -415,22 +520,101 @@ class HIVRiskPredictor:
             else:
                 # Regular feature (not a missing indicator)
                 if feature_name in user_input:
-                    value = user_input[feature_name]
+                    value = self._numeric_answer(feature_name, user_input[feature_name])
                     # Check if value = 99 (Prefer not to answer)
                     if value == 99:
                         # CRITICAL FIX: Use the EXACT value from training
                         # When data was missing in MISSING_VALUE_MAP, uses as default as 2.0 as the training_value
-                        training_value = MISSING_VALUE_MAP.get(feature_name, 2.0)
+                        training_value = self.MISSING_VALUE_MAP.get(feature_name, 2.0)
                         features.append(training_value)
                     else:
-                        features.append(float(value)) # if User answers q44 = 8 --> features.append(8.0)--> INCREASES risk stage
+                        features.append(value) # if User answers q44 = 8 --> features.append(8.0)--> INCREASES risk stage
                 else:
                     # Feature not provided → use training's missing value
-                    training_value = MISSING_VALUE_MAP.get(feature_name, 2.0)
+                    training_value = self.MISSING_VALUE_MAP.get(feature_name, 2.0)
                     features.append(training_value) # EX: features.append(2.0) → features = [4.0, 1.0, 1.0, 2.0, 0.0, 2.0]
 
         
         return np.array(features).reshape(1, -1) 
+
+    @staticmethod
+    def _numeric_answer(feature_name: str, value: Any) -> float:
+        """
+        Answer as a number before the 99 check, so "99" and 99 mean the same thing.
+        Same rules as the batch path (pd.to_numeric): anything that is not a number is an error.
+        """
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            number = float('nan')
+        if np.isnan(number):
+            raise ValueError(f"Non-numeric answer for: {feature_name}")
+        return number
+    
+    def _base_features(self) -> List[str]:
+        """Original questions behind the model features (q89 and q89_missing both come from q89)"""
+        return list(dict.fromkeys(
+            name.replace('_missing', '') if name.endswith('_missing') else name for name in self.feature_names
+        ))
+
+    def _prepare_features_batch(self, user_inputs: List[Dict]) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        Vectorized _prepare_features for many users (same rules, applied a column at a time).
+        Returns (n_users x n_features matrix, per-user error messages). Rows with an error
+        hold default values and must not be used.
+        """
+        errors: List[Optional[str]] = [None] * len(user_inputs)
+        base_features = self._base_features()
+        if not user_inputs:
+            return np.empty((0, len(self.feature_names))), errors
+
+        rows = []
+        for i, user_input in enumerate(user_inputs):
+            if not isinstance(user_input, dict):
+                errors[i] = f"Expected an object of answers, got {type(user_input).__name__}"
+                user_input = {}
+            rows.append({key: user_input[key] for key in base_features if key in user_input})
+
+        answered = np.array([[key in row for key in base_features] for row in rows], dtype=bool)
+        frame = pd.DataFrame(rows, columns=base_features)
+        return self._features_from_frame(frame, answered, errors)
+
+    def _prepare_features_frame(self, frame: pd.DataFrame) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        _prepare_features_batch for a table of answers (e.g. a survey extract read with pandas):
+        one row per user, one column per question; empty cells and absent columns are unanswered.
+        """
+        base_features = self._base_features()
+        frame = frame.reindex(columns=base_features)
+        answered = frame.notna().to_numpy()
+        return self._features_from_frame(frame, answered, [None] * len(frame))
+
+    def _features_from_frame(self, frame: pd.DataFrame, answered: np.ndarray,
+                             errors: List[Optional[str]]) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """Shared rules: numeric answers, 99/unanswered -> missing indicator + training default"""
+        base_features = list(frame.columns)
+        values = frame.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+        # Answered but not a number (e.g. None or free text) -> same failure as float(value)
+        invalid = answered & np.isnan(values)
+        for i in np.flatnonzero(invalid.any(axis=1)):
+            if errors[i] is None:
+                bad = [base_features[j] for j in np.flatnonzero(invalid[i])]
+                errors[i] = f"Non-numeric answer for: {', '.join(bad)}"
+
+        # Not answered, or 99 (Prefer not to answer) -> missing = 1 and the training default value
+        missing = ~answered | (values == 99)
+        defaults = np.array([self.MISSING_VALUE_MAP.get(key, 2.0) for key in base_features])
+        values = np.where(missing | invalid, defaults[None, :], values)
+
+        column = {key: j for j, key in enumerate(base_features)}
+        features = np.empty((len(frame), len(self.feature_names)))
+        for k, feature_name in enumerate(self.feature_names):
+            if feature_name.endswith('_missing'):
+                features[:, k] = missing[:, column[feature_name.replace('_missing', '')]]
+            else:
+                features[:, k] = values[:, column[feature_name]]
+        return features, errors
     
     
     # def _get_personalized_factors(self, features_array: np.ndarray, 
@@ -689,6 +873,42 @@ class HIVRiskPredictor:
     #     return f"{intensity} {direction} your risk"
 
 
+# Read-only components (XGBoost model, feature names, clinical scorer, localized bundles), loaded once
+# per process and shared by every HIVPreventionSystem in it. A pre-fork master (api/serve_prefork.py)
+# loads them before forking so all workers share the same copy-on-write pages.
+_shared_components: Dict[str, Any] = {}
+
+
+def preload_shared_components() -> Dict[str, Any]:
+    """Load (once) and return the read-only components shared across systems and forked workers"""
+    if _shared_components:
+        return _shared_components
+
+    # Get the base directory
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    
+    # Load models
+    model_path = os.path.join(base_dir, "models/hiv_risk_model.pkl")
+    features_path = os.path.join(base_dir, "models/hiv_risk_model_features.pkl")
+    
+    # Initialize Clinical Risk Scorer
+    from .scoring_system import ClinicalRiskScorer
+    feature_dict_path = os.path.join(base_dir, 'data/feature_dictionary.json')
+    scoring_system = ClinicalRiskScorer(feature_dict_path)
+    
+    _shared_components.update({
+        "scoring_system": scoring_system,
+        "risk_predictor": HIVRiskPredictor(
+            model_path=model_path,
+            scoring_system=scoring_system,  
+            features_path=features_path
+        ),
+        # Precomputed si/ta bundles for static text (no LLM call needed for these strings)
+        "localized_content": LocalizedContent()
+    })
+    return _shared_components
+
+
 class HIVPreventionSystem:
     """Complete HIV Prevention System - Integrates all components"""
     
@@ -698,22 +918,10 @@ class HIVPreventionSystem:
         # Get the base directory
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         
-        # Load models
-        model_path = os.path.join(base_dir, "models/hiv_risk_model.pkl")
-        features_path = os.path.join(base_dir, "models/hiv_risk_model_features.pkl")
-        
-        # Initialize Clinical Risk Scorer
-        from .scoring_system import ClinicalRiskScorer
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        feature_dict_path = os.path.join(base_dir, 'data/feature_dictionary.json')
-        scoring_system = ClinicalRiskScorer(feature_dict_path)
-        
-        # Initialize components
-        self.risk_predictor = HIVRiskPredictor(
-            model_path=model_path,
-            scoring_system=scoring_system,  
-            features_path=features_path
-        )
+        # Initialize components (model, scorer and bundles are loaded once per process)
+        shared = preload_shared_components()
+        scoring_system = shared["scoring_system"]
+        self.risk_predictor = shared["risk_predictor"]
 
         # Attempt to read .env for GEMINI_API_KEY if not present
         env_path = os.path.join(base_dir, '.env')
@@ -732,39 +940,131 @@ class HIVPreventionSystem:
                 pass
 
         api_key = os.getenv("GEMINI_API_KEY")
+        # Gemini clients built once per worker; the pool size caps concurrent Gemini calls
+        # (genai.configure is process-global, so clients share one transport)
+        pool_size = int(os.getenv("HIV_LLM_POOL_SIZE", "8"))
+        health_interval = float(os.getenv("HIV_LLM_HEALTH_CHECK_INTERVAL_S", "300"))
+        self.planner_pool = None
+        self.adaptor_pool = None
+        self.plan_scheduler = None
+        self.adapt_scheduler = None
+        self.load_shedder = None
         if api_key:
-            self.intervention_planner = LLMInterventionPlanner(api_key=api_key)
+            self.planner_pool = ClientPool(
+                "planner", lambda: LLMInterventionPlanner(api_key=api_key), size=pool_size,
+                health_check=gemini_health_check, health_check_interval=health_interval
+            )
+            self.intervention_planner = None  # planning goes through self.planner_pool
+            # Severity-aware, per-clinic fair admission to the pooled planners
+            self.plan_scheduler = PriorityScheduler("planner", capacity=pool_size)
+            # Degrades low-priority requests to the rule-based planner when Gemini is overloaded
+            plan_scheduler = self.plan_scheduler
+            self.load_shedder = LoadShedder(
+                queue_depth=lambda: plan_scheduler.stats()["waiting_total"],
+                in_flight=lambda: plan_scheduler.stats()["in_use"],
+                capacity=pool_size
+            )
             planner_desc = "Gemini 2.5 Flash LLM"
         else:
             print("⚠️  GEMINI_API_KEY not set. Using fallback rule-based planner.")
             self.intervention_planner = PersonalizedInterventionPlanner()
             planner_desc = "Rule-based planner"
+        self.planner_desc = planner_desc
+
+        # Rule-based planner used as the provisional plan when the LLM misses its deadline
+        self.fallback_planner = PersonalizedInterventionPlanner()
+        # Recent results, so a late LLM plan can replace the provisional one
+        self.result_store = ResultStore()
+        # LLM planning runs here when a deadline is given (the call keeps running after the deadline)
+        self._planning_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("HIV_PLANNER_WORKERS", "8")),
+            thread_name_prefix="llm-planner"
+        )
+        # Shared sentence-level translation memory for cultural adaptation
+        try:
+            self.translation_memory = TranslationMemory()
+        except Exception as e:
+            print(f"⚠️  Translation memory unavailable ({e}). Every adaptation will go to Gemini.")
+            self.translation_memory = None
+        # batch_process lanes: CPU (vectorized prediction, optional scoring processes) and
+        # I/O (bounded threads for Gemini planning)
+        self.scoring_lane = ScoringLane(scoring_system)
+        self._batch_io_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("HIV_BATCH_IO_CONCURRENCY", "8")),
+            thread_name_prefix="batch-io"
+        )
+        # Bulk same-stage overlap statistics for batch_process
+        self.personalization_analyzer = PersonalizationAnalyzer()
+        self.localized_content = shared["localized_content"]
+        if api_key:
+            translation_memory = self.translation_memory
+            localized_content = self.localized_content
+            self.adaptor_pool = ClientPool(
+                "adaptor",
+                lambda: PlanAdaptor(
+                    api_key=api_key, translation_memory=translation_memory, localized_content=localized_content
+                ),
+                size=pool_size, health_check=gemini_health_check, health_check_interval=health_interval
+            )
+            self.adapt_scheduler = PriorityScheduler("adaptor", capacity=pool_size)
 
         print("✅ HIV Prevention System initialized successfully!")
         print(f"   Stage 1: XGBoost + SHAP")
         print(f"   Stage 2: {planner_desc}")
         print(f"   Features: {len(self.risk_predictor.feature_names)} risk factors")
     
-    def process_user(self, user_input: Dict) -> Dict:
+    def process_user(self, user_input: Dict, deadline_seconds: float = None, adapt: bool = True,
+                     clinic_id: str = None) -> Dict:
         """
         Complete pipeline for processing a user
+        deadline_seconds: optional latency budget. If the Gemini plan is not ready in time,
+        the rule-based plan is returned (marked provisional) and the Gemini plan replaces it
+        in self.result_store once it arrives.
+        adapt: set False to skip cultural adaptation (batch_process adapts many plans at once)
+        clinic_id: clinic the request comes from (fair share of Gemini capacity between clinics)
         """
+        started = time.monotonic()
         print(f"\n👤 Processing new user...")
         
         # Stage 1: Risk Prediction
         print("   📊 Stage 1: Risk prediction...")
         risk_prediction = self.risk_predictor.predict(user_input)
-        
+        return self._complete_user(user_input, risk_prediction, started, deadline_seconds, adapt, clinic_id)
+
+    def _complete_user(self, user_input: Dict, risk_prediction: Dict, started: float = None,
+                       deadline_seconds: float = None, adapt: bool = True, clinic_id: str = None) -> Dict:
+        """Stage 2 onwards for a user whose risk prediction is done (planning, adaptation, storing)"""
+        started = time.monotonic() if started is None else started
+        user_language = user_input.get('preferred_language', 'en')
+        user_culture = user_input.get('preferred_culture', user_language)  # Add this field
+        result_id = uuid.uuid4().hex
+        priority = classify_priority(risk_prediction)
+        # Under load, low-priority requests get the rule-based plan and no LLM adaptation
+        degraded = self.load_shedder is not None and self.load_shedder.should_degrade(priority)
+
         # Stage 2: LLM-generated Intervention Planning
         print("   🤖 Stage 2: Gemini generating personalized plan...")
         # DEBUG: Check which planner is being used (_FallbackPlanner/PersonalizedInterventionPlanner)
-        print(f"   🔍 DEBUG: Planner Type = {type(self.intervention_planner).__name__}")
-        print(f"   🔍 DEBUG: Planner Module = {self.intervention_planner.__module__}")
-        # FIX: Pass BOTH parameters
-        intervention_plan = self.intervention_planner.create_plan(risk_prediction, user_input)
+        print(f"   🔍 DEBUG: Planner = {self.planner_desc}")
+        pending_plan = None
+        if degraded:
+            print(f"   🚦 Degraded ({priority} priority under load): using rule-based planner")
+            with timed("create_plan_rule_based"):
+                intervention_plan = self.fallback_planner.create_plan(risk_prediction, user_input)
+            intervention_plan["is_provisional"] = False
+        elif deadline_seconds is not None and self.planner_pool is not None:
+            remaining = max(0.0, deadline_seconds - (time.monotonic() - started))
+            intervention_plan, pending_plan = self._create_plan_with_deadline(
+                risk_prediction, user_input, remaining, clinic_id
+            )
+        else:
+            # FIX: Pass BOTH parameters
+            intervention_plan = self._create_plan(risk_prediction, user_input, clinic_id)
+            intervention_plan["is_provisional"] = False
         
         # Combine results
         result = {
+            "result_id": result_id,
             "user_id": self._generate_user_id(user_input),
             "timestamp": datetime.now().isoformat(),
             "risk_prediction": risk_prediction,
@@ -772,7 +1072,10 @@ class HIVPreventionSystem:
             "system_metadata": {
                 "version": "2.5_flash_Gemini",
                 "personalization_score": intervention_plan["uniqueness_score"],
-                "explainability_score": self._calculate_explainability(risk_prediction)
+                "explainability_score": self._calculate_explainability(risk_prediction),
+                "plan_status": "provisional" if intervention_plan["is_provisional"] else "final",
+                "priority": priority,
+                "degraded": degraded
             }
         }
         
@@ -781,24 +1084,181 @@ class HIVPreventionSystem:
         print(f"   🧬 Gemini Plan: {len(intervention_plan['personalized_plan'])} unique phases")
         print(f"   📈 Personalization: {intervention_plan['uniqueness_score']}% unique")
         
-        user_language = user_input.get('preferred_language', 'en')
-        user_culture = user_input.get('preferred_culture', user_language)  # Add this field
-        
         if user_language != 'en':
-            print(f"   🌐 Culturally adapting plan for {user_culture} ({user_language})...")
-            try:
-                # Initialize CULTURAL ADAPTOR (not translator)
-                cultural_adaptor = PlanAdaptor(api_key=os.getenv("GEMINI_API_KEY"))
+            result['risk_prediction'] = self.localized_content.localize_risk_prediction(risk_prediction, user_language)
+        pending_adaptation = None
+        if adapt and deadline_seconds is not None and not intervention_plan["is_provisional"] and not degraded:
+            # The Gemini plan made the budget: adaptation gets what is left of it
+            remaining = max(0.0, deadline_seconds - (time.monotonic() - started))
+            result['intervention_plan'], pending_adaptation = self._adapt_plan_with_deadline(
+                result['intervention_plan'], user_language, user_culture, remaining, risk_prediction, clinic_id
+            )
+            if pending_adaptation is not None:
+                result['system_metadata']['plan_status'] = "provisional"
+        elif adapt:
+            # A provisional (rule-based) plan is covered by the static bundles; the late Gemini plan
+            # is adapted in the background when it replaces it
+            result['intervention_plan'] = self._adapt_plan(
+                result['intervention_plan'], user_language, user_culture, risk_prediction, clinic_id,
+                static_only=degraded or intervention_plan["is_provisional"]
+            )
+
+        self.result_store.put(result_id, result)
+        # Only hooked up after the result is stored, so the replacement can always find it
+        if pending_plan is not None:
+            pending_plan.add_done_callback(
+                lambda done: self._planning_executor.submit(
+                    self._replace_provisional_plan, done, result_id, user_language, user_culture,
+                    risk_prediction, clinic_id
+                )
+            )
+        if pending_adaptation is not None:
+            pending_adaptation.add_done_callback(
+                lambda done: self._replace_unadapted_plan(done, result_id)
+            )
+        return result
+
+    def _create_plan(self, risk_prediction: Dict, user_input: Dict, clinic_id: str = None) -> Dict:
+        """Create a plan with a pooled Gemini planner (or the rule-based planner when no API key is set)"""
+        if self.planner_pool is None:
+            with timed("create_plan_rule_based"):
+                return self.intervention_planner.create_plan(risk_prediction, user_input)
+        # Wait for a slot by severity / clinic fair share; the scheduler never admits more calls than clients
+        with self.plan_scheduler.slot(
+            classify_priority(risk_prediction), clinic_id, risk_prediction.get("risk_score", 0)
+        ):
+            with timed("create_plan"), self.planner_pool.acquire() as planner:
+                plan_started = time.monotonic()
+                plan = planner.create_plan(risk_prediction, user_input)
+            if self.load_shedder is not None:
+                self.load_shedder.observe_latency(time.monotonic() - plan_started)
+            return plan
+
+    def pool_stats(self) -> List[Dict]:
+        """Utilization gauges for the Gemini client pools"""
+        return [pool.stats() for pool in (self.planner_pool, self.adaptor_pool) if pool is not None]
+
+    def load_shedding_state(self) -> Dict:
+        """Current load shedding state (None signals shedding is disabled: no Gemini planner)"""
+        return self.load_shedder.state() if self.load_shedder is not None else None
+
+    def scheduler_stats(self) -> List[Dict]:
+        """Slots in use and waiters per priority class for the LLM schedulers"""
+        return [
+            scheduler.stats() for scheduler in (self.plan_scheduler, self.adapt_scheduler) if scheduler is not None
+        ]
+
+    def _adapt_plan(self, intervention_plan: Dict, user_language: str, user_culture: str,
+                    risk_prediction: Dict = None, clinic_id: str = None, static_only: bool = False) -> Dict:
+        """
+        Culturally adapt a plan for non-English users (returns the plan unchanged on failure)
+        static_only: only use the precomputed bundles, never Gemini (degraded requests)
+        """
+        if user_language == 'en':
+            return intervention_plan
+
+        # Fallback/library plans are fully covered by the precomputed bundles
+        localized_plan = self.localized_content.localize_plan(intervention_plan, user_language)
+        if localized_plan is not None:
+            return localized_plan
+        if static_only:
+            return intervention_plan
+
+        if self.adaptor_pool is None:
+            print("   ⚠️  Cultural adaptation skipped: GEMINI_API_KEY not set")
+            return intervention_plan
+
+        print(f"   🌐 Culturally adapting plan for {user_culture} ({user_language})...")
+        try:
+            # Borrow a pooled CULTURAL ADAPTOR (not translator), after waiting for a slot by severity
+            risk_prediction = risk_prediction or {}
+            with self.adapt_scheduler.slot(
+                classify_priority(risk_prediction), clinic_id, risk_prediction.get("risk_score", 0)
+            ), timed("cultural_adaptation"), self.adaptor_pool.acquire() as cultural_adaptor:
                 # Culturally adapt the intervention plan
-                result['intervention_plan'] = cultural_adaptor.culturally_adapt_plan(
-                    result['intervention_plan'],
+                return cultural_adaptor.culturally_adapt_plan(
+                    intervention_plan,
                     user_language,
                     user_culture
                 )
-            except Exception as e:
-                print(f"   ⚠️  Cultural adaptation skipped: {e}")
-        
-        return result
+        except Exception as e:
+            print(f"   ⚠️  Cultural adaptation skipped: {e}")
+            return intervention_plan
+
+    def _create_plan_with_deadline(self, risk_prediction: Dict, user_input: Dict, timeout: float,
+                                   clinic_id: str = None) -> Tuple[Dict, Any]:
+        """
+        Race the Gemini planner against the deadline.
+        Returns (plan, pending_future). On timeout the plan is the rule-based one marked
+        provisional, and pending_future is the still-running Gemini call.
+        """
+        future = self._planning_executor.submit(self._create_plan, risk_prediction, user_input, clinic_id)
+        try:
+            intervention_plan = future.result(timeout=timeout)
+            intervention_plan["is_provisional"] = False
+            return intervention_plan, None
+        except FutureTimeoutError:
+            print(f"   ⏱️  Gemini plan not ready within {timeout:.2f}s. Returning provisional rule-based plan.")
+
+        with timed("create_plan_rule_based"):
+            provisional_plan = self.fallback_planner.create_plan(risk_prediction, user_input)
+        provisional_plan["is_provisional"] = True
+        return provisional_plan, future
+
+    def _adapt_plan_with_deadline(self, intervention_plan: Dict, user_language: str, user_culture: str,
+                                  timeout: float, risk_prediction: Dict = None,
+                                  clinic_id: str = None) -> Tuple[Dict, Any]:
+        """
+        Race Gemini cultural adaptation against what is left of the latency budget.
+        Returns (plan, pending_future). On timeout the plan is the unadapted one marked provisional,
+        and pending_future is the still-running adaptation.
+        """
+        if user_language == 'en' or self.adaptor_pool is None:
+            return self._adapt_plan(intervention_plan, user_language, user_culture, risk_prediction, clinic_id), None
+        # Plans covered by the static bundles need no Gemini call
+        localized_plan = self.localized_content.localize_plan(intervention_plan, user_language)
+        if localized_plan is not None:
+            return localized_plan, None
+
+        future = self._planning_executor.submit(
+            self._adapt_plan, intervention_plan, user_language, user_culture, risk_prediction, clinic_id
+        )
+        try:
+            return future.result(timeout=timeout), None
+        except FutureTimeoutError:
+            print(f"   ⏱️  Cultural adaptation not ready within {timeout:.2f}s. Returning unadapted plan.")
+        # Overlay, so the plan being adapted in the background is not mutated
+        return PlanOverlay(intervention_plan, {"is_provisional": True}), future
+
+    def _replace_unadapted_plan(self, done_future, result_id: str):
+        """Swap the late adaptation into the result store (_adapt_plan returns the plan unchanged on failure)"""
+        try:
+            adapted_plan = done_future.result()
+        except Exception as e:
+            print(f"   ⚠️  Background adaptation failed for {result_id}: {e}. Keeping unadapted plan.")
+            return
+        replaced = self.result_store.replace_plan(result_id, adapted_plan, plan_status="final")
+        if replaced:
+            print(f"   ✅ Unadapted plan for {result_id} replaced with the adapted plan")
+
+    def _replace_provisional_plan(self, done_future, result_id: str, user_language: str, user_culture: str,
+                                  risk_prediction: Dict = None, clinic_id: str = None):
+        """Swap the late Gemini plan into the result store (keeps the provisional plan if Gemini failed)"""
+        try:
+            final_plan = done_future.result()
+        except Exception as e:
+            print(f"   ⚠️  Background Gemini plan failed for {result_id}: {e}. Keeping provisional plan.")
+            return
+        final_plan["is_provisional"] = False
+        final_plan = self._adapt_plan(final_plan, user_language, user_culture, risk_prediction, clinic_id)
+        replaced = self.result_store.replace_plan(
+            result_id,
+            final_plan,
+            personalization_score=final_plan["uniqueness_score"],
+            plan_status="final"
+        )
+        if replaced:
+            print(f"   ✅ Provisional plan for {result_id} replaced with Gemini plan")
     
     def _generate_user_id(self, user_input: Dict) -> str:
         """
@@ -825,33 +1285,129 @@ class HIVPreventionSystem:
         
         return min(100, score)
     
-    def batch_process(self, users_data: List[Dict]) -> Dict:
+    def batch_process(self, users_data: List[Dict], include_comparisons: bool = False, clinic_id: str = None) -> Dict:
         """
         Process multiple users and compare personalization
+        - identical inputs are processed once and share a result
+        - CPU lane: one vectorized feature matrix + XGBoost call, scoring optionally in processes
+        - I/O lane: Gemini planning on a bounded thread pool, cultural adaptation batched
+        Results stay in input order; a user that fails gets {"success": False, "error": ...}
+        in its slot instead of failing the batch.
+        Personalization is analyzed in bulk (vectorized, sampled for very large batches).
+        Per-pair comparisons are only returned when include_comparisons is set.
+        clinic_id: clinic submitting the batch (its LLM calls get that clinic's fair share, no more)
         """
         print(f"\n👥 Processing {len(users_data)} users...")
-        
-        results = []
-        comparisons = []
-        
-        # Process each user
+
+        # Dedup identical inputs (canonical JSON)
+        unique_inputs, unique_slot = [], {}
+        slots = []
         for user_data in users_data:
-            result = self.process_user(user_data)
-            results.append(result)
+            try:
+                key = json.dumps(user_data, sort_keys=True)
+            except (TypeError, ValueError):
+                key = f"unhashable:{len(slots)}"
+            if key not in unique_slot:
+                unique_slot[key] = len(unique_inputs)
+                unique_inputs.append(user_data)
+            slots.append(unique_slot[key])
+        if len(unique_inputs) < len(users_data):
+            print(f"   ♻️  {len(users_data) - len(unique_inputs)} duplicate inputs share a result")
+
+        # CPU lane: Stage 1 for every unique user at once
+        print("   📊 Stage 1: Batch risk prediction...")
+        predictions, errors = self.risk_predictor.predict_batch(unique_inputs, score_many=self.scoring_lane.score_many)
+
+        # I/O lane: Stage 2 (planning) with bounded concurrency; adaptation is batched below
+        futures = {
+            i: self._batch_io_executor.submit(
+                self._complete_user, unique_inputs[i], prediction, adapt=False, clinic_id=clinic_id
+            )
+            for i, prediction in enumerate(predictions) if prediction is not None
+        }
+        unique_results: List[Optional[Dict]] = [None] * len(unique_inputs)
+        for i, future in futures.items():
+            try:
+                unique_results[i] = future.result()
+            except Exception as e:
+                errors[i] = f"{type(e).__name__}: {e}"
+
+        succeeded = [i for i, result in enumerate(unique_results) if result is not None]
+        self._adapt_batch(
+            [unique_inputs[i] for i in succeeded], [unique_results[i] for i in succeeded], clinic_id
+        )
+
+        # Back to input order
+        results = []
+        for position, slot in enumerate(slots):
+            if unique_results[slot] is not None:
+                results.append(unique_results[slot])
+            else:
+                print(f"   ❌ User {position} failed: {errors[slot]}")
+                results.append({"success": False, "input_index": position, "error": errors[slot]})
+        successful_results = [result for result in results if result.get("success", True)]
         
         # Compare results
-        if len(results) >= 2:
-            for i in range(len(results)):
-                for j in range(i + 1, len(results)):
-                    comparison = self._compare_users(results[i], results[j])
-                    comparisons.append(comparison)
+        analysis, comparisons = self.personalization_analyzer.analyze(
+            successful_results, include_pairwise=include_comparisons
+        )
         
-        return {
+        batch_result = {
             "results": results,
-            "comparisons": comparisons,
-            "personalization_analysis": self._analyze_personalization(comparisons)
+            "personalization_analysis": analysis,
+            "users_succeeded": len(successful_results),
+            "users_failed": len(results) - len(successful_results),
+            "unique_inputs": len(unique_inputs)
         }
+        if include_comparisons:
+            batch_result["comparisons"] = comparisons
+        return batch_result
     
+    def _adapt_batch(self, users_data: List[Dict], results: List[Dict], clinic_id: str = None) -> None:
+        """
+        Culturally adapt a batch of results in place, grouping plans by (language, culture)
+        so each group shares Gemini calls instead of one round trip per user
+        """
+        groups = {}
+        for user_data, result in zip(users_data, results):
+            user_language = user_data.get('preferred_language', 'en')
+            user_culture = user_data.get('preferred_culture', user_language)
+            if user_language == 'en':
+                continue
+            localized_plan = self.localized_content.localize_plan(result['intervention_plan'], user_language)
+            if localized_plan is not None:
+                result['intervention_plan'] = localized_plan
+            elif result['system_metadata'].get('degraded'):
+                continue  # load shedding: no Gemini adaptation
+            else:
+                groups.setdefault((user_language, user_culture), []).append(result)
+        if not groups:
+            return
+        if self.adaptor_pool is None:
+            print("   ⚠️  Cultural adaptation skipped: GEMINI_API_KEY not set")
+            return
+
+        for (user_language, user_culture), group in groups.items():
+            print(f"   🌐 Culturally adapting {len(group)} plans for {user_culture} ({user_language})...")
+            # One scheduler slot per group, at the most severe priority in the group
+            priority = min(
+                (classify_priority(result['risk_prediction']) for result in group), key=PRIORITY_CLASSES.index
+            )
+            top_score = max(result['risk_prediction'].get('risk_score') or 0 for result in group)
+            try:
+                with self.adapt_scheduler.slot(priority, clinic_id, top_score), \
+                        timed("cultural_adaptation_batch"), self.adaptor_pool.acquire() as cultural_adaptor:
+                    adapted_plans = cultural_adaptor.culturally_adapt_plans(
+                        [result['intervention_plan'] for result in group],
+                        user_language,
+                        user_culture
+                    )
+            except Exception as e:
+                print(f"   ⚠️  Cultural adaptation skipped: {e}")
+                continue
+            for result, adapted_plan in zip(group, adapted_plans):
+                result['intervention_plan'] = adapted_plan
+
     def _compare_users(self, result1: Dict, result2: Dict) -> Dict:
         """
         Compare two users' results
@@ -0,0 +1,82 @@
+"""
+batch_lanes.py - CPU lane for batch_process.
+Clinical scoring is pure Python (GIL-bound), so large batches fan it out to a small process pool;
+Gemini planning/adaptation stays on the I/O thread lane in HIVPreventionSystem.
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+# (score, explanations, error message) for one user
+ScoreResult = Tuple[Optional[float], Optional[List[Dict]], Optional[str]]
+
+# Scorer inside each pool process (sent once by the initializer, not with every task)
+_worker_scorer = None
+
+
+def score_user(scoring_system, user_input: Dict) -> ScoreResult:
+    """Score one user, turning a failure into an error message instead of failing the whole batch"""
+    try:
+        score, explanations = scoring_system.calculate_risk_score(user_input)
+        return score, explanations, None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+
+def _init_worker(scoring_system) -> None:
+    global _worker_scorer
+    _worker_scorer = scoring_system
+
+
+def _score_chunk(user_inputs: List[Dict]) -> List[ScoreResult]:
+    return [score_user(_worker_scorer, user_input) for user_input in user_inputs]
+
+
+class ScoringLane:
+    """
+    Scores batches of users in order.
+    - processes=0 (default) scores in the calling process
+    - otherwise batches of at least min_batch users are split into chunks across a process pool
+      (smaller batches are not worth the pickling round trip)
+    """
+
+    def __init__(self, scoring_system, processes: int = None, min_batch: int = None, chunk_size: int = 64):
+        self.scoring_system = scoring_system
+        self.processes = int(os.getenv("HIV_BATCH_SCORING_PROCESSES", "0")) if processes is None else processes
+        self.min_batch = int(os.getenv("HIV_BATCH_SCORING_MIN_BATCH", "256")) if min_batch is None else min_batch
+        self.chunk_size = chunk_size
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def score_many(self, user_inputs: List[Dict]) -> List[ScoreResult]:
+        if self.processes <= 0 or len(user_inputs) < self.min_batch:
+            return [score_user(self.scoring_system, user_input) for user_input in user_inputs]
+
+        chunks = [user_inputs[i:i + self.chunk_size] for i in range(0, len(user_inputs), self.chunk_size)]
+        try:
+            scored = []
+            for chunk_result in self._get_pool().map(_score_chunk, chunks):
+                scored.extend(chunk_result)
+            return scored
+        except Exception as e:
+            # e.g. a worker died (BrokenProcessPool): rebuild next time, score this batch here
+            print(f"   ⚠️  Scoring process pool failed ({e}). Scoring in-process.")
+            self.close()
+            return [score_user(self.scoring_system, user_input) for user_input in user_inputs]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                print(f"🔧 Starting {self.processes} scoring processes...")
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes, initializer=_init_worker, initargs=(self.scoring_system,)
+                )
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -0,0 +1,233 @@
+"""
+bulk_score.py - Offline scoring of large survey extracts (YRBS-style question codes, as in
+data/feature_dictionary.json). No Gemini, no Firestore: XGBoost stage + probabilities, clinical
+score and top factors for every row.
+
+The extract is read in chunks (bounded memory: at most 2 chunks per worker are in flight), each chunk
+goes through the vectorized feature preparation, one XGBoost call and the clinical scorer in a
+process pool, and results are appended to a columnar output file in input order.
+
+Usage (from the project root):
+    python -m backend.bulk_score data/extract.csv -o scored.parquet --workers 4
+    python -m backend.bulk_score extract.parquet -o scored.csv --id-column record_id --chunk-size 50000
+
+Output columns: [id column], risk_stage, risk_level, prob_stage_0..3, risk_score, top_factors, error
+(risk_stage is -1 and the probabilities are empty for rows that could not be scored).
+Parquet input/output needs pyarrow.
+"""
+
+import argparse
+import os
+import pickle
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURES_PATH = os.path.join(BASE_DIR, "models", "hiv_risk_model_features.pkl")
+
+# Set in each pool process by _init_worker (or in this process when --workers 0)
+_predictor = None
+_top_n = 3
+
+
+def _init_worker(top_n: int, nthread: int, quiet: bool = True) -> None:
+    """Load the model and scorer once per process (quiet: drop the per-user debug prints)"""
+    global _predictor, _top_n
+    if quiet:
+        sys.stdout = open(os.devnull, "w")
+    from .backend import preload_shared_components
+    from .inference_batcher import configure_model_threads
+    _predictor = preload_shared_components()["risk_predictor"]
+    configure_model_threads(_predictor.model, nthread)
+    _top_n = top_n
+
+
+def score_chunk(frame: pd.DataFrame, id_column: Optional[str] = None) -> pd.DataFrame:
+    """Score one chunk of survey rows (runs in a pool process)"""
+    from .backend import HIVRiskPredictor
+    from .batch_lanes import score_user
+
+    predictor = _predictor
+    features, errors = predictor._prepare_features_frame(frame)
+    valid = np.array([error is None for error in errors], dtype=bool)
+    n_classes = len(HIVRiskPredictor.RISK_DEFINITIONS)
+
+    probabilities = np.full((len(frame), n_classes), np.nan)
+    stages = np.full(len(frame), -1, dtype=np.int8)
+    if valid.any():
+        probabilities[valid] = predictor.model.predict_proba(features[valid])
+        stages[valid] = probabilities[valid].argmax(axis=1)
+
+    # Clinical scoring works on one answer dict per user (unanswered cells left out)
+    scores = np.full(len(frame), np.nan)
+    top_factors: List[Optional[str]] = [None] * len(frame)
+    records = frame.to_dict("records")
+    for i in np.flatnonzero(valid):
+        user_input = {key: value for key, value in records[i].items() if key != id_column and value == value}
+        score, explanations, error = score_user(predictor.scoring_system, user_input)
+        if error is not None:
+            errors[i] = error
+            stages[i] = -1
+            probabilities[i] = np.nan
+            continue
+        scores[i] = score
+        factors = predictor.scoring_system.get_top_risk_factors(explanations, top_n=_top_n)
+        top_factors[i] = "; ".join(str(factor.get("feature")) for factor in factors)
+
+    levels = {stage: info["name"] for stage, info in HIVRiskPredictor.RISK_DEFINITIONS.items()}
+    output = {}
+    if id_column:
+        output[id_column] = frame[id_column].to_numpy()
+    output["risk_stage"] = stages
+    output["risk_level"] = [levels.get(int(stage)) for stage in stages]
+    for k in range(n_classes):
+        output[f"prob_stage_{k}"] = probabilities[:, k].astype(np.float32)
+    output["risk_score"] = scores
+    output["top_factors"] = top_factors
+    output["error"] = errors
+    return pd.DataFrame(output)
+
+
+def read_chunks(path: str, chunk_size: int, columns: List[str]) -> Iterator[pd.DataFrame]:
+    """Chunks of the extract, restricted to the model's questions (and the id column)"""
+    wanted = set(columns)
+    if path.endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path)
+        present = [name for name in parquet_file.schema_arrow.names if name in wanted]
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=present):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=lambda name: name in wanted, low_memory=False)
+
+
+class ColumnarWriter:
+    """Appends result chunks to a Parquet (row group per chunk) or CSV file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.parquet = path.endswith((".parquet", ".pq"))
+        self._writer = None
+        self._header_written = False
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            frame.to_csv(self.path, mode="a" if self._header_written else "w",
+                         header=not self._header_written, index=False)
+            self._header_written = True
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+
+def run(input_path: str, output_path: str, chunk_size: int = 20000, workers: int = None,
+        id_column: Optional[str] = None, top_n: int = 3, limit: Optional[int] = None) -> dict:
+    """Score input_path into output_path; returns the run summary"""
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    with open(FEATURES_PATH, "rb") as f:
+        feature_names = pickle.load(f)
+    questions = list(dict.fromkeys(name[:-len("_missing")] if name.endswith("_missing") else name
+                                   for name in feature_names))
+    columns = questions + ([id_column] if id_column else [])
+
+    writer = ColumnarWriter(output_path)
+    pool = None
+    if workers > 0:
+        # Parallelism comes from processes: one XGBoost thread each
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(top_n, 1))
+    else:
+        _init_worker(top_n, int(os.getenv("HIV_XGB_NTHREAD", str(min(4, os.cpu_count() or 1)))), quiet=False)
+
+    started = time.perf_counter()
+    rows = failed = 0
+    stage_counts: Counter = Counter()
+    in_flight: deque = deque()
+    max_in_flight = max(1, workers) * 2
+
+    def drain_one() -> None:
+        nonlocal rows, failed
+        result = in_flight.popleft()
+        result = result.result() if pool is not None else result
+        writer.write(result)
+        rows += len(result)
+        failed += int((result["risk_stage"] < 0).sum())
+        stage_counts.update(result["risk_stage"].tolist())
+        elapsed = time.perf_counter() - started
+        print(f"   📊 {rows:,} rows scored ({failed:,} failed) in {elapsed:.1f}s - "
+              f"{rows / elapsed:,.0f} rows/s", file=sys.stderr)
+
+    try:
+        read = 0
+        for chunk in read_chunks(input_path, chunk_size, columns):
+            if limit is not None:
+                if read >= limit:
+                    break
+                chunk = chunk.iloc[:limit - read]
+            read += len(chunk)
+            if id_column and id_column not in chunk.columns:
+                raise ValueError(f"Id column '{id_column}' not found in {input_path}")
+            if pool is not None:
+                in_flight.append(pool.submit(score_chunk, chunk, id_column))
+            else:
+                stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+                try:
+                    in_flight.append(score_chunk(chunk, id_column))
+                finally:
+                    sys.stdout.close()
+                    sys.stdout = stdout
+            while len(in_flight) >= max_in_flight:
+                drain_one()
+        while in_flight:
+            drain_one()
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "input": input_path,
+        "output": output_path,
+        "rows": rows,
+        "failed_rows": failed,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round(rows / elapsed) if elapsed else None,
+        "stage_counts": {int(stage): count for stage, count in sorted(stage_counts.items())},
+        "workers": workers,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Score a CSV/Parquet survey extract without LLM calls")
+    parser.add_argument("input", help="CSV or Parquet file with one column per question code (e.g. q44)")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.parquet or .csv)")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="Rows per chunk (memory bound)")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: CPU count, 0 = in-process)")
+    parser.add_argument("--id-column", help="Input column copied to the output to join results back")
+    parser.add_argument("--top-factors", type=int, default=3, help="Top risk factors listed per row")
+    parser.add_argument("--limit", type=int, help="Only score the first N rows")
+    args = parser.parse_args()
+
+    print(f"🚀 Scoring {args.input} -> {args.output}", file=sys.stderr)
+    summary = run(args.input, args.output, chunk_size=args.chunk_size, workers=args.workers,
+                  id_column=args.id_column, top_n=args.top_factors, limit=args.limit)
+    print(f"✅ {summary['rows']:,} rows in {summary['seconds']}s ({summary['rows_per_second']:,} rows/s), "
+          f"{summary['failed_rows']:,} failed. Stages: {summary['stage_counts']}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+client_pool.py - Per-worker concurrency limiter for Gemini-backed clients (planners and adaptors).
+
+genai.configure is process-global: every GenerativeModel in a worker shares one API key and one
+transport, so pooled clients do NOT own separate connections. The pool bounds how many Gemini calls
+a worker makes at once (size = concurrent calls) and builds the planner/adaptor objects once per
+worker instead of per request. For the same reason one health check covers the whole pool.
+"""
+
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import STAGE_SECONDS
+
+
+class ClientPool:
+    """
+    Fixed-size pool of reusable clients, i.e. a limit on concurrent calls.
+    - acquire() hands out an idle client (blocks while all `size` slots are in use)
+    - at most once per health_check_interval, the client being handed out is health-checked
+      (and rebuilt on failure); clients share the process-wide transport, so one check per pool suffices
+    - stats() returns gauge values for slot utilization
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], size: int = 4,
+                 health_check: Optional[Callable[[Any], None]] = None,
+                 health_check_interval: float = 300.0, acquire_timeout: Optional[float] = 30.0):
+        self.name = name
+        self.size = size
+        self._factory = factory
+        self._health_check = health_check
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._last_checked = time.monotonic()
+        self._in_use = 0
+        self._waiting = 0
+        self._acquisitions = 0
+        self._replacements = 0
+        self._failed_health_checks = 0
+        self._total_wait_seconds = 0.0
+
+        print(f"🔧 Creating {size} pooled '{name}' clients...")
+        for _ in range(size):
+            self._idle.put(factory())
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """Borrow a client for the duration of the with-block."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        wait_started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            client = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No '{self.name}' client available within {timeout}s (pool size {self.size})")
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+        waited = time.monotonic() - wait_started
+        STAGE_SECONDS.observe(waited, stage=f"{self.name}_pool_wait")
+        with self._lock:
+            self._in_use += 1
+            self._acquisitions += 1
+            self._total_wait_seconds += waited
+            # One thread per interval runs the check; the others go straight through
+            check = (self._health_check is not None
+                     and time.monotonic() - self._last_checked > self.health_check_interval)
+            if check:
+                self._last_checked = time.monotonic()
+
+        try:
+            if check:
+                client = self._checked(client)
+            yield client
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(client)
+
+    def warm_up(self) -> bool:
+        """
+        Health-check one client now (a single round trip opens the shared transport), so the first
+        requests after startup do not pay for it. Returns whether the check passed.
+        """
+        if self._health_check is None:
+            return True
+        with self.acquire() as client:
+            try:
+                self._health_check(client)
+                healthy = True
+            except Exception as e:
+                print(f"   ⚠️  '{self.name}' client failed warm-up check ({e})")
+                healthy = False
+        with self._lock:
+            self._last_checked = time.monotonic()
+            if not healthy:
+                self._failed_health_checks += 1
+        return healthy
+
+    def _checked(self, client: Any) -> Any:
+        """Run the health check; rebuild the client if it fails (keep the old one if rebuilding fails too)."""
+        try:
+            self._health_check(client)
+            return client
+        except Exception as e:
+            print(f"   ⚠️  '{self.name}' client failed health check ({e}). Rebuilding...")
+            with self._lock:
+                self._failed_health_checks += 1
+            try:
+                replacement = self._factory()
+            except Exception as rebuild_error:
+                print(f"   ❌ Could not rebuild '{self.name}' client: {rebuild_error}")
+                return client
+            with self._lock:
+                self._replacements += 1
+            return replacement
+
+    def stats(self) -> Dict[str, Any]:
+        """Gauge-style snapshot of slot utilization."""
+        with self._lock:
+            return {
+                "name": self.name,
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": self.size - self._in_use,
+                "waiting": self._waiting,
+                "utilization": self._in_use / self.size if self.size else 0.0,
+                "acquisitions": self._acquisitions,
+                "replacements": self._replacements,
+                "failed_health_checks": self._failed_health_checks,
+                "avg_wait_seconds": self._total_wait_seconds / self._acquisitions if self._acquisitions else 0.0,
+            }
+
+
+def gemini_health_check(client: Any) -> None:
+    """Cheap round trip through the process-wide Gemini transport (token counting is free)."""
+    client.model.count_tokens("ping")
@@ -0,0 +1,154 @@
+"""
+inference_batcher.py - Micro-batching of concurrent single-user XGBoost calls.
+
+Tree ensembles score a batch of rows far more cheaply than the same rows one call at a time.
+Concurrent HIVRiskPredictor.predict calls (one per /assess request thread) hand their 1xN feature
+row to the batcher; the first caller becomes the batch leader, waits up to window_ms for others to
+join (or until max_batch rows are queued), runs ONE predict_proba for everyone and fans the
+probability rows back out. A caller with nobody else in flight skips the window, so an idle worker
+pays no batching latency. There is no background thread, so it is safe in pre-forked workers.
+"""
+
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .metrics import REGISTRY
+
+BATCH_SIZE = REGISTRY.histogram(
+    "hiv_inference_batch_size", "Rows per micro-batched XGBoost call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+
+
+def configure_model_threads(model, nthread: int = None) -> int:
+    """
+    Set the XGBoost thread budget explicitly (HIV_XGB_NTHREAD, default min(4, cores)).
+    Left unset, every call may spin up one OpenMP thread per core, which oversubscribes the CPU
+    when many request threads (or pre-forked workers) predict at the same time.
+    """
+    if nthread is None:
+        nthread = int(os.getenv("HIV_XGB_NTHREAD", str(min(4, os.cpu_count() or 1))))
+    nthread = max(1, nthread)
+    try:
+        model.set_params(n_jobs=nthread)
+    except Exception as e:
+        print(f"   ⚠️  Could not set XGBoost threads: {e}")
+    return nthread
+
+
+class _Request:
+    __slots__ = ("row", "record", "result", "seconds", "error", "done", "leader")
+
+    def __init__(self, row: np.ndarray, record: bool = True):
+        self.row = row
+        self.record = record
+        self.result: Optional[np.ndarray] = None
+        # This row's share of the batched model call (excludes queueing and the window wait)
+        self.seconds = 0.0
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.leader = False
+
+
+class InferenceBatcher:
+    """
+    predict_proba(row) for one user, batched with whoever else is predicting at the same moment.
+    window_ms <= 0 or max_batch <= 1 disables batching (direct call).
+    """
+
+    def __init__(self, model, window_ms: float = None, max_batch: int = None):
+        self.model = model
+        self.window_ms = float(os.getenv("HIV_INFER_BATCH_WINDOW_MS", "2")) if window_ms is None else window_ms
+        self.max_batch = int(os.getenv("HIV_INFER_MAX_BATCH", "32")) if max_batch is None else max_batch
+        self.enabled = self.window_ms > 0 and self.max_batch > 1
+        self._cond = threading.Condition()
+        self._queue: List[_Request] = []
+        self._leader: Optional[_Request] = None
+        # Callers between entering and leaving predict_proba (queued, leading or waiting for a batch)
+        self._in_flight = 0
+
+    def predict_proba(self, row: np.ndarray, record: bool = True) -> np.ndarray:
+        """
+        Class probabilities for a single 1xN feature row.
+        record=False keeps the call out of the batch size metric (synthetic warm-up traffic).
+        """
+        return self.predict_proba_timed(row, record)[0]
+
+    def predict_proba_timed(self, row: np.ndarray, record: bool = True) -> Tuple[np.ndarray, float]:
+        """predict_proba plus the model time per row of the call that scored it (seconds, no batching wait)"""
+        if not self.enabled:
+            if record:
+                BATCH_SIZE.observe(1)
+            started = time.perf_counter()
+            probabilities = np.asarray(self.model.predict_proba(row)[0], dtype=float)
+            return probabilities, time.perf_counter() - started
+
+        with self._cond:
+            self._in_flight += 1
+        try:
+            return self._predict_batched(row, record)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+
+    def _predict_batched(self, row: np.ndarray, record: bool) -> Tuple[np.ndarray, float]:
+        request = _Request(row, record)
+        with self._cond:
+            self._queue.append(request)
+            if self._leader is None:
+                self._promote(request)
+            elif len(self._queue) >= self.max_batch:
+                self._cond.notify_all()  # wake the leader early: the batch is full
+
+            while not request.done and not request.leader:
+                self._cond.wait()
+            if request.done:
+                return self._unwrap(request)
+
+            # Leader: collect followers until the window closes or the batch is full, but only if
+            # someone else is predicting (alone, waiting would only add latency)
+            deadline = time.monotonic() + self.window_ms / 1000.0
+            while self._in_flight > 1 and len(self._queue) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._queue[:self.max_batch]
+            del self._queue[:self.max_batch]
+
+        # The model call happens outside the lock so the next batch can start queueing
+        try:
+            started = time.perf_counter()
+            probabilities = np.asarray(self.model.predict_proba(np.vstack([r.row for r in batch])), dtype=float)
+            seconds_per_row = (time.perf_counter() - started) / len(batch)
+            for r, probs in zip(batch, probabilities):
+                r.result = probs
+                r.seconds = seconds_per_row
+        except Exception as e:
+            for r in batch:
+                r.error = e
+        if any(r.record for r in batch):
+            BATCH_SIZE.observe(len(batch))
+
+        with self._cond:
+            for r in batch:
+                r.done = True
+            self._leader = None
+            if self._queue:
+                self._promote(self._queue[0])  # requests that arrived too late lead the next batch
+            self._cond.notify_all()
+        return self._unwrap(request)
+
+    def _promote(self, request: _Request) -> None:
+        request.leader = True
+        self._leader = request
+
+    @staticmethod
+    def _unwrap(request: _Request) -> Tuple[np.ndarray, float]:
+        if request.error is not None:
+            raise request.error
+        return request.result, request.seconds
@@ -0,0 +1,336 @@
+"""
+job_queue.py - Durable SQLite-backed job queue for asynchronous assessments, plus a worker pool.
+
+Jobs survive restarts: a job claimed by a worker holds a lease, renewed while the handler runs, and
+if the worker dies the lease expires and another worker picks the job up again. Results and failures
+are only recorded by the worker that still holds the job, so a worker whose lease was taken over
+cannot overwrite the new owner's outcome. Failed jobs are retried with exponential
+backoff up to max_attempts. Several processes (e.g. pre-forked API workers) can share one queue file;
+claims are atomic (BEGIN IMMEDIATE).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from .metrics import REGISTRY
+from .plan_model import dumps
+
+JOBS_COMPLETED = REGISTRY.counter("hiv_jobs_completed_total", "Jobs finished, by outcome", ["outcome"])
+
+# Terminal states
+FINISHED = ("succeeded", "failed")
+
+
+class JobQueue:
+    """Persistent queue of jobs: queued -> running -> succeeded | failed (running -> queued on retry)"""
+
+    def __init__(self, path: Optional[str] = None, max_attempts: int = None, lease_seconds: float = None,
+                 retry_backoff_seconds: float = 2.0):
+        if path is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.getenv("HIV_JOB_QUEUE_PATH", os.path.join(base_dir, "data", "cache", "jobs.sqlite3"))
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.max_attempts = max_attempts or int(os.getenv("HIV_JOB_MAX_ATTEMPTS", "3"))
+        self.lease_seconds = lease_seconds or float(os.getenv("HIV_JOB_LEASE_S", "300"))
+        self.retry_backoff_seconds = retry_backoff_seconds
+
+        self._lock = threading.Lock()
+        # Wakes local workers (new job) and local waiters (job finished); other processes poll
+        self._changed = threading.Condition()
+        # isolation_level=None: transactions are explicit (BEGIN IMMEDIATE for claims)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                   id TEXT PRIMARY KEY,
+                   kind TEXT NOT NULL,
+                   status TEXT NOT NULL,
+                   payload TEXT NOT NULL,
+                   result TEXT,
+                   error TEXT,
+                   attempts INTEGER NOT NULL DEFAULT 0,
+                   max_attempts INTEGER NOT NULL,
+                   created_at REAL NOT NULL,
+                   updated_at REAL NOT NULL,
+                   available_at REAL NOT NULL,
+                   lease_expires_at REAL,
+                   worker_id TEXT
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, available_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(status, updated_at)")
+
+    def enqueue(self, payload: Dict, kind: str = "assessment") -> str:
+        """Persist a new job and return its id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, max_attempts, created_at, updated_at, available_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), self.max_attempts, now, now, now)
+            )
+        self._notify()
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Atomically take the oldest runnable job (queued and due, or running with an expired lease).
+        Jobs whose lease expired on their last attempt are marked failed instead.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Worker lease expired on the last attempt', "
+                    "updated_at = ? WHERE status = 'running' AND lease_expires_at < ? AND attempts >= max_attempts",
+                    (now, now)
+                )
+                row = self._conn.execute(
+                    "SELECT id, kind, payload, attempts FROM jobs "
+                    "WHERE (status = 'queued' AND available_at <= ?) OR (status = 'running' AND lease_expires_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_expires_at = ?, "
+                        "worker_id = ?, updated_at = ? WHERE id = ?",
+                        (now + self.lease_seconds, worker_id, now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempt": row[3] + 1}
+
+    def complete(self, job_id: str, result: Any, worker_id: str) -> bool:
+        """Record the result. Returns False if worker_id no longer holds the job (its lease was taken over)."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'succeeded', result = ?, error = NULL, lease_expires_at = NULL, "
+                "updated_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (dumps(result, ensure_ascii=False), time.time(), job_id, worker_id)
+            )
+        if cursor.rowcount == 0:
+            JOBS_COMPLETED.inc(outcome="lease_lost")
+            return False
+        JOBS_COMPLETED.inc(outcome="succeeded")
+        self._notify()
+        return True
+
+    def fail(self, job_id: str, error: str, worker_id: str) -> str:
+        """
+        Record a failed attempt: back to the queue with backoff, or failed for good. Returns the new status
+        ("lease_lost" if worker_id no longer holds the job, which is then left alone).
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (job_id, worker_id)
+            ).fetchone()
+            if row is None:
+                JOBS_COMPLETED.inc(outcome="lease_lost")
+                return "lease_lost"
+            attempts, max_attempts = row
+            if attempts < max_attempts:
+                status = "queued"
+                available_at = now + self.retry_backoff_seconds * (2 ** (attempts - 1))
+            else:
+                status, available_at = "failed", now
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (status, error, available_at, now, job_id, worker_id)
+            )
+        JOBS_COMPLETED.inc(outcome="retried" if status == "queued" else "failed")
+        self._notify()
+        return status
+
+    def renew_lease(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease of a running job. Returns False if worker_id no longer holds it."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+                (time.time() + self.lease_seconds, job_id, worker_id)
+            )
+        return cursor.rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, result, error, attempts, max_attempts, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "kind": row[1],
+            "status": row[2],
+            "result": json.loads(row[3]) if row[3] is not None else None,
+            "error": row[4],
+            "attempts": row[5],
+            "max_attempts": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+        }
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Long-poll: return the job once it is finished or the timeout passes (whichever is first)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["status"] in FINISHED or remaining <= 0:
+                return job
+            with self._changed:
+                # Short waits so jobs finished by another process are also seen promptly
+                self._changed.wait(min(remaining, 0.5))
+
+    def wait_for_work(self, timeout: float) -> None:
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def purge(self, older_than_seconds: float) -> int:
+        """Delete finished jobs not updated for older_than_seconds"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND updated_at < ?",
+                (time.time() - older_than_seconds,)
+            )
+        return cursor.rowcount
+
+    def _notify(self) -> None:
+        with self._changed:
+            self._changed.notify_all()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobWorkerPool:
+    """Threads that claim jobs from a JobQueue and run handler(payload) -> result"""
+
+    def __init__(self, job_queue: JobQueue, handler: Callable[[Dict], Any], workers: int = None,
+                 poll_interval: float = 1.0, retention_seconds: float = None):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.workers = workers or int(os.getenv("HIV_JOB_WORKERS", "4"))
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds or float(os.getenv("HIV_JOB_RETENTION_S", "86400"))
+        self._stop = threading.Event()
+        self._threads = []
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+        # job id -> worker id of the jobs whose handler is running (leases renewed by the heartbeat thread)
+        self._running: Dict[str, str] = {}
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        print(f"🔧 Starting {self.workers} job workers...")
+        prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, args=(f"{prefix}-{i}",), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._renew_leases, name="job-lease-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop claiming new jobs; running jobs are given `timeout` to finish (leases cover the rest)"""
+        self._stop.set()
+        self.job_queue._notify()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self.job_queue.claim(worker_id)
+            except sqlite3.Error as e:
+                print(f"   ⚠️  Job queue claim failed: {e}")
+                job = None
+            if job is None:
+                self._maybe_purge()
+                self.job_queue.wait_for_work(self.poll_interval)
+                continue
+
+            with self._running_lock:
+                self._running[job["id"]] = worker_id
+            error = None
+            try:
+                result = self.handler(job["payload"])
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                with self._running_lock:
+                    self._running.pop(job["id"], None)
+
+            if error is None:
+                # Storing can fail too (result not serializable, "database is locked" under pre-fork);
+                # the job is then recorded as a failed attempt instead of killing this thread
+                try:
+                    if not self.job_queue.complete(job["id"], result, worker_id):
+                        print(f"   ⚠️  Job {job['id']} finished after its lease was taken over; result dropped")
+                    continue
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    error = f"Result could not be stored: {type(e).__name__}: {e}"
+            self._record_failure(job, error, worker_id)
+
+    def _record_failure(self, job: Dict, error: str, worker_id: str) -> None:
+        try:
+            status = self.job_queue.fail(job["id"], error, worker_id)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            # Left running: the lease expires and another worker retries it
+            JOBS_COMPLETED.inc(outcome="unrecorded")
+            print(f"   ⚠️  Could not record the failure of job {job['id']} ({e}); it is retried once its lease expires")
+            return
+        print(f"   ❌ Job {job['id']} attempt {job['attempt']} failed ({error}); now {status}")
+
+    def _renew_leases(self) -> None:
+        """Keep the leases of running jobs alive (a third of the lease between renewals)"""
+        interval = max(1.0, self.job_queue.lease_seconds / 3)
+        while not self._stop.wait(interval):
+            with self._running_lock:
+                running = list(self._running.items())
+            for job_id, worker_id in running:
+                try:
+                    if not self.job_queue.renew_lease(job_id, worker_id):
+                        print(f"   ⚠️  Lost the lease on job {job_id}")
+                except sqlite3.Error as e:
+                    print(f"   ⚠️  Lease renewal failed for job {job_id}: {e}")
+
+    def _maybe_purge(self) -> None:
+        with self._purge_lock:
+            if time.monotonic() - self._last_purge < 600:
+                return
+            self._last_purge = time.monotonic()
+        try:
+            purged = self.job_queue.purge(self.retention_seconds)
+            if purged:
+                print(f"   🧹 Purged {purged} finished jobs")
+        except sqlite3.Error as e:
+            print(f"   ⚠️  Job purge failed: {e}")
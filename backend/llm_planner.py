@@ -6,6 +6,9 @@ from datetime import datetime
 from typing import Dict, List, Any
 import google.generativeai as genai
 import os
+import time
+from .metrics import timed
+from .request_capture import REQUEST_CAPTURE
 
 class LLMInterventionPlanner:
     """Stage 2: Gemini 2.5 Flash-based plan generation"""
@@ -173,6 +176,27 @@ class LLMInterventionPlanner:
     
         print(f"🧬 Gemini generating plan for Stage {risk_stage} (Score: {risk_score})...")
 
+        with timed("plan_prompt_build"):
+            prompt, total_weeks, num_categories = self._build_plan_prompt(
+                risk_stage, risk_score, personalized_factors, user_input
+            )
+
+        # 3. Generate plan with Gemini
+        llm_response = self._generate_with_gemini(prompt, risk_stage)
+        
+        with timed("plan_parse"):
+            # 4. Parse and structure the response
+            parsed_plan = self._parse_llm_response(llm_response)
+            
+            # 5. Add metadata and expected outcomes
+            enriched_plan = self._enrich_plan_with_timeline(
+                parsed_plan, risk_stage, personalized_factors, total_weeks, num_categories
+            )           
+        
+        return enriched_plan
+
+    def _build_plan_prompt(self, risk_stage: int, risk_score, personalized_factors: List[Dict], user_input: Dict) -> tuple:
+        """Timeline guidance + user context + prompt text. Returns (prompt, total_weeks, num_categories)"""
         # Calculate timeline based on interventions ===
         total_weeks, phase_guide, num_categories = self._calculate_timeline_from_interventions(
             personalized_factors
@@ -205,18 +229,7 @@ class LLMInterventionPlanner:
 
     Generate the personalized plan now. Respond ONLY with valid JSON in the specified format:"""
         
-        # 3. Generate plan with Gemini
-        llm_response = self._generate_with_gemini(enhanced_prompt + progression_guidance, risk_stage)
-        
-        # 4. Parse and structure the response
-        parsed_plan = self._parse_llm_response(llm_response)
-        
-        # 5. Add metadata and expected outcomes
-        enriched_plan = self._enrich_plan_with_timeline(
-            parsed_plan, risk_stage, personalized_factors, total_weeks, num_categories
-        )           
-        
-        return enriched_plan
+        return enhanced_prompt + progression_guidance, total_weeks, num_categories
     
     def _prepare_user_context(self, personalized_factors, user_input, risk_score=None):
         """Create detailed context with scoring-based priorities"""
@@ -302,7 +315,12 @@ RISK LEVEL: {risk_levels[risk_stage]}
 Generate the personalized plan now. Respond ONLY with valid JSON in the specified format:"""
         
         try:
-            response = self.model.generate_content(full_prompt)
+            started = time.perf_counter()
+            with timed("plan_llm_wait"):
+                response = self.model.generate_content(full_prompt)
+            if REQUEST_CAPTURE.enabled:
+                # Recorded for deterministic replays (benchmarks/replay.py)
+                REQUEST_CAPTURE.record_llm("plan", full_prompt, response.text, time.perf_counter() - started)
             return response.text
         except Exception as e:
             print(f"   ❌ Gemini API error: {e}")
@@ -0,0 +1,126 @@
+"""
+load_shedder.py - Adaptive load shedding for LLM planning.
+
+Watches the planner scheduler's queue depth, the LLM calls in flight and recent Gemini plan latency.
+When any signal crosses its high threshold, new low-priority requests are degraded to the rule-based
+planner without LLM cultural adaptation. Shedding only stops once every signal is back under its low
+threshold, and the state never flips again within min_dwell_seconds (hysteresis, so it doesn't flap).
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, Optional
+
+from .metrics import REGISTRY
+
+DEGRADED_RESPONSES = REGISTRY.counter(
+    "hiv_degraded_responses_total", "Requests served by the rule-based planner due to load shedding", ["priority"]
+)
+SHEDDING_ACTIVE = REGISTRY.gauge("hiv_load_shedding_active", "1 while low-priority requests are being degraded")
+SHEDDING_TRANSITIONS = REGISTRY.counter(
+    "hiv_load_shedding_transitions_total", "Load shedding state changes", ["state"]
+)
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+class LoadShedder:
+    """
+    queue_depth / in_flight: callables returning the current planner queue depth and LLM calls in flight.
+    Thresholds default to values relative to capacity (the planner pool size) and can be set via env.
+    """
+
+    def __init__(self, queue_depth: Callable[[], int], in_flight: Callable[[], int], capacity: int,
+                 shed_priorities: Optional[Iterable[str]] = None):
+        self._queue_depth = queue_depth
+        self._in_flight = in_flight
+
+        self.queue_high = _env_float("HIV_SHED_QUEUE_HIGH", 2 * capacity)
+        self.queue_low = _env_float("HIV_SHED_QUEUE_LOW", capacity / 2)
+        self.in_flight_high = _env_float("HIV_SHED_IN_FLIGHT_HIGH", capacity)
+        self.in_flight_low = _env_float("HIV_SHED_IN_FLIGHT_LOW", capacity / 2)
+        self.latency_high = _env_float("HIV_SHED_LATENCY_HIGH_S", 20.0)
+        self.latency_low = _env_float("HIV_SHED_LATENCY_LOW_S", 10.0)
+        self.min_dwell_seconds = _env_float("HIV_SHED_MIN_DWELL_S", 10.0)
+        if shed_priorities is None:
+            shed_priorities = os.getenv("HIV_SHED_PRIORITIES", "standard").split(",")
+        self.shed_priorities = {p.strip() for p in shed_priorities if p.strip()}
+
+        self._lock = threading.Lock()
+        # (time, seconds) of recent Gemini plans; p90 over the last latency_window_seconds is the latency
+        # signal (samples age out, so it recovers even while every request is being degraded)
+        self.latency_window_seconds = _env_float("HIV_SHED_LATENCY_WINDOW_S", 60.0)
+        self._latencies: deque = deque(maxlen=200)
+        self._shedding = False
+        self._changed_at = 0.0
+        self._reason = None
+
+    def observe_latency(self, seconds: float) -> None:
+        with self._lock:
+            self._latencies.append((time.monotonic(), seconds))
+
+    def _recent_latency(self) -> float:
+        cutoff = time.monotonic() - self.latency_window_seconds
+        while self._latencies and self._latencies[0][0] < cutoff:
+            self._latencies.popleft()
+        if not self._latencies:
+            return 0.0
+        ordered = sorted(seconds for _, seconds in self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))]
+
+    def should_degrade(self, priority: str) -> bool:
+        """Re-evaluate the shedding state and say whether this request should be degraded"""
+        shedding = self._evaluate()
+        if shedding and priority in self.shed_priorities:
+            DEGRADED_RESPONSES.inc(priority=priority)
+            return True
+        return False
+
+    def _evaluate(self) -> bool:
+        queue_depth = self._queue_depth()
+        in_flight = self._in_flight()
+        with self._lock:
+            latency = self._recent_latency()
+            now = time.monotonic()
+            if now - self._changed_at < self.min_dwell_seconds:
+                return self._shedding
+
+            if not self._shedding:
+                reason = None
+                if queue_depth >= self.queue_high:
+                    reason = f"queue depth {queue_depth} >= {self.queue_high:g}"
+                elif in_flight >= self.in_flight_high and queue_depth > 0:
+                    reason = f"{in_flight} LLM calls in flight with {queue_depth} waiting"
+                elif latency >= self.latency_high:
+                    reason = f"p90 plan latency {latency:.1f}s >= {self.latency_high:g}s"
+                if reason:
+                    self._set_state(True, reason, now)
+            elif (queue_depth <= self.queue_low and in_flight <= self.in_flight_low
+                  and latency <= self.latency_low):
+                self._set_state(False, None, now)
+            return self._shedding
+
+    def _set_state(self, shedding: bool, reason: Optional[str], now: float) -> None:
+        self._shedding = shedding
+        self._reason = reason
+        self._changed_at = now
+        SHEDDING_ACTIVE.set(1 if shedding else 0)
+        SHEDDING_TRANSITIONS.inc(state="on" if shedding else "off")
+        if shedding:
+            print(f"   🚦 Load shedding ON ({reason}): degrading {', '.join(sorted(self.shed_priorities))} requests")
+        else:
+            print("   🚦 Load shedding OFF")
+
+    def state(self) -> Dict:
+        with self._lock:
+            return {
+                "shedding": self._shedding,
+                "reason": self._reason,
+                "shed_priorities": sorted(self.shed_priorities),
+                "recent_p90_latency_s": round(self._recent_latency(), 3),
+                "seconds_in_state": round(time.monotonic() - self._changed_at, 1) if self._changed_at else None,
+            }
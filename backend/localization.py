@@ -0,0 +1,209 @@
+"""
+localization.py - Precomputed Sinhala/Tamil bundles for the fixed user-facing text.
+
+Covers risk stage names/descriptions, the rule-based planner catalog, factor interpretation strings
+and the questions/option labels in feature_dictionary.json. Bundles are built offline (one Gemini pass)
+and loaded at startup, so static strings and fallback plans never need an LLM call at request time.
+
+Build (needs GEMINI_API_KEY):
+    python -m backend.localization build --languages si ta
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from .plan_adaptor import extract_plan_segments, apply_segment_adaptations
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_LOCALES_DIR = os.path.join(BASE_DIR, "data", "locales")
+DEFAULT_FEATURE_DICT_PATH = os.path.join(BASE_DIR, "data", "feature_dictionary.json")
+
+# Cultures used when building bundles (matches /languages in the API)
+BUNDLE_CULTURES = {"si": "Sri Lankan", "ta": "Sri Lankan"}
+
+
+class LocalizedContent:
+    """Read-only lookups into the precomputed bundles (data/locales/<language>.json)."""
+
+    def __init__(self, locales_dir: Optional[str] = None):
+        self.locales_dir = locales_dir or os.getenv("HIV_LOCALES_DIR", DEFAULT_LOCALES_DIR)
+        self.bundles: Dict[str, Dict[str, str]] = {}
+
+        if os.path.isdir(self.locales_dir):
+            for file_name in sorted(os.listdir(self.locales_dir)):
+                if not file_name.endswith(".json"):
+                    continue
+                with open(os.path.join(self.locales_dir, file_name), "r", encoding="utf-8") as f:
+                    bundle = json.load(f)
+                self.bundles[bundle["language"]] = bundle["strings"]
+
+        if self.bundles:
+            print(f"   ✅ Localized bundles loaded: {', '.join(sorted(self.bundles))}")
+        else:
+            print("   ⚠️  No localized bundles found (run: python -m backend.localization build)")
+
+    @property
+    def languages(self) -> List[str]:
+        return sorted(self.bundles)
+
+    def translate(self, text: str, language: str) -> str:
+        """Bundle translation of a fixed string, or the original text if there is none."""
+        if not isinstance(text, str):
+            return text
+        return self.bundles.get(language, {}).get(text, text)
+
+    def lookup_many(self, texts: Iterable[str], language: str) -> Dict[str, str]:
+        """{text: translation} for every text present in the language bundle."""
+        strings = self.bundles.get(language)
+        if not strings:
+            return {}
+        return {text: strings[text] for text in texts if text in strings}
+
+    def localize_plan(self, plan: Dict, language: str) -> Optional[Dict]:
+        """Localize a plan entirely from the bundle (e.g. fallback plans). None if any segment is missing."""
+        strings = self.bundles.get(language)
+        if not strings:
+            return None
+        segments = extract_plan_segments(plan)
+        if any(segment not in strings for segment in segments):
+            return None
+
+        return apply_segment_adaptations(
+            plan,
+            strings,
+            adaptation_metadata={
+                'original_language': 'en',
+                'target_language': language,
+                'target_culture': BUNDLE_CULTURES.get(language, language),
+                'is_culturally_adapted': True,
+                'adaptation_type': 'static_bundle',
+                'segments_total': len(segments),
+                'segments_from_memory': len(segments),
+                'segments_adapted_by_llm': 0
+            }
+        )
+
+    def localize_risk_prediction(self, risk_prediction: Dict, language: str) -> Dict:
+        """
+        Localized copy of the display text in a risk prediction.
+        risk_level stays English (it is mapped to a numeric score when saved); its translation is
+        added as risk_level_localized.
+        """
+        if language not in self.bundles:
+            return risk_prediction
+
+        localized = dict(risk_prediction)
+        localized["risk_level_localized"] = self.translate(risk_prediction.get("risk_level"), language)
+        localized["description"] = self.translate(risk_prediction.get("description"), language)
+        localized["personalized_factors"] = [
+            {
+                **factor,
+                "interpretation": self.translate(factor.get("interpretation"), language),
+                "question": self.translate(factor.get("question"), language),
+                "readable_value": self.translate(factor.get("readable_value"), language),
+            }
+            for factor in risk_prediction.get("personalized_factors", [])
+        ]
+        return localized
+
+    def localize_feature_dictionary(self, data: Dict, language: str) -> Dict:
+        """Localized copy of feature_dictionary.json (questions and option labels)."""
+        if language not in self.bundles:
+            return data
+
+        definitions = {}
+        for feature, info in data.get("feature_definitions", {}).items():
+            localized_info = dict(info)
+            if "question" in info:
+                localized_info["question"] = self.translate(info["question"], language)
+            if isinstance(info.get("options"), dict):
+                localized_info["options"] = {
+                    code: self.translate(label, language) for code, label in info["options"].items()
+                }
+            definitions[feature] = localized_info
+        return {**data, "feature_definitions": definitions}
+
+
+def collect_static_strings(feature_dict_path: str = DEFAULT_FEATURE_DICT_PATH) -> List[str]:
+    """All fixed user-facing strings that go into a bundle (deduplicated, stable order)."""
+    from .backend import HIVRiskPredictor, PersonalizedInterventionPlanner
+
+    texts = []
+    for definition in HIVRiskPredictor.RISK_DEFINITIONS.values():
+        texts.extend([definition["name"], definition["description"]])
+
+    # Fallback plan text (same segments PlanAdaptor would send to Gemini)
+    for risk_stage in HIVRiskPredictor.RISK_DEFINITIONS:
+        plan = PersonalizedInterventionPlanner().create_plan({"risk_stage": risk_stage})
+        texts.extend(extract_plan_segments(plan))
+
+    # One probe per interpretation band (critical, strong, moderate, slight, protective, neutral)
+    for points in (20, 10, 5, 1, -1, 0):
+        texts.append(HIVRiskPredictor.interpret_points(points))
+
+    with open(feature_dict_path, "r", encoding="utf-8") as f:
+        feature_definitions = json.load(f)["feature_definitions"]
+    for info in feature_definitions.values():
+        if "question" in info:
+            texts.append(info["question"])
+        if isinstance(info.get("options"), dict):
+            texts.extend(info["options"].values())
+
+    return list(dict.fromkeys(t for t in texts if isinstance(t, str) and t.strip()))
+
+
+def build_bundles(languages: List[str], locales_dir: str = DEFAULT_LOCALES_DIR,
+                  feature_dict_path: str = DEFAULT_FEATURE_DICT_PATH, force: bool = False) -> None:
+    """Translate the static strings with Gemini and write one bundle per language (only new strings are sent)."""
+    from .plan_adaptor import PlanAdaptor
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY is required to build localized bundles.")
+
+    adaptor = PlanAdaptor(api_key=api_key)
+    texts = collect_static_strings(feature_dict_path)
+    os.makedirs(locales_dir, exist_ok=True)
+
+    for language in languages:
+        path = os.path.join(locales_dir, f"{language}.json")
+        existing = {}
+        if os.path.exists(path) and not force:
+            with open(path, "r", encoding="utf-8") as f:
+                existing = json.load(f)["strings"]
+
+        missing = [text for text in texts if text not in existing]
+        culture = BUNDLE_CULTURES.get(language, language)
+        print(f"🌐 {language}: {len(texts) - len(missing)} cached, {len(missing)} to translate...")
+        translated, _ = adaptor.adapt_segments(missing, language, culture)
+        untranslated = len(missing) - len(translated)
+        if untranslated:
+            print(f"   ⚠️  {untranslated} strings could not be translated; re-run to retry them")
+
+        merged = {**existing, **translated}
+        strings = {text: merged[text] for text in texts if text in merged}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "language": language,
+                "culture": culture,
+                "generated_at": datetime.now().isoformat(),
+                "strings": strings
+            }, f, ensure_ascii=False, indent=2)
+        print(f"   ✅ Wrote {len(strings)} strings to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build precomputed localized bundles for static text")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Translate static strings into bundles")
+    build_parser.add_argument("--languages", nargs="+", default=sorted(BUNDLE_CULTURES))
+    build_parser.add_argument("--locales-dir", default=DEFAULT_LOCALES_DIR)
+    build_parser.add_argument("--feature-dict", default=DEFAULT_FEATURE_DICT_PATH)
+    build_parser.add_argument("--force", action="store_true", help="Retranslate strings already in the bundle")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_bundles(args.languages, args.locales_dir, args.feature_dict, args.force)
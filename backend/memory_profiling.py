@@ -0,0 +1,275 @@
+"""
+memory_profiling.py - Memory accounting for long-running API workers.
+
+- Per-stage allocations: while tracemalloc is tracing, every timed() stage records how much traced
+  memory it left allocated (process-wide counter, so concurrent requests blur individual numbers;
+  the trend per stage is what matters for leak hunting).
+- Per request class: RSS after each request and growth of the process peak RSS, by route.
+- Snapshots: tracemalloc snapshots taken on demand and diffed (what grew between two points in time).
+- Memory budget: HIV_MEMORY_BUDGET_MB. Over budget, /ready reports not ready so the load balancer
+  drains the worker; with HIV_MEMORY_BUDGET_ACTION=exit the worker also shuts down gracefully
+  (api/serve_prefork.py or the process supervisor starts a fresh one). Draining only works when
+  each worker has its own address: pre-forked workers share one socket, so api/serve_prefork.py
+  defaults the action to exit.
+
+tracemalloc is off unless HIV_TRACEMALLOC=1 (or enabled through the admin endpoint): it roughly
+doubles allocation cost. RSS accounting and the budget work without it.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from .metrics import REGISTRY, add_stage_hook, remove_stage_hook
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGE_MEMORY_GROWTH = REGISTRY.histogram(
+    "hiv_stage_memory_growth_bytes", "Traced memory left allocated by a pipeline stage (tracemalloc on)",
+    ["stage"], buckets=(1024, 16384, 131072, 1048576, 8388608, 67108864, 268435456)
+)
+BUDGET_EXCEEDED = REGISTRY.counter("hiv_memory_budget_exceeded_total", "Times the worker went over its memory budget")
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Allocations by the import system and tracemalloc itself are noise in snapshot diffs
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (0 if unknown)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def peak_rss() -> int:
+    """High-water mark of the resident set size in bytes"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # kB on Linux, bytes on macOS
+
+
+def start_tracing(frames: int = None) -> None:
+    frames = frames or int(os.getenv("HIV_TRACEMALLOC_FRAMES", "1"))
+    add_stage_hook(STAGE_MEMORY)
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        print(f"🔍 tracemalloc started ({frames} frame(s) per allocation)")
+
+
+def stop_tracing() -> None:
+    remove_stage_hook(STAGE_MEMORY)
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        SNAPSHOTS.clear()  # snapshots cannot be compared across tracing sessions
+        print("🔍 tracemalloc stopped")
+
+
+class StageMemoryHook:
+    """timed() hook: traced memory still allocated when each stage finishes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict] = {}
+
+    def enter(self, stage: str) -> Optional[int]:
+        return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+
+    def exit(self, stage: str, started_at: Optional[int]) -> None:
+        if started_at is None or not tracemalloc.is_tracing():
+            return
+        delta = tracemalloc.get_traced_memory()[0] - started_at
+        STAGE_MEMORY_GROWTH.observe(max(delta, 0), stage=stage)
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"calls": 0, "net_bytes": 0, "max_growth_bytes": 0})
+            entry["calls"] += 1
+            entry["net_bytes"] += delta
+            entry["max_growth_bytes"] = max(entry["max_growth_bytes"], delta)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per stage: calls, net traced bytes left behind (all calls), largest single growth"""
+        with self._lock:
+            return {
+                stage: dict(entry, avg_net_bytes=round(entry["net_bytes"] / entry["calls"]))
+                for stage, entry in sorted(self._stages.items(), key=lambda item: -item[1]["net_bytes"])
+            }
+
+
+class RequestMemoryTracker:
+    """RSS and peak-RSS growth per request class (route template), plus the worker memory budget"""
+
+    def __init__(self, budget_mb: float = None, budget_action: str = None):
+        budget_mb = float(os.getenv("HIV_MEMORY_BUDGET_MB", "0")) if budget_mb is None else budget_mb
+        self.budget_bytes = int(budget_mb * 1024 * 1024) if budget_mb > 0 else None
+        self.budget_action = budget_action or os.getenv("HIV_MEMORY_BUDGET_ACTION", "drain")
+        self.over_budget = False
+        self._exit_requested = False
+        self._lock = threading.Lock()
+        self._classes: Dict[str, Dict] = {}
+
+    def start(self) -> Tuple[int, int]:
+        return current_rss(), peak_rss()
+
+    def finish(self, request_class: str, started: Tuple[int, int]) -> None:
+        rss_before, peak_before = started
+        rss_after, peak_after = current_rss(), peak_rss()
+        with self._lock:
+            entry = self._classes.setdefault(request_class, {
+                "requests": 0, "max_rss_bytes": 0, "max_rss_delta_bytes": 0,
+                "peak_rss_growth_bytes": 0, "requests_raising_peak": 0,
+            })
+            entry["requests"] += 1
+            entry["max_rss_bytes"] = max(entry["max_rss_bytes"], rss_after)
+            entry["max_rss_delta_bytes"] = max(entry["max_rss_delta_bytes"], rss_after - rss_before)
+            if peak_after > peak_before:
+                # This request class was running when the worker reached a new high-water mark
+                entry["peak_rss_growth_bytes"] += peak_after - peak_before
+                entry["requests_raising_peak"] += 1
+        self.check_budget(rss_after)
+
+    def check_budget(self, rss: int = None) -> bool:
+        if self.budget_bytes is None:
+            return False
+        rss = current_rss() if rss is None else rss
+        over = rss > self.budget_bytes
+        if over and not self.over_budget:
+            BUDGET_EXCEEDED.inc()
+            print(f"⚠️  Worker {os.getpid()} over memory budget: {rss / 1048576:.0f} MB > "
+                  f"{self.budget_bytes / 1048576:.0f} MB (action: {self.budget_action})")
+            if self.budget_action == "exit" and not self._exit_requested:
+                self._exit_requested = True
+                # Graceful: uvicorn stops accepting, finishes in-flight requests, then exits
+                os.kill(os.getpid(), signal.SIGTERM)
+        self.over_budget = over
+        return over
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: dict(entry) for name, entry in self._classes.items()}
+
+
+class SnapshotStore:
+    """tracemalloc snapshots by id (bounded), for diffs between points in time"""
+
+    def __init__(self, max_snapshots: int = None):
+        self.max_snapshots = max_snapshots or int(os.getenv("HIV_MEMORY_MAX_SNAPSHOTS", "10"))
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[str, Tuple[Dict, tracemalloc.Snapshot]]" = OrderedDict()
+
+    def take(self, label: str = None) -> Dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing (set HIV_TRACEMALLOC=1 or enable it first)")
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        stats = snapshot.statistics("filename")
+        info = {
+            "snapshot_id": uuid.uuid4().hex[:12],
+            "label": label,
+            "taken_at": datetime.now().isoformat(),
+            "monotonic": time.monotonic(),
+            "traced_bytes": sum(stat.size for stat in stats),
+            "rss_bytes": current_rss(),
+        }
+        with self._lock:
+            self._snapshots[info["snapshot_id"]] = (info, snapshot)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return {key: value for key, value in info.items() if key != "monotonic"}
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            return [{k: v for k, v in info.items() if k != "monotonic"} for info, _ in self._snapshots.values()]
+
+    def diff(self, from_id: str = None, to_id: str = None, key_type: str = "lineno", limit: int = 25) -> Dict:
+        """Top allocation sites by growth from one snapshot to another (default: the last two)"""
+        with self._lock:
+            ids = list(self._snapshots)
+            if from_id is None and to_id is None:
+                if len(ids) < 2:
+                    raise ValueError("Need at least two snapshots to diff")
+                from_id, to_id = ids[-2], ids[-1]
+            elif to_id is None:
+                to_id = ids[-1] if ids else None
+            if from_id not in self._snapshots or to_id not in self._snapshots:
+                raise KeyError("Unknown snapshot id")
+            (from_info, older), (to_info, newer) = self._snapshots[from_id], self._snapshots[to_id]
+
+        differences = newer.compare_to(older, key_type)
+        return {
+            "from": from_id,
+            "to": to_id,
+            "seconds_between": round(to_info["monotonic"] - from_info["monotonic"], 1),
+            "traced_bytes_diff": to_info["traced_bytes"] - from_info["traced_bytes"],
+            "rss_bytes_diff": to_info["rss_bytes"] - from_info["rss_bytes"],
+            "top": [
+                {
+                    "location": " <- ".join(f"{os.path.basename(frame.filename)}:{frame.lineno}" for frame in stat.traceback),
+                    "size_diff_bytes": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                }
+                for stat in differences[:limit]
+            ],
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+
+
+STAGE_MEMORY = StageMemoryHook()
+REQUEST_MEMORY = RequestMemoryTracker()
+SNAPSHOTS = SnapshotStore()
+
+REGISTRY.gauge("hiv_process_resident_memory_bytes", "Current RSS of this worker").set_function(
+    lambda: [({}, current_rss())]
+)
+REGISTRY.gauge("hiv_process_peak_resident_memory_bytes", "Peak RSS of this worker").set_function(
+    lambda: [({}, peak_rss())]
+)
+REGISTRY.gauge("hiv_request_class_max_rss_bytes", "Largest RSS seen after a request, by route", ["route"]).set_function(
+    lambda: [({"route": route}, entry["max_rss_bytes"]) for route, entry in REQUEST_MEMORY.stats().items()]
+)
+REGISTRY.gauge("hiv_memory_over_budget", "1 while the worker RSS is over HIV_MEMORY_BUDGET_MB").set_function(
+    lambda: [({}, 1 if REQUEST_MEMORY.over_budget else 0)]
+)
+
+
+def memory_report() -> Dict:
+    traced_current, traced_peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": current_rss(),
+        "peak_rss_bytes": peak_rss(),
+        "budget_bytes": REQUEST_MEMORY.budget_bytes,
+        "over_budget": REQUEST_MEMORY.over_budget,
+        "budget_action": REQUEST_MEMORY.budget_action,
+        "tracemalloc": {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+            "traced_bytes": traced_current,
+            "traced_peak_bytes": traced_peak,
+        },
+        "stages": STAGE_MEMORY.stats(),
+        "request_classes": REQUEST_MEMORY.stats(),
+        "snapshots": SNAPSHOTS.list(),
+    }
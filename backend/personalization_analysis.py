@@ -0,0 +1,274 @@
+"""
+personalization_analysis.py - Vectorized replacement for the pairwise _compare_users loop in batch_process.
+
+Interventions and top risk factors are encoded as sparse 0/1 matrices (users x distinct items), so
+same-stage overlap statistics come from blocked sparse matrix products instead of Python set
+operations per pair. For very large batches the same-stage statistics are estimated from a sample of
+pairs using MinHash signatures.
+
+StreamingPersonalizationStats gives the same statistics for streamed batches in bounded memory.
+
+A pair (a, b) is "truly personalized" exactly as in HIVPreventionSystem._compare_users:
+different stages, or |A symmetric_difference B| > |A intersection B| for their intervention names
+(equivalently Jaccard(A, B) < 0.5).
+"""
+
+import random
+from collections import Counter
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+def _encode_sets(item_lists: List[List[str]]) -> sparse.csr_matrix:
+    """Users x distinct-items 0/1 CSR matrix (duplicates within a user collapse, like a set)."""
+    vocabulary: Dict[str, int] = {}
+    rows, cols = [], []
+    for row, items in enumerate(item_lists):
+        for item in set(items):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(item, len(vocabulary)))
+    data = np.ones(len(rows), dtype=np.int32)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(item_lists), max(1, len(vocabulary))))
+
+
+def encode_results(results: List[Dict]) -> Tuple[np.ndarray, sparse.csr_matrix, sparse.csr_matrix]:
+    """(risk stages, intervention-name matrix, top-3 factor matrix) for a list of process_user results."""
+    stages = np.array([r["risk_prediction"]["risk_stage"] for r in results], dtype=np.int64)
+    interventions = _encode_sets(
+        [[i["name"] for i in r["intervention_plan"]["personalized_plan"]] for r in results]
+    )
+    factors = _encode_sets(
+        [[f["feature"] for f in r["risk_prediction"]["personalized_factors"][:3]] for r in results]
+    )
+    return stages, interventions, factors
+
+
+class PersonalizationAnalyzer:
+    """Bulk same-stage overlap statistics (exact up to max_exact_pairs, MinHash-sampled beyond)."""
+
+    def __init__(self, max_exact_pairs: int = 50_000_000, sample_pairs: int = 200_000,
+                 num_perm: int = 64, block_rows: int = 1024, seed: int = 0):
+        self.max_exact_pairs = max_exact_pairs
+        self.sample_pairs = sample_pairs
+        self.num_perm = num_perm
+        self.block_rows = block_rows
+        self.seed = seed
+
+    def analyze(self, results: List[Dict], include_pairwise: bool = False) -> Tuple[Dict, Optional[List[Dict]]]:
+        """
+        Returns (personalization_analysis, comparisons).
+        comparisons is None unless include_pairwise is set (it is O(n^2) in size by nature).
+        """
+        n = len(results)
+        if n < 2:
+            return {"analysis": "No comparisons available"}, ([] if include_pairwise else None)
+
+        stages, interventions, factors = encode_results(results)
+        total_pairs = n * (n - 1) // 2
+        group_indices = [np.flatnonzero(stages == stage) for stage in np.unique(stages)]
+        same_stage_pairs = sum(len(g) * (len(g) - 1) // 2 for g in group_indices)
+
+        if same_stage_pairs <= self.max_exact_pairs:
+            truly_personalized = sum(self._count_personalized_exact(interventions[g]) for g in group_indices)
+            method = "exact"
+        else:
+            rate, sampled = self._estimate_personalized_rate(interventions, group_indices)
+            truly_personalized = int(round(rate * same_stage_pairs))
+            method = f"minhash_sample ({sampled} pairs, {self.num_perm} permutations)"
+
+        analysis = {
+            "total_comparisons": total_pairs,
+            "same_stage_comparisons": same_stage_pairs,
+            "truly_personalized": truly_personalized,
+            "personalization_rate": truly_personalized / same_stage_pairs if same_stage_pairs else 0,
+            "analysis": f"{truly_personalized}/{same_stage_pairs} same-stage users got different plans",
+            "method": method
+        }
+
+        comparisons = None
+        if include_pairwise:
+            comparisons = self._pairwise(results, stages, interventions, factors)
+        return analysis, comparisons
+
+    def _count_personalized_exact(self, matrix: sparse.csr_matrix) -> int:
+        """Count pairs i<j with symmetric difference > intersection, in row blocks to bound memory."""
+        k = matrix.shape[0]
+        if k < 2:
+            return 0
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+        matrix_t = matrix.T.tocsc()
+        count = 0
+        for start in range(0, k, self.block_rows):
+            stop = min(k, start + self.block_rows)
+            common = (matrix[start:stop] @ matrix_t).toarray()
+            different = sizes[start:stop, None] + sizes[None, :] - 2 * common
+            personalized = different > common
+            # Only pairs with j > i
+            upper = np.arange(k)[None, :] > np.arange(start, stop)[:, None]
+            count += int(np.count_nonzero(personalized & upper))
+        return count
+
+    def _minhash_signatures(self, matrix: sparse.csr_matrix) -> np.ndarray:
+        """Users x num_perm MinHash signatures (empty sets get an all-max signature, so they match each other)."""
+        prime = np.uint64((1 << 61) - 1)
+        rng = np.random.default_rng(self.seed)
+        a = rng.integers(1, 1 << 61, size=self.num_perm, dtype=np.uint64)
+        b = rng.integers(0, 1 << 61, size=self.num_perm, dtype=np.uint64)
+
+        matrix = matrix.tocsr()
+        matrix.sort_indices()
+        cols = matrix.indices.astype(np.uint64)
+        # Hash every (user, item) entry under every permutation (wraparound multiply is fine for hashing)
+        hashes = (cols[:, None] * a[None, :] + b[None, :]) % prime
+
+        signatures = np.full((matrix.shape[0], self.num_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+        row_lengths = np.diff(matrix.indptr)
+        non_empty = np.flatnonzero(row_lengths)
+        if len(non_empty):
+            signatures[non_empty] = np.minimum.reduceat(hashes, matrix.indptr[non_empty], axis=0)
+        return signatures
+
+    def _estimate_personalized_rate(self, matrix: sparse.csr_matrix, group_indices: List[np.ndarray]) -> Tuple[float, int]:
+        """Estimate the same-stage personalized rate from sampled pairs using MinHash overlap estimates."""
+        rng = np.random.default_rng(self.seed)
+        signatures = self._minhash_signatures(matrix)
+        sizes = np.asarray(matrix.sum(axis=1)).ravel()
+
+        groups = [g for g in group_indices if len(g) >= 2]
+        pair_counts = np.array([len(g) * (len(g) - 1) / 2 for g in groups], dtype=float)
+        # Stratified by stage, proportional to each stage's number of pairs
+        chosen_groups = rng.choice(len(groups), size=self.sample_pairs, p=pair_counts / pair_counts.sum())
+
+        personalized = 0
+        for group_id in np.unique(chosen_groups):
+            members = groups[group_id]
+            m = int(np.count_nonzero(chosen_groups == group_id))
+            first = rng.integers(0, len(members), size=m)
+            second = (first + rng.integers(1, len(members), size=m)) % len(members)  # never the same user
+            left, right = members[first], members[second]
+
+            jaccard = (signatures[left] == signatures[right]).mean(axis=1)
+            # Recover the (integer) intersection size from the Jaccard estimate and the exact set sizes:
+            # |A n B| = J (|A| + |B|) / (1 + J). Snapping to the nearest feasible integer removes most
+            # of the estimator noise for the small sets plans have.
+            total = sizes[left] + sizes[right]
+            common = np.clip(np.rint(jaccard * total / (1 + jaccard)), 0, np.minimum(sizes[left], sizes[right]))
+            different = total - 2 * common
+            personalized += int(np.count_nonzero(different > common))
+        return personalized / self.sample_pairs, self.sample_pairs
+
+    def _pairwise(self, results: List[Dict], stages: np.ndarray, interventions: sparse.csr_matrix,
+                  factors: sparse.csr_matrix) -> List[Dict]:
+        """Per-pair detail in the same shape as HIVPreventionSystem._compare_users (i < j order)."""
+        n = len(results)
+        sizes = np.asarray(interventions.sum(axis=1)).ravel()
+        interventions_t = interventions.T.tocsc()
+        factors_t = factors.T.tocsc()
+        user_ids = [r["user_id"] for r in results]
+
+        comparisons = []
+        for start in range(0, n, self.block_rows):
+            stop = min(n, start + self.block_rows)
+            common = (interventions[start:stop] @ interventions_t).toarray()
+            different = sizes[start:stop, None] + sizes[None, :] - 2 * common
+            common_factors = (factors[start:stop] @ factors_t).toarray()
+            same_stage = stages[start:stop, None] == stages[None, :]
+            for row, i in enumerate(range(start, stop)):
+                for j in range(i + 1, n):
+                    same = bool(same_stage[row, j])
+                    comparisons.append({
+                        "user1_id": user_ids[i],
+                        "user2_id": user_ids[j],
+                        "same_risk_stage": same,
+                        "common_interventions": int(common[row, j]),
+                        "different_interventions": int(different[row, j]),
+                        "common_risk_factors": int(common_factors[row, j]),
+                        "is_truly_personalized": bool(different[row, j] > common[row, j]) if same else True
+                    })
+        return comparisons
+
+
+class StreamingPersonalizationStats:
+    """
+    Incremental same-stage personalization statistics for streamed batches (results are not kept).
+    Users are counted by (stage, intervention-name set); plans repeat a lot, so this stays small
+    and the statistics are exact. If the number of distinct plans passes max_distinct, the counts
+    are replaced by a uniform reservoir sample of max_distinct users and the rate is estimated.
+    """
+
+    def __init__(self, max_distinct: int = 2000, seed: int = 0):
+        self.max_distinct = max_distinct
+        self.users = 0
+        self.stage_counts: Counter = Counter()
+        self._plan_counts: Optional[Counter] = Counter()
+        self._reservoir: List[Tuple[int, FrozenSet[str]]] = []
+        self._random = random.Random(seed)
+
+    def add(self, result: Dict) -> None:
+        stage = int(result["risk_prediction"]["risk_stage"])
+        names = frozenset(i["name"] for i in result["intervention_plan"]["personalized_plan"])
+        self.users += 1
+        self.stage_counts[stage] += 1
+
+        if self._plan_counts is not None:
+            self._plan_counts[(stage, names)] += 1
+            if len(self._plan_counts) > self.max_distinct:
+                self._switch_to_sampling()
+            return
+
+        # Reservoir sampling (Algorithm R)
+        slot = self._random.randrange(self.users)
+        if slot < self.max_distinct:
+            self._reservoir[slot] = (stage, names)
+
+    def _switch_to_sampling(self) -> None:
+        expanded = [key for key, count in self._plan_counts.items() for _ in range(count)]
+        self._random.shuffle(expanded)
+        self._reservoir = expanded[:self.max_distinct]
+        self._plan_counts = None
+
+    def summary(self) -> Dict:
+        """Same fields as PersonalizationAnalyzer.analyze's analysis"""
+        if self.users < 2:
+            return {"analysis": "No comparisons available"}
+
+        same_stage_pairs = sum(count * (count - 1) // 2 for count in self.stage_counts.values())
+        if self._plan_counts is not None:
+            truly_personalized = self._count_personalized(self._plan_counts)
+            method = "exact_streaming"
+        else:
+            sample = Counter(self._reservoir)
+            sample_pairs = sum(
+                count * (count - 1) // 2 for count in Counter(stage for stage, _ in self._reservoir).values()
+            )
+            rate = self._count_personalized(sample) / sample_pairs if sample_pairs else 0
+            truly_personalized = int(round(rate * same_stage_pairs))
+            method = f"reservoir_sample ({len(self._reservoir)} users)"
+
+        return {
+            "total_comparisons": self.users * (self.users - 1) // 2,
+            "same_stage_comparisons": same_stage_pairs,
+            "truly_personalized": truly_personalized,
+            "personalization_rate": truly_personalized / same_stage_pairs if same_stage_pairs else 0,
+            "analysis": f"{truly_personalized}/{same_stage_pairs} same-stage users got different plans",
+            "method": method
+        }
+
+    @staticmethod
+    def _count_personalized(plan_counts: Counter) -> int:
+        """Same-stage pairs whose plans differ more than they overlap (identical plans never do)"""
+        by_stage: Dict[int, List[Tuple[FrozenSet[str], int]]] = {}
+        for (stage, names), count in plan_counts.items():
+            by_stage.setdefault(stage, []).append((names, count))
+
+        personalized = 0
+        for plans in by_stage.values():
+            for a in range(len(plans)):
+                names_a, count_a = plans[a]
+                for b in range(a + 1, len(plans)):
+                    names_b, count_b = plans[b]
+                    if len(names_a ^ names_b) > len(names_a & names_b):
+                        personalized += count_a * count_b
+        return personalized
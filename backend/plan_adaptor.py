@@ -3,92 +3,160 @@ plan_adaptor.py - Culturally adapts personalized plans for different languages.
 """
 
 import google.generativeai as genai
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 import json
+import os
+import time
+from .plan_model import overlay_plan_text
+from .metrics import timed
+from .request_capture import REQUEST_CAPTURE
 
 class PlanAdaptor:
     """Culturally adapts the user-facing text in a generated plan for a target language/culture."""
 
-    def __init__(self, api_key: str):
-        """Initialize with the same Gemini API key."""
+    def __init__(self, api_key: str, translation_memory=None, localized_content=None):
+        """
+        Initialize with the same Gemini API key.
+        Optional shared TranslationMemory and LocalizedContent (precomputed static bundles) are consulted first.
+        """
         genai.configure(api_key=api_key)
         self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self.translation_memory = translation_memory
+        self.localized_content = localized_content
 
     def culturally_adapt_plan(self, original_plan: Dict, target_language: str, target_culture: str = None) -> Dict:
         """
         Culturally adapts all user-facing text in the plan.
         Returns a new dictionary with adapted expressions while keeping the same meaning.
+        Segments already in the translation memory are filled locally; only unseen ones go to Gemini.
         """
-        # Extract the structure and content
-        plan_content = self._extract_plan_content(original_plan)
-        
-        # Create a prompt for CULTURAL ADAPTATION (not just translation)
-        adaptation_prompt = self._create_adaptation_prompt(
-            plan_content, 
-            target_language, 
-            target_culture or target_language
-        )
+        return self.culturally_adapt_plans([original_plan], target_language, target_culture)[0]
 
-        try:
-            # Call Gemini for cultural adaptation
-            response = self.model.generate_content(adaptation_prompt)
-            adapted_content = self._parse_adaptation_response(response.text)
-            
-            # Apply the adapted content back to the original structure
-            culturally_adapted_plan = self._apply_adaptations(original_plan, adapted_content)
-            
-            # Add metadata
-            culturally_adapted_plan['adaptation_metadata'] = {
-                'original_language': 'en',
-                'target_language': target_language,
-                'target_culture': target_culture or target_language,
-                'is_culturally_adapted': True,
-                'adaptation_type': 'cultural_rewrite'
-            }
-            
-            return culturally_adapted_plan
-            
-        except Exception as e:
-            print(f"⚠️  Cultural adaptation failed: {e}. Returning original plan.")
-            return original_plan
-
-    def _extract_plan_content(self, plan: Dict) -> Dict:
-        """Extract the meaningful content that needs cultural adaptation."""
-        content = {
-            'plan_overview': {
-                'main_goal': plan.get('plan_summary', {}).get('your_main_focus', ''),
-                'success_tip': plan.get('plan_summary', {}).get('key_to_success', '')
-            },
-            'phases': []
-        }
-        
-        for phase in plan.get('personalized_plan', []):
-            phase_content = {
-                'phase_number': len(content['phases']) + 1,
-                'original_title': phase.get('name', ''),
-                'core_behavioral_goal': phase.get('description', ''),  # The main habit
-                'why_this_matters': phase.get('rationale', ''),  # Personal relevance
-                'weekly_tasks': phase.get('simple_steps', []),  # Concrete actions
-                'duration_weeks': phase.get('duration_weeks', 2),
-                'intensity': phase.get('intensity', 'medium')
-            }
-            content['phases'].append(phase_content)
-            
-        return content
+    def culturally_adapt_plans(self, original_plans: List[Dict], target_language: str,
+                               target_culture: str = None, token_budget: int = None) -> List[Dict]:
+        """
+        Culturally adapts several plans for the same language/culture with as few Gemini calls as possible.
+        Unseen segments from all plans are deduplicated and packed into prompts of at most token_budget
+        (estimated) tokens. Each response is validated; a plan whose segments could not all be adapted
+        is returned unchanged, the others are adapted. Output order matches input order.
+        """
+        target_culture = target_culture or target_language
+
+        # Extract every user-facing text segment per plan (deduplicated, in reading order)
+        plan_segments = [self._extract_segments(plan) for plan in original_plans]
+        all_segments = list(dict.fromkeys(segment for segments in plan_segments for segment in segments))
+        adapted_segments, from_memory = self.adapt_segments(all_segments, target_language, target_culture, token_budget)
+
+        adapted_plans = []
+        for original_plan, segments in zip(original_plans, plan_segments):
+            missing = [segment for segment in segments if segment not in adapted_segments]
+            if missing:
+                print(f"⚠️  Cultural adaptation incomplete ({len(missing)} segments). Returning original plan.")
+                adapted_plans.append(original_plan)
+                continue
 
-    def _create_adaptation_prompt(self, plan_content: Dict, target_language: str, target_culture: str) -> str:
-        """Creates a prompt for CULTURAL ADAPTATION (not direct translation)."""
+            # Apply the adapted content back to the original structure (with metadata)
+            memory_hits = sum(1 for segment in segments if segment in from_memory)
+            culturally_adapted_plan = self._apply_adaptations(
+                original_plan,
+                adapted_segments,
+                adaptation_metadata={
+                    'original_language': 'en',
+                    'target_language': target_language,
+                    'target_culture': target_culture,
+                    'is_culturally_adapted': True,
+                    'adaptation_type': 'cultural_rewrite',
+                    'segments_total': len(segments),
+                    'segments_from_memory': memory_hits,
+                    'segments_adapted_by_llm': len(segments) - memory_hits
+                }
+            )
+            adapted_plans.append(culturally_adapted_plan)
+
+        return adapted_plans
+
+    def adapt_segments(self, segments: List[str], target_language: str, target_culture: str,
+                       token_budget: int = None) -> Tuple[Dict[str, str], set]:
+        """
+        Adapt individual text segments. Lookup order: precomputed static bundle, translation memory, Gemini.
+        Returns ({segment: adapted_text}, segments served without Gemini). Segments whose Gemini
+        chunk failed validation are simply absent from the result.
+        """
+        if token_budget is None:
+            token_budget = int(os.getenv("HIV_ADAPTATION_TOKEN_BUDGET", "6000"))
+
+        adapted_segments = {}
+        if self.localized_content is not None:
+            adapted_segments = self.localized_content.lookup_many(segments, target_language)
+        if self.translation_memory is not None:
+            remaining = [segment for segment in segments if segment not in adapted_segments]
+            try:
+                adapted_segments.update(
+                    self.translation_memory.lookup_many(remaining, target_language, target_culture)
+                )
+            except Exception as e:
+                print(f"⚠️  Translation memory lookup failed: {e}")
+        unseen = [segment for segment in segments if segment not in adapted_segments]
+        from_memory = set(adapted_segments)
+
+        for chunk in self._chunk_by_token_budget(unseen, token_budget):
+            try:
+                # Create a prompt for CULTURAL ADAPTATION (not just translation) of the unseen segments only
+                adaptation_prompt = self._create_adaptation_prompt(chunk, target_language, target_culture)
+
+                # Call Gemini for cultural adaptation
+                started = time.perf_counter()
+                with timed("adaptation_llm_wait"):
+                    response = self.model.generate_content(adaptation_prompt)
+                if REQUEST_CAPTURE.enabled:
+                    REQUEST_CAPTURE.record_llm("adaptation", adaptation_prompt, response.text,
+                                               time.perf_counter() - started)
+                new_adaptations = self._validate_segments(chunk, self._parse_adaptation_response(response.text))
+            except Exception as e:
+                print(f"⚠️  Cultural adaptation failed for {len(chunk)} segments: {e}")
+                continue
+            if self.translation_memory is not None:
+                try:
+                    self.translation_memory.store_many(new_adaptations, target_language, target_culture)
+                except Exception as e:
+                    print(f"⚠️  Translation memory write failed: {e}")
+            adapted_segments.update(new_adaptations)
+
+        return adapted_segments, from_memory
+
+    def _chunk_by_token_budget(self, segments: List[str], token_budget: int) -> List[List[str]]:
+        """Split segments into prompt-sized groups (rough estimate: ~4 characters per token, plus JSON overhead)."""
+        chunks, current, current_tokens = [], [], 0
+        for segment in segments:
+            tokens = len(segment) // 4 + 10
+            if current and current_tokens + tokens > token_budget:
+                chunks.append(current)
+                current, current_tokens = [], 0
+            current.append(segment)
+            current_tokens += tokens
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _extract_segments(self, plan: Dict) -> List[str]:
+        """Extract the meaningful text segments that need cultural adaptation."""
+        return extract_plan_segments(plan)
+
+    def _create_adaptation_prompt(self, segments: List[str], target_language: str, target_culture: str) -> str:
+        """Creates a prompt for CULTURAL ADAPTATION (not direct translation) of individual text segments."""
+        numbered_segments = [{"id": i, "text": text} for i, text in enumerate(segments)]
         prompt = f"""
         ROLE: You are a cultural adaptation expert for health and wellness programs.
         
-        TASK: Take this behavioral intervention plan and REWRITE it appropriately for someone from {target_culture} culture who speaks {target_language}.
+        TASK: Below are text segments (phase titles, behavioral goals, rationales and weekly tasks) from a behavioral
+        intervention plan, in reading order. REWRITE each one appropriately for someone from {target_culture} culture who speaks {target_language}.
         
         IMPORTANT GUIDELINES:
         1. DO NOT directly translate word-for-word. Instead, EXPRESS THE SAME MEANING using natural, colloquial expressions from {target_language}.
         2. Use culturally relevant examples, metaphors, and phrasing that would feel natural to a {target_culture} speaker.
         3. Maintain the SUPPORTIVE, PRACTICAL tone of the original plan.
         4. Keep ALL behavioral goals, weekly tasks, and health messages exactly the same in meaning.
-        5. Structure should remain identical: same phases, same weekly tasks, same duration.
+        5. Adapt EVERY segment separately. Do not merge, split, skip or reorder segments.
         6. Make it feel like this plan was originally written in {target_language} by someone from {target_culture}.
         
         ADAPTATION EXAMPLES:
@@ -97,23 +165,13 @@ class PlanAdaptor:
         - Instead of "Practice saying no" → Use culturally appropriate ways of setting boundaries
         - Health concepts should use locally understood terms
         
-        ORIGINAL PLAN CONTENT (in English):
-        {json.dumps(plan_content, indent=2, ensure_ascii=False)}
+        ORIGINAL SEGMENTS (in English):
+        {json.dumps(numbered_segments, indent=2, ensure_ascii=False)}
         
-        Return ONLY a JSON object with this exact structure:
+        Return ONLY a JSON object with this exact structure (one entry per original id):
         {{
-            "plan_overview": {{
-                "adapted_main_goal": "Culturally adapted version of the main goal",
-                "adapted_success_tip": "Culturally adapted success tip"
-            }},
-            "phases": [
-                {{
-                    "phase_number": 1,
-                    "adapted_title": "Culturally adapted phase title",
-                    "adapted_goal": "Culturally adapted behavioral goal",
-                    "adapted_rationale": "Culturally adapted 'why this matters'",
-                    "adapted_weekly_tasks": ["Task 1 adapted", "Task 2 adapted"]
-                }}
+            "segments": [
+                {{"id": 0, "adapted": "Culturally adapted version of segment 0"}}
             ]
         }}
         """
@@ -133,25 +191,43 @@ class PlanAdaptor:
             print(f"⚠️  Failed to parse adaptation: {e}")
             raise
 
-    def _apply_adaptations(self, original_plan: Dict, adapted_content: Dict) -> Dict:
-        """Apply culturally adapted content back to the plan structure."""
-        import copy
-        adapted_plan = copy.deepcopy(original_plan)
-        
-        # Apply overview adaptations
-        if 'plan_summary' in adapted_plan and 'plan_overview' in adapted_content:
-            adapted_plan['plan_summary']['your_main_focus'] = \
-                adapted_content['plan_overview']['adapted_main_goal']
-            adapted_plan['plan_summary']['key_to_success'] = \
-                adapted_content['plan_overview']['adapted_success_tip']
-        
-        # Apply phase adaptations
-        for i, phase in enumerate(adapted_plan.get('personalized_plan', [])):
-            if i < len(adapted_content['phases']):
-                adapted_phase = adapted_content['phases'][i]
-                phase['name'] = adapted_phase['adapted_title']
-                phase['description'] = adapted_phase['adapted_goal']
-                phase['rationale'] = adapted_phase['adapted_rationale']
-                phase['simple_steps'] = adapted_phase['adapted_weekly_tasks']
-        
-        return adapted_plan
\ No newline at end of file
+    def _validate_segments(self, segments: List[str], adapted_content: Dict) -> Dict[str, str]:
+        """Map Gemini's numbered answers back to their source segments (all ids must be answered)."""
+        adapted_by_id = {}
+        for item in adapted_content.get('segments', []):
+            try:
+                segment_id = int(item['id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            adapted = item.get('adapted')
+            if 0 <= segment_id < len(segments) and isinstance(adapted, str) and adapted.strip():
+                adapted_by_id[segment_id] = adapted
+
+        missing = len(segments) - len(adapted_by_id)
+        if missing:
+            raise ValueError(f"Adaptation response is missing {missing} of {len(segments)} segments")
+        return {segments[i]: adapted for i, adapted in adapted_by_id.items()}
+
+    def _apply_adaptations(self, original_plan: Dict, adapted_segments: Dict[str, str], **extra_fields) -> Dict:
+        """Apply culturally adapted segments back to the plan structure."""
+        return apply_segment_adaptations(original_plan, adapted_segments, **extra_fields)
+
+
+def extract_plan_segments(plan: Dict) -> List[str]:
+    """User-facing text segments of a plan (deduplicated, in reading order)."""
+    summary = plan.get('plan_summary', {})
+    texts = [summary.get('your_main_focus', ''), summary.get('key_to_success', '')]
+    
+    for phase in plan.get('personalized_plan', []):
+        texts.append(phase.get('name', ''))
+        texts.append(phase.get('description', ''))  # The main habit
+        texts.append(phase.get('rationale', ''))  # Personal relevance
+        texts.extend(phase.get('simple_steps', []))  # Concrete actions
+
+    # Keep reading order (gives Gemini context) but send each distinct string once
+    return list(dict.fromkeys(t for t in texts if isinstance(t, str) and t.strip()))
+
+
+def apply_segment_adaptations(original_plan: Dict, adapted_segments: Dict[str, str], **extra_fields) -> Dict:
+    """Adapted plan as an immutable overlay on the original (no deep copy; unchanged parts are shared)."""
+    return overlay_plan_text(original_plan, adapted_segments, **extra_fields)
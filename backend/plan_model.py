@@ -0,0 +1,112 @@
+"""
+plan_model.py - Immutable plan overlays with structural sharing.
+
+An adapted plan is a PlanOverlay: the original plan plus only the fields that changed. Everything
+else (timelines, explanations, target features, outcomes) is shared with the original instead of
+deep-copied, and the overlay serializes straight to the usual plan JSON shape.
+"""
+
+import json
+from collections.abc import Mapping
+from typing import Any, Dict, Optional
+
+
+class PlanOverlay(Mapping):
+    """Read-only mapping: `changes` layered over `base` (neither is ever mutated)."""
+
+    __slots__ = ("_base", "_changes")
+
+    def __init__(self, base: Mapping, changes: Optional[Mapping] = None):
+        self._base = base
+        self._changes = dict(changes or {})
+
+    def __getitem__(self, key):
+        if key in self._changes:
+            return self._changes[key]
+        return self._base[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._changes or key in self._base
+
+    def __iter__(self):
+        yield from self._base
+        for key in self._changes:
+            if key not in self._base:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._base) + sum(1 for key in self._changes if key not in self._base)
+
+    def __repr__(self) -> str:
+        return f"PlanOverlay({dict(self)!r})"
+
+    def __reduce__(self):
+        return (PlanOverlay, (self._base, self._changes))
+
+    def with_changes(self, **changes) -> "PlanOverlay":
+        """New overlay on the same base with additional/replaced fields."""
+        return PlanOverlay(self._base, {**self._changes, **changes})
+
+
+def to_plain(obj: Any) -> Any:
+    """Deep-convert overlays (and tuples) to plain dicts/lists, e.g. for Firestore writes."""
+    if isinstance(obj, Mapping):
+        return {key: to_plain(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_plain(value) for value in obj]
+    return obj
+
+
+def json_default(obj: Any) -> Any:
+    """json.dumps hook: an overlay serializes as the plan it represents (one level at a time, no deep copy)."""
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj: Any, **kwargs) -> str:
+    """json.dumps that understands plan overlays."""
+    return json.dumps(obj, default=json_default, **kwargs)
+
+
+def overlay_plan_text(original_plan: Mapping, adapted_text: Dict[str, str], **extra_fields) -> PlanOverlay:
+    """
+    Overlay adapted text on the user-facing plan fields (summary focus/tip, phase name, description,
+    rationale and simple steps). Unchanged phases are shared with the original plan.
+    """
+    def adapt(text):
+        return adapted_text.get(text, text) if isinstance(text, str) else text
+
+    changes = dict(extra_fields)
+
+    summary = original_plan.get('plan_summary')
+    if isinstance(summary, Mapping):
+        summary_changes = {}
+        for key in ('your_main_focus', 'key_to_success'):
+            if key in summary and adapt(summary[key]) != summary[key]:
+                summary_changes[key] = adapt(summary[key])
+        if summary_changes:
+            changes['plan_summary'] = PlanOverlay(summary, summary_changes)
+
+    phases = original_plan.get('personalized_plan')
+    if phases:
+        adapted_phases = []
+        any_phase_changed = False
+        for phase in phases:
+            phase_changes = {}
+            for key in ('name', 'description', 'rationale'):
+                if key in phase and adapt(phase[key]) != phase[key]:
+                    phase_changes[key] = adapt(phase[key])
+            if 'simple_steps' in phase:
+                steps = [adapt(step) for step in phase['simple_steps']]
+                if steps != list(phase['simple_steps']):
+                    phase_changes['simple_steps'] = steps
+            if phase_changes:
+                any_phase_changed = True
+                adapted_phases.append(PlanOverlay(phase, phase_changes))
+            else:
+                adapted_phases.append(phase)
+        if any_phase_changed:
+            changes['personalized_plan'] = adapted_phases
+
+    return PlanOverlay(original_plan, changes)
@@ -0,0 +1,199 @@
+"""
+profiling.py - Opt-in profiling of live traffic.
+
+- Request profiles: cProfile call tree + stage timeline (metrics.stage_trace) for one request,
+  triggered by an authenticated `X-Profile: 1` header or sampled at HIV_PROFILE_SAMPLE_RATE.
+  Recent profiles are kept in memory (and written as .prof files to HIV_PROFILE_DIR if set,
+  for snakeviz / `python -m pstats`).
+- Sampling profiler: snapshots every thread's stack (sys._current_frames) at a fixed interval for a
+  bounded time and returns collapsed stacks (one "frame;frame;frame count" line per stack, the input
+  format of flamegraph.pl / speedscope).
+
+Everything here is off unless HIV_ADMIN_TOKEN is set (header-triggered profiles and admin endpoints)
+or HIV_PROFILE_SAMPLE_RATE > 0.
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .metrics import REGISTRY, stage_trace
+
+PROFILES_TAKEN = REGISTRY.counter("hiv_request_profiles_total", "Requests profiled", ["trigger"])
+
+# Hard cap for one sampling run (it holds a thread and samples every other thread)
+MAX_SAMPLING_SECONDS = 60.0
+
+
+def admin_token_valid(token: Optional[str]) -> bool:
+    """True if token matches HIV_ADMIN_TOKEN (never true when no admin token is configured)"""
+    expected = os.getenv("HIV_ADMIN_TOKEN")
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+def profile_trigger(profile_header: Optional[str], admin_token: Optional[str]) -> Optional[str]:
+    """'header' / 'sampled' if this request should be profiled, else None"""
+    if profile_header and profile_header.strip().lower() in ("1", "true", "yes") and admin_token_valid(admin_token):
+        return "header"
+    sample_rate = float(os.getenv("HIV_PROFILE_SAMPLE_RATE", "0"))
+    if sample_rate > 0 and random.random() < sample_rate:
+        return "sampled"
+    return None
+
+
+class ProfileStore:
+    """The most recent request profiles (bounded, oldest evicted first)"""
+
+    def __init__(self, max_entries: int = None, output_dir: str = None):
+        self.max_entries = max_entries or int(os.getenv("HIV_PROFILE_MAX_STORED", "50"))
+        self.output_dir = output_dir if output_dir is not None else os.getenv("HIV_PROFILE_DIR")
+        self._profiles: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict, stats: Optional[pstats.Stats] = None) -> None:
+        if self.output_dir and stats is not None:
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = os.path.join(self.output_dir, f"{profile['profile_id']}.prof")
+                stats.dump_stats(path)
+                profile["prof_file"] = path
+            except OSError as e:
+                print(f"   ⚠️  Could not write profile: {e}")
+        with self._lock:
+            self._profiles[profile["profile_id"]] = profile
+            while len(self._profiles) > self.max_entries:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        """Summaries, newest first"""
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {key: p[key] for key in ("profile_id", "route", "trigger", "created_at", "total_ms")}
+            for p in reversed(profiles)
+        ]
+
+
+PROFILE_STORE = ProfileStore()
+
+
+def _top_functions(stats: pstats.Stats, limit: int) -> List[Dict]:
+    """Top functions by cumulative time (the call tree's heaviest branches)"""
+    rows = []
+    for (filename, line, function), (primitive_calls, calls, own, cumulative, callers) in stats.stats.items():
+        rows.append({
+            "function": f"{os.path.basename(filename)}:{line}({function})",
+            "calls": calls,
+            "own_ms": round(own * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3),
+            "callers": sorted(
+                f"{os.path.basename(c[0])}:{c[1]}({c[2]})" for c in callers
+            )[:5],
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+@contextmanager
+def profile_request(route: str, trigger: str, limit: int = None):
+    """
+    Profile the with-block (cProfile only sees the current thread, so wrap code that runs in the
+    request thread, e.g. the whole process_user call). Yields a dict that is filled in on exit.
+    """
+    limit = limit or int(os.getenv("HIV_PROFILE_TOP_N", "40"))
+    profile: Dict = {
+        "profile_id": uuid.uuid4().hex,
+        "route": route,
+        "trigger": trigger,
+        "created_at": datetime.now().isoformat(),
+    }
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with stage_trace() as trace:
+        profiler.enable()
+        try:
+            yield profile
+        finally:
+            profiler.disable()
+            profile["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            stats = pstats.Stats(profiler, stream=io.StringIO())
+            profile["stages"] = sorted(trace.stages, key=lambda stage: stage["start_ms"])
+            profile["top_functions"] = _top_functions(stats, limit)
+            PROFILES_TAKEN.inc(trigger=trigger)
+            PROFILE_STORE.add(profile, stats)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler over all threads of this worker (one run at a time)"""
+
+    def __init__(self):
+        self._running = threading.Lock()
+
+    def run(self, seconds: float, interval_ms: float = 5.0, idle: bool = False) -> Dict:
+        """
+        Sample for `seconds` (capped at MAX_SAMPLING_SECONDS) and return collapsed stacks.
+        idle=False drops stacks of threads parked in a wait (lock/queue/select), which would
+        otherwise dominate a mostly idle worker.
+        """
+        if not self._running.acquire(blocking=False):
+            raise RuntimeError("A sampling profile is already running in this worker")
+        try:
+            seconds = min(max(seconds, 0.1), MAX_SAMPLING_SECONDS)
+            interval = max(interval_ms, 1.0) / 1000.0
+            own_thread = threading.get_ident()
+            names = {}
+            stacks: Counter = Counter()
+            samples = 0
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                if len(names) != threading.active_count():
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    frames = []
+                    while frame is not None:
+                        frames.append(_frame_label(frame))
+                        frame = frame.f_back
+                    if not idle and frames and frames[0].split(":")[-1] in _IDLE_FUNCTIONS:
+                        continue
+                    frames.append(names.get(thread_id, f"thread-{thread_id}"))
+                    stacks[";".join(reversed(frames))] += 1
+                samples += 1
+                time.sleep(interval)
+            return {
+                "seconds": seconds,
+                "interval_ms": interval * 1000,
+                "samples": samples,
+                "collapsed": "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()),
+            }
+        finally:
+            self._running.release()
+
+
+# Innermost Python frames of threads that are waiting, not working
+_IDLE_FUNCTIONS = {"wait", "select", "poll", "_worker", "accept"}
+
+SAMPLING_PROFILER = SamplingProfiler()
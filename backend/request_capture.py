@@ -0,0 +1,134 @@
+"""
+request_capture.py - Opt-in, anonymized capture of /assess traffic for replay (benchmarks/replay.py).
+
+Enabled by HIV_CAPTURE_PATH (JSON lines; "{pid}" in the path gives every worker its own file).
+Written per captured request:
+    {"type": "request", "route": "/assess", "arrived_at": <epoch s>, "duration_ms", "status",
+     "body": <UserInput with identifiers hashed>, "risk_stage": <served stage>}
+and per distinct Gemini prompt:
+    {"type": "llm", "kind": "plan" | "adaptation", "prompt_sha256", "response", "seconds"}
+Prompts are stored only as hashes (they quote the user's answers); the replay serves the recorded
+response to whichever prompt has the same hash, which makes replayed plans deterministic.
+
+Identifiers (HIV_CAPTURE_ID_FIELDS in the answers, plus clinic_id) are replaced by a keyed hash
+(HMAC-SHA256 with HIV_CAPTURE_SALT), so one patient's requests stay linkable within a capture but
+cannot be looked up. Without a salt a random per-process one is used. Questionnaire answers are
+kept: they are the workload. HIV_CAPTURE_SAMPLE_RATE captures a share of requests, and capture stops
+at HIV_CAPTURE_MAX_MB.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+from typing import Any, Dict
+
+from .metrics import REGISTRY
+
+CAPTURED = REGISTRY.counter("hiv_capture_records_total", "Records written by the request capture", ["type"])
+
+DEFAULT_ID_FIELDS = "user_id,patient_id,name,full_name,email,phone,access_code,nic"
+
+
+def llm_prompt_digest(prompt: str) -> str:
+    """Key under which a recorded Gemini response is served on replay"""
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class RequestCapture:
+    """Appends anonymized /assess requests and Gemini exchanges to a JSON-lines file"""
+
+    def __init__(self, path: str = None, sample_rate: float = None, salt: str = None,
+                 id_fields: str = None, max_mb: float = None):
+        path = path if path is not None else os.getenv("HIV_CAPTURE_PATH")
+        self.path_template = path or None
+        self.sample_rate = float(os.getenv("HIV_CAPTURE_SAMPLE_RATE", "1.0")) if sample_rate is None else sample_rate
+        salt = salt if salt is not None else os.getenv("HIV_CAPTURE_SALT")
+        self._salt = (salt or os.urandom(16).hex()).encode()
+        self.id_fields = set(
+            field.strip() for field in (id_fields or os.getenv("HIV_CAPTURE_ID_FIELDS", DEFAULT_ID_FIELDS)).split(",")
+            if field.strip()
+        )
+        self.max_bytes = int(float(os.getenv("HIV_CAPTURE_MAX_MB", "512") if max_mb is None else max_mb) * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._file = None
+        self._owner_pid = None
+        self._written = 0
+        self._seen_prompts = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path_template is not None and self._written < self.max_bytes
+
+    def should_capture(self) -> bool:
+        return self.enabled and (self.sample_rate >= 1.0 or random.random() < self.sample_rate)
+
+    def pseudonym(self, value: Any) -> str:
+        return hmac.new(self._salt, str(value).encode(), hashlib.sha256).hexdigest()[:16]
+
+    def anonymize(self, body: Dict) -> Dict:
+        """Copy of an /assess body with identifiers replaced by pseudonyms"""
+        body = dict(body)
+        data = dict(body.get("data") or {})
+        for field in self.id_fields & set(data):
+            if data[field] not in (None, ""):
+                data[field] = self.pseudonym(data[field])
+        body["data"] = data
+        if body.get("clinic_id"):
+            body["clinic_id"] = self.pseudonym(body["clinic_id"])
+        return body
+
+    def record_request(self, route: str, arrived_at: float, duration_seconds: float, status: int,
+                       capture: Dict) -> None:
+        """Called by the HTTP middleware for requests whose handler set request.state.capture"""
+        self._write({
+            "type": "request",
+            "route": route,
+            "arrived_at": round(arrived_at, 6),
+            "duration_ms": round(duration_seconds * 1000, 3),
+            "status": status,
+            "body": capture["body"],
+            "risk_stage": capture.get("risk_stage"),
+        })
+
+    def record_llm(self, kind: str, prompt: str, response_text: str, seconds: float) -> None:
+        """One Gemini exchange (first occurrence of each prompt only)"""
+        if not self.enabled:
+            return
+        digest = llm_prompt_digest(prompt)
+        with self._lock:
+            if digest in self._seen_prompts:
+                return
+            self._seen_prompts.add(digest)
+        self._write({
+            "type": "llm",
+            "kind": kind,
+            "prompt_sha256": digest,
+            "response": response_text,
+            "seconds": round(seconds, 4),
+        })
+
+    def _write(self, record: Dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._written >= self.max_bytes:
+                return
+            # Opened lazily and per process (workers forked from a pre-fork master get their own file)
+            if self._owner_pid != os.getpid():
+                path = self.path_template.replace("{pid}", str(os.getpid()))
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._file = open(path, "a", encoding="utf-8")
+                self._owner_pid = os.getpid()
+                self._seen_prompts = set()
+                print(f"📼 Capturing /assess traffic to {path}")
+            self._file.write(line)
+            self._file.flush()
+            self._written += len(line)
+            if self._written >= self.max_bytes:
+                print("📼 Capture reached HIV_CAPTURE_MAX_MB, stopping")
+        CAPTURED.inc(type=record["type"])
+
+
+REQUEST_CAPTURE = RequestCapture()
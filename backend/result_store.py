@@ -0,0 +1,125 @@
+"""
+result_store.py - Store for recent assessment results (so background work can upgrade them later).
+
+Results live in SQLite. By default (HIV_RESULT_STORE_PATH unset) the database is ":memory:", private
+to the process and gone on restart. api/serve_prefork.py points it at a file
+(data/cache/results.sqlite3) shared by all workers, like the job queue: a follow-up request
+(GET /assess/result/{id}, /save_assessment by result_id) can land on any worker, and a provisional
+plan replaced by the worker that served /assess must be visible to all of them.
+
+Privacy: a result holds the user's risk stage, risk factors and plan, i.e. health data. On disk it is
+stored unencrypted and survives restarts, so put the file on an encrypted volume readable only by the
+API user. Results are kept at most HIV_RESULT_STORE_TTL_S seconds (default 1 hour) after their last
+write and at most HIV_RESULT_STORE_MAX_ENTRIES of them; expired rows are deleted, not just hidden.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from .plan_model import dumps
+
+
+class ResultStore:
+    """Thread- and process-safe, bounded store of assessment results keyed by result_id.
+    Least recently written entries are evicted first once max_entries is reached.
+    """
+
+    # Evict every N writes instead of on every put
+    EVICT_EVERY = 100
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = None, ttl_seconds: float = None):
+        if path is None:
+            path = os.getenv("HIV_RESULT_STORE_PATH") or ":memory:"
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries or int(os.getenv("HIV_RESULT_STORE_MAX_ENTRIES", "5000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("HIV_RESULT_STORE_TTL_S", "3600"))
+        self._lock = threading.Lock()
+        self._writes = 0
+        # isolation_level=None: transactions are explicit (BEGIN IMMEDIATE for read-modify-write)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # rowid grows with every (re)write, so the smallest rowids are the least recently written
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results (result_id TEXT PRIMARY KEY, result TEXT NOT NULL, "
+            "updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_updated ON results(updated_at)")
+        # Results left on disk by a previous run may be long expired
+        with self._lock:
+            self._evict()
+
+    def put(self, result_id: str, result: Dict) -> None:
+        """Store (or overwrite) a result."""
+        data = dumps(result, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (result_id, result, updated_at) VALUES (?, ?, ?)",
+                (result_id, data, time.time())
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete expired results and the least recently written beyond max_entries (caller holds the lock)"""
+        self._conn.execute("DELETE FROM results WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM results WHERE rowid <= (SELECT MAX(rowid) FROM results) - ?",
+            (self.max_entries,)
+        )
+
+    def get(self, result_id: str) -> Optional[Dict]:
+        """Return the latest version of a result, or None if unknown/evicted/expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, updated_at FROM results WHERE result_id = ?", (result_id,)
+            ).fetchone()
+            if row is not None and row[1] < time.time() - self.ttl_seconds:
+                self._conn.execute("DELETE FROM results WHERE result_id = ? AND updated_at = ?", (result_id, row[1]))
+                row = None
+        return json.loads(row[0]) if row is not None else None
+
+    def replace_plan(self, result_id: str, intervention_plan: Dict, **metadata) -> bool:
+        """
+        Swap in a new intervention plan for a stored result.
+        Read-modify-write in one transaction, so concurrent replacements from other processes are not lost.
+        Returns False if the result was evicted (or expired) in the meantime.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT result FROM results WHERE result_id = ? AND updated_at >= ?",
+                    (result_id, time.time() - self.ttl_seconds)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return False
+                current = json.loads(row[0])
+                current["intervention_plan"] = intervention_plan
+                current["system_metadata"] = {**current.get("system_metadata", {}), **metadata}
+                self._conn.execute(
+                    "UPDATE results SET result = ?, updated_at = ? WHERE result_id = ?",
+                    (dumps(current, ensure_ascii=False), time.time(), result_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,179 @@
+"""
+scheduler.py - Severity-aware, per-clinic fair admission to scarce Gemini capacity.
+
+Planner and adaptor calls ask a PriorityScheduler for a slot before borrowing a pooled client.
+When every slot is busy, waiting calls are granted in this order:
+  1. anything that has waited longer than starvation_seconds (oldest first)
+  2. the highest priority class with waiters
+  3. within that class, clinics take turns (round-robin), so one clinic's bulk import cannot
+     starve the others
+  4. within a clinic, the highest clinical risk score first, then arrival order
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from .metrics import REGISTRY
+
+# Highest priority first
+PRIORITY_CLASSES = ("critical", "very_high", "high", "standard")
+# Clinical scoring short-circuit (q55/q52 injection patterns) in ClinicalRiskScorer
+CRITICAL_SCORE = 999
+
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "hiv_scheduler_queue_wait_seconds", "Time waiting for an LLM slot", ["scheduler", "priority"]
+)
+QUEUE_TIMEOUTS = REGISTRY.counter(
+    "hiv_scheduler_timeouts_total", "Calls that gave up waiting for an LLM slot", ["scheduler", "priority"]
+)
+DEFAULT_CLINIC = "unassigned"
+
+
+def classify_priority(risk_prediction: Dict) -> str:
+    """Priority class from the clinical score short-circuit and the predicted risk stage"""
+    if (risk_prediction.get("risk_score") or 0) >= CRITICAL_SCORE:
+        return "critical"
+    stage = risk_prediction.get("risk_stage", 0)
+    if stage >= 3:
+        return "very_high"
+    if stage == 2:
+        return "high"
+    return "standard"
+
+
+class _Ticket:
+    __slots__ = ("priority", "clinic", "score", "seq", "enqueued", "granted", "abandoned")
+
+    def __init__(self, priority: str, clinic: str, score: float, seq: int):
+        self.priority = priority
+        self.clinic = clinic
+        self.score = score
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.abandoned = False
+
+
+class PriorityScheduler:
+    """Counting semaphore with priority classes, per-clinic round-robin and a starvation guard"""
+
+    def __init__(self, name: str, capacity: int, starvation_seconds: float = None):
+        self.name = name
+        self.capacity = capacity
+        self.starvation_seconds = starvation_seconds or float(os.getenv("HIV_SCHEDULER_STARVATION_S", "60"))
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self._seq = itertools.count()
+        # priority class -> clinic -> heap of (-score, seq, ticket); clinic order is the round-robin order
+        self._queues: Dict[str, "OrderedDict[str, list]"] = {p: OrderedDict() for p in PRIORITY_CLASSES}
+        # All waiting tickets by arrival (for the starvation guard)
+        self._arrivals: "OrderedDict[int, _Ticket]" = OrderedDict()
+
+    @contextmanager
+    def slot(self, priority: str = "standard", clinic_id: Optional[str] = None, score: float = 0.0,
+             timeout: Optional[float] = None):
+        """Hold one of the scheduler's slots for the with-block (RuntimeError if none is granted in time)"""
+        priority = priority if priority in self._queues else "standard"
+        ticket = _Ticket(priority, clinic_id or DEFAULT_CLINIC, float(score or 0), next(self._seq))
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._cond:
+            if self._in_use < self.capacity and not self._arrivals:
+                self._in_use += 1
+                ticket.granted = True
+            else:
+                self._enqueue(ticket)
+                while not ticket.granted:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        ticket.abandoned = True
+                        self._arrivals.pop(ticket.seq, None)
+                        QUEUE_TIMEOUTS.inc(scheduler=self.name, priority=priority)
+                        raise RuntimeError(f"No '{self.name}' slot within {timeout}s ({priority} priority)")
+                    self._cond.wait(remaining)
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued, scheduler=self.name, priority=priority)
+
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use -= 1
+                self._dispatch()
+
+    def _enqueue(self, ticket: _Ticket) -> None:
+        clinics = self._queues[ticket.priority]
+        heapq.heappush(clinics.setdefault(ticket.clinic, []), (-ticket.score, ticket.seq, ticket))
+        self._arrivals[ticket.seq] = ticket
+
+    def _dispatch(self) -> None:
+        """Grant free slots to waiting tickets (called with the lock held)"""
+        granted_any = False
+        while self._in_use < self.capacity:
+            ticket = self._next_ticket()
+            if ticket is None:
+                break
+            ticket.granted = True
+            self._in_use += 1
+            granted_any = True
+        if granted_any:
+            self._cond.notify_all()
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        # Starvation guard: the oldest waiter goes first once it has waited too long
+        if self._arrivals:
+            oldest = next(iter(self._arrivals.values()))
+            if time.monotonic() - oldest.enqueued > self.starvation_seconds:
+                self._remove(oldest)
+                return oldest
+
+        for priority in PRIORITY_CLASSES:
+            clinics = self._queues[priority]
+            while clinics:
+                clinic, heap = next(iter(clinics.items()))
+                while heap and heap[0][2].abandoned:
+                    heapq.heappop(heap)
+                if not heap:
+                    del clinics[clinic]
+                    continue
+                ticket = heapq.heappop(heap)[2]
+                # Round-robin: this clinic goes to the back of its class
+                del clinics[clinic]
+                if heap:
+                    clinics[clinic] = heap
+                self._arrivals.pop(ticket.seq, None)
+                return ticket
+        return None
+
+    def _remove(self, ticket: _Ticket) -> None:
+        """Take a specific ticket out of its clinic queue (starvation guard)"""
+        self._arrivals.pop(ticket.seq, None)
+        clinics = self._queues[ticket.priority]
+        heap = clinics.get(ticket.clinic)
+        if heap is None:
+            return
+        heap[:] = [entry for entry in heap if entry[2] is not ticket]
+        heapq.heapify(heap)
+        if not heap:
+            del clinics[ticket.clinic]
+
+    def stats(self) -> Dict:
+        with self._cond:
+            waiting = {
+                priority: sum(
+                    sum(1 for entry in heap if not entry[2].abandoned) for heap in self._queues[priority].values()
+                )
+                for priority in PRIORITY_CLASSES
+            }
+            return {
+                "name": self.name,
+                "capacity": self.capacity,
+                "in_use": self._in_use,
+                "waiting": waiting,
+                "waiting_total": sum(waiting.values()),
+            }
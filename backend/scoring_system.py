@@ -93,7 +93,7 @@ class ClinicalRiskScorer:
 
         print("✅ Clinical Risk Scorer initialized!")
 
-    def calculate_risk_score(self, user_input: Dict) -> Tuple[float, int, List[Dict]]:
+    def calculate_risk_score(self, user_input: Dict) -> Tuple[float, List[Dict]]:
         """Calculate risk score and explanations from user input"""
         print(f"🔍 DEBUG: Starting scoring for {len(user_input)} features")
         row = {}
@@ -111,7 +111,7 @@ class ClinicalRiskScorer:
         print(f"🔍 DEBUG: Number of explanations = {len(explanations)}")
         return float(score), explanations
 
-    def _create_target_exact(self, row: Dict) -> Tuple[float, int, List[Dict]]:
+    def _create_target_exact(self, row: Dict) -> Tuple[float, List[Dict]]:
         """Exact replica of create_target with corrections"""
         score = 0.0
         explanations: List[Dict] = []
@@ -130,7 +130,7 @@ class ClinicalRiskScorer:
         # ===========================================
         
         # Automatic Stage 3 for high-risk injection patterns
-        if get_num('q55') == 3 and get_num('q52') >= 2:
+        if get_num('q55') == 3 and (get_num('q52') or 0) >= 2:
             explanations.append({
                 'feature': 'q55_q52_combination',
                 'points': 999,
@@ -138,7 +138,7 @@ class ClinicalRiskScorer:
                 'priority': 'CRITICAL',
                 'user_value': f'q55={get_num("q55")}, q52={get_num("q52")}'
             })
-            return 999, 3, explanations
+            return 999, explanations
         
         # Injection drug use 2+ times
         q55_val = get_num('q55')
@@ -150,7 +150,7 @@ class ClinicalRiskScorer:
                 'priority': 'CRITICAL',
                 'user_value': q55_val
             })
-            return 999, 3, explanations
+            return 999, explanations
         
         # ===========================================
         # STAGE 0 TRIGGERS (NEVER HAD SEX)
@@ -642,8 +642,8 @@ class ClinicalRiskScorer:
             })
         
         # More combinations
-        if (get_num('q19') == 1 and get_num('q86') >= 2 and 
-            (get_num('q55') >= 2 or get_num('q52') >= 2)):
+        if (get_num('q19') == 1 and (get_num('q86') or 0) >= 2 and 
+            ((get_num('q55') or 0) >= 2 or (get_num('q52') or 0) >= 2)):
             score += 40
             explanations.append({
                 'feature': 'q19_q86_substance_combo',
@@ -653,7 +653,7 @@ class ClinicalRiskScorer:
                 'user_value': f'q19={get_num("q19")}'
             })
         
-        if get_num('q59') >= 3 and get_num('q60') == 2 and get_num('q62') in [2, 8]:
+        if (get_num('q59') or 0) >= 3 and get_num('q60') == 2 and get_num('q62') in [2, 8]:
             score += 30
             explanations.append({
                 'feature': 'q59_q60_q62_combo',
@@ -663,7 +663,7 @@ class ClinicalRiskScorer:
                 'user_value': f'q59={get_num("q59")}'
             })
         
-        if get_num('q29') >= 2 and (get_num('q44') >= 5 or get_num('q52') >= 2):
+        if (get_num('q29') or 0) >= 2 and ((get_num('q44') or 0) >= 5 or (get_num('q52') or 0) >= 2):
             score += 25
             explanations.append({
                 'feature': 'q29_substance_combo',
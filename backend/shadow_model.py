@@ -0,0 +1,181 @@
+"""
+shadow_model.py - Shadow evaluation of a candidate risk model on live traffic.
+
+HIVRiskPredictor hands every served feature row (and the serving model's probabilities) to the
+ShadowEvaluator, which only does a non-blocking queue put; requests never wait on the candidate.
+A background thread drains the queue in batches, scores them with the candidate model (one XGBoost
+thread, so it does not compete with serving) and records stage agreement, a confusion matrix,
+probability deltas and per-row timing of both models. Both timings cover the predict_proba call
+only, amortized over its rows: the serving time excludes micro-batcher queueing and window waits.
+
+Enable with HIV_SHADOW_MODEL_PATH (plus HIV_SHADOW_FEATURES_PATH if the candidate was trained on a
+different feature list; columns are matched by name). When the queue is full, rows are dropped and
+counted: shadow results are a sample, never back-pressure.
+"""
+
+import os
+import pickle
+import queue
+import threading
+import time
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+
+from .inference_batcher import configure_model_threads
+from .metrics import REGISTRY, STAGE_SECONDS
+
+SHADOW_PREDICTIONS = REGISTRY.counter(
+    "hiv_shadow_predictions_total", "Rows scored by the shadow model, by stage agreement", ["outcome"]
+)
+SHADOW_DROPPED = REGISTRY.counter("hiv_shadow_dropped_total", "Rows not shadow-scored (queue full or errors)", ["reason"])
+SHADOW_PROBABILITY_DELTA = REGISTRY.histogram(
+    "hiv_shadow_probability_delta", "Max absolute class probability difference, candidate vs serving",
+    buckets=(0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0)
+)
+
+
+class ShadowEvaluator:
+    """Queues served rows and compares a candidate model's predictions against them in the background"""
+
+    def __init__(self, candidate_model, serving_feature_names: List[str], candidate_feature_names: List[str] = None,
+                 name: str = "candidate", queue_size: int = None, batch_size: int = None):
+        self.model = candidate_model
+        self.name = name
+        self.batch_size = batch_size or int(os.getenv("HIV_SHADOW_BATCH_SIZE", "64"))
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size or int(os.getenv("HIV_SHADOW_QUEUE_SIZE", "2000")))
+
+        # Candidate column order, as indexes into the serving feature row
+        self._columns = None
+        if candidate_feature_names is not None and list(candidate_feature_names) != list(serving_feature_names):
+            positions = {feature: i for i, feature in enumerate(serving_feature_names)}
+            missing = [feature for feature in candidate_feature_names if feature not in positions]
+            if missing:
+                raise ValueError(f"Candidate model needs features the serving model does not build: {missing[:5]}")
+            self._columns = np.array([positions[feature] for feature in candidate_feature_names])
+
+        self._lock = threading.Lock()
+        self._thread = None
+        self._owner_pid = None
+        self._reset_stats()
+
+    @classmethod
+    def from_env(cls, serving_feature_names: List[str]) -> Optional["ShadowEvaluator"]:
+        """ShadowEvaluator for HIV_SHADOW_MODEL_PATH, or None when shadowing is not configured"""
+        model_path = os.getenv("HIV_SHADOW_MODEL_PATH")
+        if not model_path:
+            return None
+        try:
+            model = joblib.load(model_path)
+            configure_model_threads(model, int(os.getenv("HIV_SHADOW_NTHREAD", "1")))
+            candidate_features = None
+            features_path = os.getenv("HIV_SHADOW_FEATURES_PATH")
+            if features_path:
+                with open(features_path, "rb") as f:
+                    candidate_features = pickle.load(f)
+            evaluator = cls(model, serving_feature_names, candidate_features,
+                            name=os.path.basename(model_path))
+        except Exception as e:
+            print(f"   ⚠️  Shadow model not loaded ({e}). Shadow evaluation disabled.")
+            return None
+        print(f"   ✅ Shadow model loaded: {evaluator.name}")
+        return evaluator
+
+    def submit(self, features: np.ndarray, serving_probabilities: np.ndarray, serving_seconds_per_row: float) -> None:
+        """
+        Queue served rows (2-D features, matching 2-D probabilities) without ever blocking.
+        serving_seconds_per_row: the serving model call's time per row, without batching waits.
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((features, serving_probabilities, serving_seconds_per_row))
+        except queue.Full:
+            SHADOW_DROPPED.inc(len(features), reason="queue_full")
+
+    def _ensure_worker(self) -> None:
+        # Started lazily and per process: a pre-fork master loads the predictor, but threads do not survive fork()
+        if self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._owner_pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            self._reset_stats()
+            self._thread = threading.Thread(target=self._run, name="shadow-model", daemon=True)
+            self._thread.start()
+            self._owner_pid = os.getpid()
+
+    def _run(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            rows = len(items[0][0])
+            while rows < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                items.append(item)
+                rows += len(item[0])
+            try:
+                self._evaluate(items)
+            except Exception as e:
+                SHADOW_DROPPED.inc(rows, reason="error")
+                print(f"   ⚠️  Shadow evaluation failed: {e}")
+
+    def _evaluate(self, items: List) -> None:
+        features = np.vstack([item[0] for item in items])
+        serving = np.vstack([item[1] for item in items])
+        serving_seconds = sum(item[2] * len(item[0]) for item in items)
+        if self._columns is not None:
+            features = features[:, self._columns]
+
+        started = time.perf_counter()
+        candidate = np.asarray(self.model.predict_proba(features), dtype=float)
+        candidate_seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(candidate_seconds, stage="shadow_inference_batch")
+
+        serving_stages = serving.argmax(axis=1)
+        candidate_stages = candidate.argmax(axis=1)
+        deltas = np.abs(candidate - serving).max(axis=1)
+        agree = serving_stages == candidate_stages
+        SHADOW_PREDICTIONS.inc(int(agree.sum()), outcome="agree")
+        SHADOW_PREDICTIONS.inc(int((~agree).sum()), outcome="disagree")
+        for delta in deltas:
+            SHADOW_PROBABILITY_DELTA.observe(float(delta))
+
+        with self._lock:
+            stats = self._stats
+            stats["rows"] += len(features)
+            stats["agreements"] += int(agree.sum())
+            stats["sum_max_delta"] += float(deltas.sum())
+            stats["max_delta"] = max(stats["max_delta"], float(deltas.max()))
+            stats["serving_seconds"] += serving_seconds
+            stats["candidate_seconds"] += candidate_seconds
+            stats["batches"] += 1
+            np.add.at(stats["confusion"], (serving_stages, candidate_stages), 1)
+
+    def _reset_stats(self) -> None:
+        self._stats = {
+            "rows": 0, "agreements": 0, "sum_max_delta": 0.0, "max_delta": 0.0,
+            "serving_seconds": 0.0, "candidate_seconds": 0.0, "batches": 0,
+            "confusion": np.zeros((4, 4), dtype=np.int64),  # the four risk stages
+        }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            s = dict(self._stats, confusion=self._stats["confusion"].copy())
+        rows = s["rows"]
+        return {
+            "candidate": self.name,
+            "rows_compared": rows,
+            "queue_depth": self._queue.qsize(),
+            "stage_agreement": round(s["agreements"] / rows, 4) if rows else None,
+            "mean_max_probability_delta": round(s["sum_max_delta"] / rows, 4) if rows else None,
+            "max_probability_delta": round(s["max_delta"], 4),
+            # rows: serving stage, columns: candidate stage
+            "confusion_matrix": s["confusion"].tolist(),
+            "serving_ms_per_row": round(s["serving_seconds"] / rows * 1000, 4) if rows else None,
+            "candidate_ms_per_row": round(s["candidate_seconds"] / rows * 1000, 4) if rows else None,
+            "candidate_batches": s["batches"],
+        }
@@ -0,0 +1,274 @@
+"""
+synthetic_population.py - Synthetic questionnaire populations for benchmarks, capacity planning
+and parity tests, driven by data/feature_dictionary.json.
+
+Every question gets a marginal distribution over its option codes; answers inside a risk cluster
+(by default one per risk category: sexual behaviour, substance use, violence, mental health, social
+factors) are correlated through a Gaussian copula: each respondent has a latent overall risk, each
+cluster a latent cluster risk loading on it, and a question's answer is the latent value cut at the
+quantiles of its marginal. Risky answers therefore come together, like in real survey data.
+Questions with a `99` (Prefer not to answer) option get that code at missing_rate.
+
+Generation is vectorized per question over blocks of rows (blocks run in parallel threads; NumPy
+releases the GIL) and is deterministic for a given seed and block size.
+
+Usage (from the project root):
+    python -m backend.synthetic_population -n 10000000 -o population.parquet --seed 7
+    python -m backend.synthetic_population -n 1000 -o users.csv --config population.json
+
+Config file (JSON, every key optional):
+    {"marginals": {"q44": {"1": 0.6, "2": 0.2, ...}},   # weights per option code (99 excluded)
+     "risk_order": {"q81": ["1", "3", "2"]},            # option codes from lowest to highest risk
+     "clusters": {"substance_use": {"features": ["q44", "q52"], "loading": 0.6}},
+     "global_loading": 0.6, "missing_rate": 0.02, "unanswered_rate": 0.0, "decay": 0.55}
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DICTIONARY_PATH = os.path.join(BASE_DIR, "data", "feature_dictionary.json")
+
+# Cell value for a question left unanswered (key absent from the answers / empty cell)
+UNANSWERED = -1
+PREFER_NOT_TO_ANSWER = 99
+# Dictionary categories whose questions are correlated by default
+DEFAULT_RISK_CATEGORIES = ("sexual_behavior", "substance_use", "violence", "mental_health", "social_factors")
+# Standard normal quantiles at 2^16 evenly spaced probabilities: indexing this with random uint16s
+# is a ~4x cheaper normal draw than the ziggurat, and fine-grained enough for answer sampling
+_NORMAL_TABLE = np.array(
+    [NormalDist().inv_cdf((i + 0.5) / 65536) for i in range(65536)], dtype=np.float32
+)
+
+
+class SyntheticPopulation:
+    """Samples answer vectors (option codes) for every question in the feature dictionary"""
+
+    def __init__(self, dictionary_path: str = None, config: Optional[Dict] = None, seed: int = 0,
+                 block_rows: int = 1_000_000):
+        config = config or {}
+        with open(dictionary_path or DEFAULT_DICTIONARY_PATH, "r", encoding="utf-8") as f:
+            dictionary = json.load(f)
+        definitions = dictionary["feature_definitions"]
+
+        self.seed = seed
+        self.block_rows = block_rows
+        self.features: List[str] = list(definitions)
+        self.global_loading = float(config.get("global_loading", 0.6))
+        self.unanswered_rate = float(config.get("unanswered_rate", 0.0))
+        decay = float(config.get("decay", 0.55))
+        missing_rate = config.get("missing_rate", 0.02)
+        marginals = config.get("marginals", {})
+        risk_orders = config.get("risk_order", {})
+
+        # Cluster of each question (None = answered independently of the latent risk)
+        clusters = config.get("clusters")
+        if clusters is None:
+            categories = dictionary.get("categories", {})
+            clusters = {
+                name: {"features": categories[name], "loading": 0.5}
+                for name in DEFAULT_RISK_CATEGORIES if name in categories
+            }
+        self.clusters = {name: float(spec.get("loading", 0.5)) for name, spec in clusters.items()}
+        cluster_of = {feature: name for name, spec in clusters.items() for feature in spec["features"]}
+
+        self._specs = []
+        for feature, info in definitions.items():
+            codes = [code for code in info.get("options", {}) if code != str(PREFER_NOT_TO_ANSWER)]
+            if not codes:
+                continue
+            order = [str(code) for code in risk_orders.get(feature, self._default_risk_order(info, codes))]
+            weights = marginals.get(feature)
+            if weights is not None:
+                probabilities = np.array([float(weights.get(code, 0.0)) for code in order])
+            elif info.get("risk_direction") == "neutral":
+                probabilities = np.ones(len(order))
+            else:
+                # Most respondents give the lowest-risk answers
+                probabilities = decay ** np.arange(len(order))
+            probabilities = probabilities / probabilities.sum()
+
+            cumulative = np.cumsum(probabilities)[:-1]
+            has_99 = str(PREFER_NOT_TO_ANSWER) in info.get("options", {})
+            rate = missing_rate.get(feature, 0.0) if isinstance(missing_rate, dict) else float(missing_rate)
+            self._specs.append({
+                "feature": feature,
+                "codes": np.array([int(code) for code in order], dtype=np.int16),
+                "probabilities": probabilities,
+                # Cut points: on the standard normal scale for clustered questions, uniform scale otherwise
+                "normal_cuts": np.array([NormalDist().inv_cdf(min(max(c, 1e-12), 1 - 1e-12)) for c in cumulative],
+                                        dtype=np.float32),
+                "uniform_cuts": cumulative.astype(np.float32),
+                "cluster": cluster_of.get(feature),
+                "missing_rate": rate if has_99 else 0.0,
+            })
+        self.features = [spec["feature"] for spec in self._specs]
+
+    @staticmethod
+    def _default_risk_order(info: Dict, codes: List[str]) -> List[str]:
+        """
+        Option codes from lowest to highest risk: ascending codes for risk-increasing questions
+        (Yes before No for yes/no ones), descending for protective ones. Override with risk_order
+        where a question's codes do not follow this.
+        """
+        order = sorted(codes, key=int)
+        labels = [str(info["options"][code]).strip().lower() for code in order]
+        if labels[:2] == ["yes", "no"]:
+            order = order[::-1]
+        if info.get("risk_direction") == "negative":
+            order = order[::-1]
+        return order
+
+    def _normal(self, rng: np.random.Generator, rows: int) -> np.ndarray:
+        return _NORMAL_TABLE[rng.integers(0, 65536, rows, dtype=np.uint16)]
+
+    def _block(self, block_index: int, rows: int) -> np.ndarray:
+        """features x rows int16 codes for one block (own RNG stream, so blocks are independent)"""
+        rng = np.random.default_rng(np.random.SeedSequence([self.seed, block_index]))
+        # Question-major, so every question's column is contiguous
+        out = np.empty((len(self._specs), rows), dtype=np.int16)
+
+        overall = self._normal(rng, rows)
+        g = self.global_loading
+        cluster_risk = {
+            name: np.float32(g) * overall + np.float32(np.sqrt(1 - g * g)) * self._normal(rng, rows)
+            for name in self.clusters
+        }
+
+        index = np.empty(rows, dtype=np.uint8)
+        for j, spec in enumerate(self._specs):
+            cluster = spec["cluster"]
+            if cluster is not None:
+                loading = self.clusters[cluster]
+                latent = self._normal(rng, rows)
+                latent *= np.float32(np.sqrt(1 - loading * loading))
+                latent += np.float32(loading) * cluster_risk[cluster]
+                cuts = spec["normal_cuts"]
+            else:
+                latent = rng.random(rows, dtype=np.float32)
+                cuts = spec["uniform_cuts"]
+            # Position among a handful of cut points: summing comparisons beats searchsorted
+            index[:] = 0
+            for cut in cuts:
+                index += latent > cut
+            column = out[j]
+            np.take(spec["codes"], index, out=column)
+            if spec["missing_rate"] > 0:
+                column[rng.integers(0, 65536, rows, dtype=np.uint16) < spec["missing_rate"] * 65536] = PREFER_NOT_TO_ANSWER
+            if self.unanswered_rate > 0:
+                column[rng.integers(0, 65536, rows, dtype=np.uint16) < self.unanswered_rate * 65536] = UNANSWERED
+        return out
+
+    def iter_blocks(self, n: int, start_block: int = 0) -> Iterator[np.ndarray]:
+        """Question-major blocks (features x rows) of at most block_rows rows, in order, n rows in total"""
+        block = start_block
+        remaining = n
+        while remaining > 0:
+            rows = min(self.block_rows, remaining)
+            yield self._block(block, rows)
+            remaining -= rows
+            block += 1
+
+    def generate(self, n: int, threads: int = None) -> Dict[str, np.ndarray]:
+        """n respondents as {question: int16 codes} (UNANSWERED = -1), blocks generated in parallel"""
+        sizes = [min(self.block_rows, n - start) for start in range(0, n, self.block_rows)]
+        threads = threads or min(len(sizes), os.cpu_count() or 1) or 1
+        matrix = np.empty((len(self._specs), n), dtype=np.int16)
+
+        def fill(block_index: int) -> None:
+            start = block_index * self.block_rows
+            matrix[:, start:start + sizes[block_index]] = self._block(block_index, sizes[block_index])
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(fill, range(len(sizes))))
+        return {feature: matrix[j] for j, feature in enumerate(self.features)}
+
+    @staticmethod
+    def as_user_inputs(columns: Dict[str, np.ndarray], start: int = 0, stop: int = None) -> List[Dict]:
+        """Rows as /assess-style answer dicts (unanswered questions left out)"""
+        features = list(columns)
+        block = np.column_stack([columns[feature][start:stop] for feature in features])
+        return [
+            {feature: int(value) for feature, value in zip(features, row) if value != UNANSWERED}
+            for row in block.tolist()
+        ]
+
+    def write(self, path: str, n: int) -> int:
+        """Write n respondents to .parquet (needs pyarrow), .csv or .npy, one block at a time"""
+        if path.endswith(".npy"):
+            # rows x questions, column-major on disk (each question contiguous, like the blocks)
+            matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.int16, shape=(n, len(self.features)),
+                                               fortran_order=True)
+            start = 0
+            for block in self.iter_blocks(n):
+                matrix[start:start + block.shape[1]] = block.T
+                start += block.shape[1]
+            matrix.flush()
+            return n
+
+        writer = None
+        written = 0
+        try:
+            for block in self.iter_blocks(n):
+                if path.endswith((".parquet", ".pq")):
+                    import pyarrow as pa
+                    import pyarrow.parquet as pq
+                    table = pa.table({
+                        feature: pa.array(block[j], mask=block[j] == UNANSWERED)
+                        for j, feature in enumerate(self.features)
+                    })
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
+                else:
+                    import pandas as pd
+                    frame = pd.DataFrame(block.T, columns=self.features)
+                    if self.unanswered_rate > 0:
+                        frame = frame.astype("Int16").mask(frame == UNANSWERED)
+                    frame.to_csv(path, mode="a" if written else "w", header=not written, index=False)
+                written += block.shape[1]
+        finally:
+            if writer is not None:
+                writer.close()
+        return written
+
+    def describe(self, columns: Dict[str, np.ndarray]) -> Dict[str, Dict[int, float]]:
+        """Observed share of each code per question (to check marginals)"""
+        shares = {}
+        for feature, column in columns.items():
+            codes, counts = np.unique(column, return_counts=True)
+            shares[feature] = {int(code): round(count / len(column), 4) for code, count in zip(codes, counts)}
+        return shares
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic questionnaire population")
+    parser.add_argument("-n", "--rows", type=int, required=True)
+    parser.add_argument("-o", "--output", required=True, help=".parquet, .csv or .npy")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", help="JSON file with marginals / risk_order / clusters / rates")
+    parser.add_argument("--block-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    config = None
+    if args.config:
+        with open(args.config, "r", encoding="utf-8") as f:
+            config = json.load(f)
+    population = SyntheticPopulation(config=config, seed=args.seed, block_rows=args.block_rows)
+    started = time.perf_counter()
+    rows = population.write(args.output, args.rows)
+    elapsed = time.perf_counter() - started
+    print(f"✅ {rows:,} respondents x {len(population.features)} questions -> {args.output} "
+          f"in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
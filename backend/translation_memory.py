@@ -0,0 +1,141 @@
+"""
+translation_memory.py - Persistent sentence-level memory of culturally adapted text segments.
+Keyed on (source string, language, culture) so repeated plan text never goes back to Gemini.
+
+Reads stay reads: recency (last_used) and hit counts from lookups are buffered in memory and written
+in one transaction every HIV_TRANSLATION_MEMORY_FLUSH_S seconds (default 30), before every store_many
+(so eviction sees them) and on close. Updates buffered when a process dies are lost, which only makes
+eviction slightly less accurate.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class TranslationMemory:
+    """SQLite-backed segment cache with least-recently-used eviction."""
+
+    # Flush early when this many segments have buffered updates
+    MAX_PENDING = 10000
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = None, flush_interval: float = None):
+        if path is None:
+            base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.getenv(
+                "HIV_TRANSLATION_MEMORY_PATH",
+                os.path.join(base_dir, "data", "cache", "translation_memory.sqlite3")
+            )
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries or int(os.getenv("HIV_TRANSLATION_MEMORY_MAX_ENTRIES", "200000"))
+        self.flush_interval = (float(os.getenv("HIV_TRANSLATION_MEMORY_FLUSH_S", "30"))
+                               if flush_interval is None else flush_interval)
+        self._lock = threading.Lock()
+        # (source, language, culture) -> [last_used, hits] not yet written to SQLite
+        self._pending: Dict[Tuple[str, str, str], List] = {}
+        self._last_flush = time.monotonic()
+        # One connection shared by all request threads (guarded by self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS segments (
+                   source TEXT NOT NULL,
+                   language TEXT NOT NULL,
+                   culture TEXT NOT NULL,
+                   target TEXT NOT NULL,
+                   last_used REAL NOT NULL,
+                   hits INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (source, language, culture)
+               )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_segments_last_used ON segments(last_used)")
+        self._conn.commit()
+
+    def lookup_many(self, sources: Iterable[str], language: str, culture: str) -> Dict[str, str]:
+        """Return {source: adapted_text} for every source already in memory."""
+        sources = list(dict.fromkeys(sources))
+        if not sources:
+            return {}
+
+        found: Dict[str, str] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(sources), 500):
+                chunk = sources[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT source, target FROM segments "
+                    f"WHERE language = ? AND culture = ? AND source IN ({placeholders})",
+                    [language, culture, *chunk]
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                # Buffered instead of an UPDATE per read (which would take the database write lock)
+                now = time.time()
+                for source in found:
+                    pending = self._pending.setdefault((source, language, culture), [now, 0])
+                    pending[0] = now
+                    pending[1] += 1
+                if (len(self._pending) >= self.MAX_PENDING
+                        or time.monotonic() - self._last_flush >= self.flush_interval):
+                    self._flush()
+                    self._conn.commit()
+        return found
+
+    def _flush(self) -> None:
+        """Write buffered recency/hit updates (caller holds the lock and commits)"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        self._conn.executemany(
+            "UPDATE segments SET last_used = MAX(last_used, ?), hits = hits + ? "
+            "WHERE source = ? AND language = ? AND culture = ?",
+            [(last_used, hits, *key) for key, (last_used, hits) in self._pending.items()]
+        )
+        self._pending.clear()
+
+    def flush(self) -> None:
+        """Write buffered recency/hit updates now."""
+        with self._lock:
+            self._flush()
+            self._conn.commit()
+
+    def store_many(self, adaptations: Dict[str, str], language: str, culture: str) -> None:
+        """Remember newly adapted segments, evicting the least recently used beyond max_entries."""
+        if not adaptations:
+            return
+
+        now = time.time()
+        with self._lock:
+            # Recent hits first, so eviction below does not drop segments that are in use
+            self._flush()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO segments (source, language, culture, target, last_used, hits) "
+                "VALUES (?, ?, ?, ?, ?, 0)",
+                [(source, language, culture, target, now) for source, target in adaptations.items()]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM segments WHERE rowid IN "
+                    "(SELECT rowid FROM segments ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,140 @@
+"""
+warmup.py - Startup warm-up for a worker before it reports ready.
+
+Runs synthetic assessments through the predictor (single and batch paths, so XGBoost, the
+micro-batcher and the vectorized feature builder are all exercised), the clinical scorer and the
+rule-based planner, pre-touches the localized bundles and the translation memory, and health-checks
+each Gemini client pool (one round trip per pool: clients share the process-wide transport). Synthetic predictions are not recorded (record=False), so they never
+reach the shadow model's comparison stats or the micro-batch size metric. Each dependency gets a status:
+    ok          - warmed up and working
+    degraded    - failed or partially failed; requests still work through a fallback
+    failed      - required dependency is broken (the worker must not report ready)
+    disabled    - not configured (e.g. no GEMINI_API_KEY)
+"""
+
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+# Without these the worker cannot answer /assess at all
+REQUIRED_DEPENDENCIES = ("model", "scorer")
+
+
+def synthetic_inputs(feature_info: Dict[str, Dict], count: int) -> List[Dict]:
+    """
+    Complete questionnaires that cycle through each question's options, so the warm-up touches
+    different tree paths (and every risk stage the answers reach), not one row repeated.
+    """
+    inputs = []
+    for i in range(count):
+        user_input = {}
+        for feature, info in feature_info.items():
+            options = info.get("options")
+            if isinstance(options, dict) and options:
+                keys = list(options)
+                user_input[feature] = int(keys[(i * 7 + len(feature)) % len(keys)])
+        inputs.append(user_input)
+    return inputs
+
+
+def _check(name: str, statuses: Dict[str, Dict], fn: Callable[[], Any], failure_status: str = "degraded") -> Any:
+    """Run one warm-up step and record its status and duration"""
+    started = time.perf_counter()
+    try:
+        detail = fn()
+        statuses[name] = {"status": "ok", "seconds": round(time.perf_counter() - started, 3)}
+        if isinstance(detail, dict):
+            statuses[name].update(detail)
+        return detail
+    except Exception as e:
+        print(f"   ⚠️  Warm-up of {name} failed: {e}")
+        statuses[name] = {
+            "status": failure_status,
+            "seconds": round(time.perf_counter() - started, 3),
+            "error": f"{type(e).__name__}: {e}",
+        }
+        return None
+
+
+def warm_up_system(system, samples: int = 16) -> Dict[str, Dict]:
+    """Warm every backend dependency of an HIVPreventionSystem; returns {dependency: status dict}"""
+    print(f"🔥 Warming up with {samples} synthetic assessments...")
+    statuses: Dict[str, Dict] = {}
+    predictor = system.risk_predictor
+    inputs = synthetic_inputs(predictor.scoring_system.feature_info, max(1, samples))
+    predictions: List[Dict] = []
+
+    def model():
+        # Quiet: the predictor prints per-user debug lines. redirect_stdout swaps sys.stdout for the
+        # whole process, so warm-up must run before threads whose output matters (job workers) start.
+        with contextlib.redirect_stdout(io.StringIO()):
+            batch_predictions, errors = predictor.predict_batch(inputs, record=False)
+            # Single-user path, concurrently so the micro-batcher runs real batches
+            with ThreadPoolExecutor(max_workers=min(8, len(inputs))) as executor:
+                predictions.extend(executor.map(lambda user_input: predictor.predict(user_input, record=False), inputs))
+        failed = [error for error in errors if error]
+        if failed:
+            raise RuntimeError(f"{len(failed)} synthetic inputs failed: {failed[0]}")
+        stages = sorted({p["risk_stage"] for p in predictions})
+        return {"stages_seen": stages}
+
+    def scorer():
+        if not predictions:
+            raise RuntimeError("no predictions to explain (model warm-up failed)")
+        with contextlib.redirect_stdout(io.StringIO()):
+            for user_input in inputs:
+                predictor.scoring_system.calculate_risk_score(user_input)
+        return None
+
+    def rule_based_planner():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for prediction, user_input in zip(predictions, inputs):
+                system.fallback_planner.create_plan(prediction, user_input)
+        return None
+
+    plans: List[Dict] = []
+
+    def localization():
+        languages = system.localized_content.languages
+        with contextlib.redirect_stdout(io.StringIO()):
+            if predictions:
+                plans.append(system.fallback_planner.create_plan(predictions[0], inputs[0]))
+            for language in languages:
+                for plan in plans:
+                    system.localized_content.localize_plan(plan, language)
+        if not languages:
+            raise RuntimeError("no localized bundles loaded")
+        return {"languages": languages}
+
+    def translation_memory():
+        if system.translation_memory is None:
+            raise RuntimeError("translation memory unavailable")
+        texts = [str(value) for plan in plans for value in plan.values() if isinstance(value, str)]
+        for language in system.localized_content.languages:
+            system.translation_memory.lookup_many(texts or ["warm-up"], language, "default")
+        return None
+
+    _check("model", statuses, model, failure_status="failed")
+    _check("scorer", statuses, scorer, failure_status="failed")
+    _check("rule_based_planner", statuses, rule_based_planner)
+    _check("localization", statuses, localization)
+    _check("translation_memory", statuses, translation_memory)
+
+    # Gemini pools: one health check per pool, in parallel (network round trips)
+    pools = [pool for pool in (system.planner_pool, system.adaptor_pool) if pool is not None]
+    if not pools:
+        statuses["gemini"] = {"status": "disabled", "detail": "GEMINI_API_KEY not set, rule-based planner only"}
+    else:
+        def gemini():
+            with ThreadPoolExecutor(max_workers=len(pools)) as executor:
+                healthy = dict(zip((pool.name for pool in pools), executor.map(lambda pool: pool.warm_up(), pools)))
+            detail = {"healthy_pools": healthy, "concurrency": {pool.name: pool.size for pool in pools}}
+            if not all(healthy.values()):
+                raise RuntimeError(f"health check failed: {detail}")
+            return detail
+        _check("gemini", statuses, gemini)
+
+    print("✅ Warm-up finished: " + ", ".join(f"{name}={s['status']}" for name, s in statuses.items()))
+    return statuses
@@ -0,0 +1,391 @@
+"""
+HTTP load test for api/api.py: /assess, /assess/batch, /history/{user_id}, /save_assessment, /schema.
+
+Open-loop traffic: arrivals are a Poisson process at each offered rate in --rates (one step per rate,
+--duration seconds each), and every arrival picks an endpoint from --mix. Latency is measured from
+the scheduled arrival time, so a server that falls behind is charged for the queueing it causes
+(no coordinated omission). Answers come from the synthetic population (backend/synthetic_population.py),
+so runs with the same --seed send the same requests in the same order.
+
+Per step the report has throughput, error rate and p50/p90/p95/p99/max latency per endpoint and
+overall, checked against per-endpoint p99 SLOs (--slo). The first step where achieved throughput
+falls below 90% of the offered rate, the error rate exceeds --max-error-rate or a p99 SLO is missed
+is the saturation point; the step before it is the highest sustainable rate.
+
+By default the API is started on the local stand-ins (benchmarks/stand_ins.py: in-memory Firestore,
+simulated Gemini); use --url to target a running server instead.
+
+Usage (from the project root; needs httpx and uvicorn, see benchmarks/requirements.txt):
+    python benchmarks/load_test.py --rates 1,2,4,8 --duration 30 -o load_$(git rev-parse --short HEAD).json
+    python benchmarks/load_test.py --mix assess=0.8,schema=0.2 --gemini-ms 1500 --compare load_main.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+ENDPOINTS = ("assess", "batch", "history", "save", "schema")
+DEFAULT_MIX = "assess=0.5,batch=0.05,history=0.2,save=0.15,schema=0.1"
+# p99 latency objectives in ms (Gemini-bound endpoints get the generation time on top)
+DEFAULT_SLO = "assess=3000,batch=15000,history=300,save=300,schema=200"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """"assess=0.5,schema=0.1" -> {"assess": 0.5, "schema": 0.1} (endpoint names checked)"""
+    weights = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' (choose from {', '.join(ENDPOINTS)})")
+        weights[name] = float(value)
+    return weights
+
+
+def git_revision(path: str = BASE_DIR) -> Dict:
+    """Commit the results belong to (dirty if the work tree has uncommitted changes)"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=path,
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": commit or None, "dirty": dirty}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+class Workload:
+    """Deterministic request payloads: synthetic answer sets, patient ids, recent result ids for /save_assessment"""
+
+    def __init__(self, seed: int, users: int, batch_size: int, patients: int, adapt_rate: float):
+        from backend.synthetic_population import SyntheticPopulation
+        population = SyntheticPopulation(seed=seed)
+        self.answers = SyntheticPopulation.as_user_inputs(population.generate(users))
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.patients = [f"loadtest-{seed}-{i}" for i in range(patients)]
+        self.adapt_rate = adapt_rate
+        # result_ids of recent successful /assess calls (what the app sends to /save_assessment)
+        self.recent_results: deque = deque(maxlen=500)
+
+    def user(self) -> Dict:
+        answers = dict(self.rng.choice(self.answers))
+        if self.adapt_rate > 0 and self.rng.random() < self.adapt_rate:
+            answers["preferred_language"] = self.rng.choice(["si", "ta"])
+            answers["preferred_culture"] = "Sri Lankan"
+        return answers
+
+    def request(self, endpoint: str):
+        """(method, path, json body) for one request to endpoint"""
+        if endpoint == "assess":
+            return "POST", "/assess", {"data": self.user()}
+        if endpoint == "batch":
+            return "POST", "/assess/batch", {"users": [self.user() for _ in range(self.batch_size)]}
+        if endpoint == "history":
+            return "GET", f"/history/{self.rng.choice(self.patients)}", None
+        if endpoint == "save":
+            result_id = self.recent_results[self.rng.randrange(len(self.recent_results))] if self.recent_results else None
+            return "POST", "/save_assessment", {
+                "user_id": self.rng.choice(self.patients),
+                "result_id": result_id,
+                "form_data": self.rng.choice(self.answers),
+            }
+        return "GET", "/schema", None
+
+
+def summarize(records: List[Dict], seconds: float) -> Dict:
+    """Counts, error rate, throughput and latency percentiles (successful requests) for a set of records"""
+    ok = [r["latency_ms"] for r in records if r["ok"]]
+    errors: Dict[str, int] = {}
+    for r in records:
+        if not r["ok"]:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    summary = {
+        "requests": len(records),
+        "ok": len(ok),
+        "errors": errors,
+        "error_rate": round(1 - len(ok) / len(records), 4) if records else 0.0,
+        "throughput_rps": round(len(ok) / seconds, 3) if seconds > 0 else None,
+    }
+    if ok:
+        values = np.percentile(ok, PERCENTILES)
+        summary.update({f"p{p}_ms": round(float(v), 1) for p, v in zip(PERCENTILES, values)})
+        summary["mean_ms"] = round(float(np.mean(ok)), 1)
+        summary["max_ms"] = round(float(np.max(ok)), 1)
+    return summary
+
+
+async def send(client, workload: Workload, endpoint: str, scheduled: float, timeout: float) -> Dict:
+    import httpx
+    method, path, body = workload.request(endpoint)
+    record = {"endpoint": endpoint, "ok": False, "error": None}
+    if endpoint == "save" and body["result_id"] is None:
+        # No /assess has succeeded yet, so there is nothing to save
+        record.update(latency_ms=0.0, error="no_result_to_save")
+        return record
+    try:
+        response = await client.request(method, path, json=body, timeout=timeout)
+        if response.status_code < 400:
+            record["ok"] = True
+            if endpoint == "assess":
+                result_id = response.json().get("result", {}).get("result_id")
+                if result_id:
+                    workload.recent_results.append(result_id)
+        else:
+            record["error"] = f"http_{response.status_code}"
+    except httpx.TimeoutException:
+        record["error"] = "timeout"
+    except httpx.HTTPError as e:
+        record["error"] = type(e).__name__
+    record["latency_ms"] = (time.perf_counter() - scheduled) * 1000
+    return record
+
+
+async def run_step(client, workload: Workload, rate: float, duration: float, mix: Dict[str, float],
+                   rng: random.Random, timeout: float) -> Dict:
+    """Offer `rate` requests/s (Poisson arrivals) for `duration` seconds and wait for all of them"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    tasks = []
+    started = time.perf_counter()
+    next_arrival = started
+    while True:
+        next_arrival += rng.expovariate(rate)
+        if next_arrival - started >= duration:
+            break
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = rng.choices(names, weights)[0]
+        tasks.append(asyncio.create_task(send(client, workload, endpoint, next_arrival, timeout)))
+    records = await asyncio.gather(*tasks)
+    # Throughput over the whole window the server needed, including draining the backlog
+    elapsed = max(duration, time.perf_counter() - started)
+
+    step = {
+        "offered_rps": rate,
+        "sent": len(records),
+        "elapsed_s": round(elapsed, 2),
+        "overall": summarize(records, elapsed),
+        "endpoints": {
+            name: summarize([r for r in records if r["endpoint"] == name], elapsed)
+            for name in names if any(r["endpoint"] == name for r in records)
+        },
+    }
+    step["sent_rps"] = round(len(records) / duration, 3)
+    return step
+
+
+def check_step(step: Dict, slo: Dict[str, float], max_error_rate: float) -> List[str]:
+    """Reasons this step counts as saturated (empty list: sustainable)"""
+    reasons = []
+    overall = step["overall"]
+    if step["sent"] and overall["throughput_rps"] < 0.9 * step["sent_rps"]:
+        reasons.append(f"throughput {overall['throughput_rps']} rps < 90% of {step['sent_rps']} rps sent")
+    if overall["error_rate"] > max_error_rate:
+        reasons.append(f"error rate {overall['error_rate']:.2%} > {max_error_rate:.2%}")
+    for name, summary in step["endpoints"].items():
+        p99 = summary.get("p99_ms")
+        if name in slo and p99 is not None and p99 > slo[name]:
+            reasons.append(f"{name} p99 {p99} ms > SLO {slo[name]:.0f} ms")
+    return reasons
+
+
+def start_server(port: int, firestore_ms: float, gemini_ms: float, log_path: str, ready_timeout: float,
+                 extra_args: List[str] = None):
+    """Start the API on the stand-ins in a subprocess and wait until /ready answers 200"""
+    import httpx
+    command = [sys.executable, os.path.join(BASE_DIR, "benchmarks", "stand_ins.py"), "--port", str(port)]
+    if firestore_ms is not None:
+        command += ["--firestore-ms", str(firestore_ms)]
+    if gemini_ms is not None:
+        command += ["--gemini-ms", str(gemini_ms)]
+    command += extra_args or []
+    log = open(log_path, "w")
+    server = subprocess.Popen(command, cwd=BASE_DIR, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"API server exited with code {server.returncode} (see {log_path})")
+        try:
+            if httpx.get(f"{url}/ready", timeout=2).status_code == 200:
+                return server, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"API server not ready after {ready_timeout:.0f}s (see {log_path})")
+
+
+async def run_load_test(url: str, args, mix: Dict[str, float], slo: Dict[str, float]) -> Dict:
+    import httpx
+    workload = Workload(args.seed, args.users, args.batch_size, args.patients, args.adapt_rate)
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    steps = []
+    saturation = {"max_sustainable_rps": None, "saturated_at_rps": None, "reasons": []}
+
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        # Prime: a few sequential assessments, saved for every test patient, so /history and
+        # /save_assessment have data from the first step on
+        for i in range(args.prime):
+            record = await send(client, workload, "assess", time.perf_counter(), args.timeout)
+            if not record["ok"]:
+                raise RuntimeError(f"Priming /assess failed ({record['error']}); is the API healthy?")
+        for patient in workload.patients:
+            method, path, body = workload.request("save")
+            await client.post(path, json=dict(body, user_id=patient), timeout=args.timeout)
+
+        for rate in args.rates:
+            print(f"🚀 {rate:g} req/s for {args.duration:g}s ...", file=sys.stderr)
+            step = await run_step(client, workload, rate, args.duration, mix, rng, args.timeout)
+            step["saturated_by"] = check_step(step, slo, args.max_error_rate)
+            steps.append(step)
+            overall = step["overall"]
+            print(f"   {overall['throughput_rps']} rps ok, errors {overall['error_rate']:.2%}, "
+                  f"p50 {overall.get('p50_ms')} ms, p99 {overall.get('p99_ms')} ms"
+                  + (f"  ⚠️  saturated: {'; '.join(step['saturated_by'])}" if step["saturated_by"] else ""),
+                  file=sys.stderr)
+            if step["saturated_by"]:
+                if saturation["saturated_at_rps"] is None:
+                    saturation.update(saturated_at_rps=rate, reasons=step["saturated_by"])
+                if not args.keep_going:
+                    break
+            elif saturation["saturated_at_rps"] is None:
+                saturation["max_sustainable_rps"] = rate
+
+    return {"steps": steps, "saturation": saturation}
+
+
+def print_report(report: Dict) -> None:
+    header = f"{'rate':>6} {'endpoint':<9}{'sent':>7}{'ok rps':>9}{'err%':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    for step in report["steps"]:
+        rows = [("all", step["overall"])] + list(step["endpoints"].items())
+        for name, s in rows:
+            print(f"{step['offered_rps']:>6g} {name:<9}{s['requests']:>7}{s['throughput_rps']:>9}"
+                  f"{100 * s['error_rate']:>7.1f}" + "".join(f"{s.get(key, '-'):>9}" for key in
+                                                           ("p50_ms", "p90_ms", "p95_ms", "p99_ms", "max_ms")))
+    saturation = report["saturation"]
+    if saturation["saturated_at_rps"] is None:
+        print(f"No saturation up to {report['steps'][-1]['offered_rps']:g} req/s")
+    else:
+        print(f"Saturated at {saturation['saturated_at_rps']:g} req/s ({'; '.join(saturation['reasons'])}); "
+              f"highest sustainable rate: {saturation['max_sustainable_rps']} req/s")
+
+
+def print_comparison(report: Dict, baseline: Dict) -> None:
+    """Throughput and p50/p99 change per (rate, endpoint) present in both runs"""
+    old_steps = {step["offered_rps"]: step for step in baseline["steps"]}
+    print(f"Compared with {baseline.get('commit') or 'baseline'} ({baseline.get('created_at', '?')}):")
+    print(f"{'rate':>6} {'endpoint':<9}{'ok rps':>16}{'p50 ms':>20}{'p99 ms':>20}")
+
+    def change(old, new) -> str:
+        if old is None or new is None:
+            return "-"
+        pct = f" ({100 * (new - old) / old:+.0f}%)" if old else ""
+        return f"{old}->{new}{pct}"
+
+    for step in report["steps"]:
+        old = old_steps.get(step["offered_rps"])
+        if old is None:
+            continue
+        pairs = [("all", old["overall"], step["overall"])] + [
+            (name, old["endpoints"][name], summary) for name, summary in step["endpoints"].items()
+            if name in old["endpoints"]
+        ]
+        for name, before, after in pairs:
+            print(f"{step['offered_rps']:>6g} {name:<9}{change(before['throughput_rps'], after['throughput_rps']):>16}"
+                  f"{change(before.get('p50_ms'), after.get('p50_ms')):>20}{change(before.get('p99_ms'), after.get('p99_ms')):>20}")
+    print(f"Max sustainable rate: {baseline['saturation']['max_sustainable_rps']} -> "
+          f"{report['saturation']['max_sustainable_rps']} req/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Open-loop HTTP load test with SLO and saturation report")
+    parser.add_argument("--url", help="Target a running API instead of starting one on the stand-ins")
+    parser.add_argument("--rates", default="1,2,4,8", help="Offered request rates (req/s), one step each")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per step")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Endpoint weights, e.g. assess=0.8,schema=0.2")
+    parser.add_argument("--slo", default=DEFAULT_SLO, help="p99 latency objective per endpoint in ms")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--keep-going", action="store_true", help="Run every rate even after saturation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--users", type=int, default=1000, help="Distinct synthetic answer sets")
+    parser.add_argument("--patients", type=int, default=50, help="Patient ids for /history and /save_assessment")
+    parser.add_argument("--batch-size", type=int, default=5, help="Users per /assess/batch request")
+    parser.add_argument("--adapt-rate", type=float, default=0.0,
+                        help="Share of users asking for a Sinhala/Tamil plan (cultural adaptation path)")
+    parser.add_argument("--prime", type=int, default=3, help="Sequential /assess calls before the first step")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--port", type=int, default=8800, help="Port for the stand-in server")
+    parser.add_argument("--gemini-ms", type=float, default=None, help="Stand-in Gemini median generation time")
+    parser.add_argument("--firestore-ms", type=float, default=None, help="Stand-in Firestore latency per operation")
+    parser.add_argument("--server-log", default=os.path.join(tempfile.gettempdir(), "hiv_load_test_server.log"))
+    parser.add_argument("--ready-timeout", type=float, default=180.0)
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this path")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+    args.rates = [float(rate) for rate in args.rates.split(",") if rate.strip()]
+
+    mix = parse_weights(args.mix)
+    slo = parse_weights(args.slo)
+    server = None
+    url = args.url
+    if url is None:
+        print(f"🔧 Starting the API on the stand-ins (log: {args.server_log}) ...", file=sys.stderr)
+        server, url = start_server(args.port, args.firestore_ms, args.gemini_ms, args.server_log, args.ready_timeout)
+
+    try:
+        results = asyncio.run(run_load_test(url, args, mix, slo))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report = dict(git_revision(), created_at=datetime.now().isoformat(), config={
+        "url": args.url or "stand-ins",
+        "rates": args.rates,
+        "duration_s": args.duration,
+        "mix": mix,
+        "slo_p99_ms": slo,
+        "max_error_rate": args.max_error_rate,
+        "seed": args.seed,
+        "users": args.users,
+        "patients": args.patients,
+        "batch_size": args.batch_size,
+        "adapt_rate": args.adapt_rate,
+        "gemini_ms": args.gemini_ms if args.gemini_ms is not None else os.getenv("HIV_STANDIN_GEMINI_MS", "800"),
+        "firestore_ms": args.firestore_ms if args.firestore_ms is not None else os.getenv("HIV_STANDIN_FIRESTORE_MS", "10"),
+        "cpu_count": os.cpu_count(),
+    }, **results)
+
+    print_report(report)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
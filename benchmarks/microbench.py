@@ -0,0 +1,342 @@
+"""
+Microbenchmarks for the backend hot paths, with a baseline and a regression gate.
+
+Benchmarked (one call each, cycling through a fixed set of fixtures):
+    prepare_features            HIVRiskPredictor._prepare_features
+    predict_proba               model.predict_proba on one prepared row
+    predict_proba_batch32       model.predict_proba on 32 rows (per call, not per row)
+    calculate_risk_score        ClinicalRiskScorer.calculate_risk_score
+    get_top_risk_factors        ClinicalRiskScorer.get_top_risk_factors
+    personalized_factors        HIVRiskPredictor._get_personalized_factors_from_scoring
+    enrich_plan_with_timeline   LLMInterventionPlanner._enrich_plan_with_timeline
+    apply_adaptations           PlanAdaptor._apply_adaptations
+    compare_users               HIVPreventionSystem._compare_users
+
+Fixtures are deterministic: synthetic answer sets (backend/synthetic_population.py, fixed seed),
+plans parsed from the Gemini stand-in's canned responses (benchmarks/stand_ins.py, no network), and
+results from the real pipeline on those inputs.
+
+Every benchmark is timed as --samples samples (each long enough to be above timer noise, gc disabled
+like timeit), spread over --processes fresh processes so process-to-process variance is sampled too. Against a baseline, a benchmark is flagged as slower when a one-sided
+Mann-Whitney U test says its samples are larger (p < --alpha) AND the median moved by more than
+--threshold: significant but tiny shifts and large but noisy ones are both ignored. The exit code is
+1 if anything regressed, so it can gate CI. Baselines are machine-specific: compare runs from the
+same machine.
+
+Usage (from the project root; the test needs scipy, see benchmarks/requirements.txt):
+    python benchmarks/microbench.py --save-baseline benchmarks/results/microbench_baseline.json
+    python benchmarks/microbench.py --baseline benchmarks/results/microbench_baseline.json --markdown
+    python benchmarks/microbench.py --only prepare_features,predict_proba --samples 50
+"""
+
+import argparse
+import contextlib
+import gc
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from load_test import git_revision  # noqa: E402  (benchmarks/ is on sys.path when run as a script)
+from stand_ins import RISK_LEVELS, StandInGenerativeModel, install  # noqa: E402
+
+FIXTURE_SEED = 2024
+FIXTURE_USERS = 32
+BENCHMARKS = (
+    "prepare_features", "predict_proba", "predict_proba_batch32", "calculate_risk_score", "get_top_risk_factors",
+    "personalized_factors", "enrich_plan_with_timeline", "apply_adaptations", "compare_users",
+)
+
+
+@contextlib.contextmanager
+def quiet():
+    """The pipeline prints debug lines on every call; keep them off the terminal (they are still formatted)"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def build_fixtures() -> Dict:
+    """Deterministic inputs for every benchmark (loads the model and scorer once)"""
+    install(firestore_ms=0, gemini_ms=0)
+    from backend.backend import HIVPreventionSystem
+    from backend.llm_planner import LLMInterventionPlanner
+    from backend.plan_adaptor import PlanAdaptor, extract_plan_segments
+    from backend.synthetic_population import SyntheticPopulation
+
+    population = SyntheticPopulation(seed=FIXTURE_SEED)
+    users = SyntheticPopulation.as_user_inputs(population.generate(FIXTURE_USERS))
+
+    with quiet():
+        system = HIVPreventionSystem()
+        predictor = system.risk_predictor
+        scorer = predictor.scoring_system
+        planner = LLMInterventionPlanner(api_key="stand-in")
+        adaptor = PlanAdaptor(api_key="stand-in")
+
+        rows = [predictor._prepare_features(user) for user in users]
+        scored = [scorer.calculate_risk_score(user) for user in users]
+        predictions = [predictor.predict(user) for user in users]
+
+        plans = []
+        for prediction in predictions:
+            factors = prediction["personalized_factors"]
+            total_weeks, _, num_categories = planner._calculate_timeline_from_interventions(factors)
+            stage = prediction["risk_stage"]
+            parsed = planner._parse_llm_response(StandInGenerativeModel._plan(f"RISK LEVEL: {RISK_LEVELS[stage]}"))
+            plans.append({
+                "parsed": parsed, "stage": stage, "factors": factors,
+                "total_weeks": total_weeks, "num_categories": num_categories,
+                "plan": planner._enrich_plan_with_timeline(parsed, stage, factors,
+                                                           total_weeks, num_categories),
+            })
+        adaptations = []
+        for entry in plans:
+            segments = extract_plan_segments(entry["plan"])
+            adaptations.append((entry["plan"], {segment: f"[si] {segment}" for segment in segments}))
+
+        results = [system.process_user(user, adapt=False) for user in users[:8]]
+
+    return {
+        "system": system, "predictor": predictor, "scorer": scorer, "planner": planner, "adaptor": adaptor,
+        "users": users, "rows": rows, "matrix": np.vstack(rows), "scored": scored, "plans": plans,
+        "adaptations": adaptations, "result_pairs": list(itertools.combinations(results, 2)),
+    }
+
+
+def benchmarks(fx: Dict) -> Dict[str, Callable[[], object]]:
+    """name -> zero-argument callable doing one operation (next fixture on every call)"""
+    predictor, scorer, planner, adaptor, system = fx["predictor"], fx["scorer"], fx["planner"], fx["adaptor"], fx["system"]
+    users = itertools.cycle(fx["users"])
+    rows = itertools.cycle(fx["rows"])
+    scored_users = itertools.cycle(list(zip(fx["users"], fx["scored"])))
+    explanations = itertools.cycle([explanation for _, explanation in fx["scored"]])
+    plans = itertools.cycle(fx["plans"])
+    adaptations = itertools.cycle(fx["adaptations"])
+    pairs = itertools.cycle(fx["result_pairs"])
+    matrix = fx["matrix"]
+
+    def personalized_factors():
+        user, (score, explanation) = next(scored_users)
+        return predictor._get_personalized_factors_from_scoring(explanation, user, score)
+
+    def enrich_plan():
+        entry = next(plans)
+        return planner._enrich_plan_with_timeline(entry["parsed"], entry["stage"], entry["factors"],
+                                                  entry["total_weeks"], entry["num_categories"])
+
+    return {
+        "prepare_features": lambda: predictor._prepare_features(next(users)),
+        "predict_proba": lambda: predictor.model.predict_proba(next(rows)),
+        "predict_proba_batch32": lambda: predictor.model.predict_proba(matrix),
+        "calculate_risk_score": lambda: scorer.calculate_risk_score(next(users)),
+        "get_top_risk_factors": lambda: scorer.get_top_risk_factors(next(explanations), top_n=5),
+        "personalized_factors": personalized_factors,
+        "enrich_plan_with_timeline": enrich_plan,
+        "apply_adaptations": lambda: adaptor._apply_adaptations(*next(adaptations)),
+        "compare_users": lambda: system._compare_users(*next(pairs)),
+    }
+
+
+def measure(func: Callable[[], object], samples: int, min_time: float) -> List[float]:
+    """Per-call µs for `samples` samples; calls per sample calibrated so a sample lasts >= min_time"""
+    with quiet():
+        # Warm up and calibrate
+        loops = 1
+        while True:
+            started = time.perf_counter()
+            for _ in range(loops):
+                func()
+            if time.perf_counter() - started >= min_time:
+                break
+            loops *= 2
+
+        gc.collect()
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            per_call = []
+            for _ in range(samples):
+                started = time.perf_counter()
+                for _ in range(loops):
+                    func()
+                per_call.append((time.perf_counter() - started) / loops * 1e6)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    return per_call
+
+
+def run_worker(names: List[str], samples: int, min_time: float, output_path: str) -> None:
+    """One measuring process: build the fixtures, time the named benchmarks, write the raw samples"""
+    suite = benchmarks(build_fixtures())
+    results = {}
+    for name in names:
+        results[name] = measure(suite[name], samples, min_time)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+
+def run_processes(names: List[str], processes: int, samples: int, min_time: float) -> Dict[str, List[float]]:
+    """
+    Spread the samples over fresh processes. On shared/virtual machines a whole process can land on a
+    slow or fast path (memory placement, CPU migration) and stay there; sampling several processes puts
+    that variance into every run, so the test does not mistake it for a code change.
+    """
+    per_process = max(1, -(-samples // processes))
+    merged: Dict[str, List[float]] = {name: [] for name in names}
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(processes):
+            print(f"⏱️  Process {i + 1}/{processes}: {per_process} samples x {len(names)} benchmarks", file=sys.stderr)
+            output_path = os.path.join(tmp, f"worker{i}.json")
+            subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--role", "worker", "--only", ",".join(names),
+                 "--samples", str(per_process), "--min-time", str(min_time), "-o", output_path],
+                cwd=BASE_DIR, check=True, stdout=subprocess.DEVNULL
+            )
+            with open(output_path, "r", encoding="utf-8") as f:
+                for name, values in json.load(f).items():
+                    merged[name].extend(values)
+    return merged
+
+
+def summarize_samples(values: List[float]) -> Dict:
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    return {
+        "median_us": round(float(median), 3),
+        "iqr_us": round(float(q3 - q1), 3),
+        "min_us": round(float(min(values)), 3),
+        "samples_us": [round(float(v), 3) for v in values],
+    }
+
+
+def compare(current: Dict, baseline: Dict, alpha: float, threshold: float) -> Dict[str, Dict]:
+    """Per benchmark present in both: median change and verdict (slower / faster / unchanged)"""
+    from scipy.stats import mannwhitneyu
+
+    deltas = {}
+    for name, result in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = result["median_us"] / before["median_us"] - 1 if before["median_us"] else 0.0
+        p_slower = mannwhitneyu(result["samples_us"], before["samples_us"], alternative="greater").pvalue
+        p_faster = mannwhitneyu(result["samples_us"], before["samples_us"], alternative="less").pvalue
+        if p_slower < alpha and change > threshold:
+            verdict = "slower"
+        elif p_faster < alpha and change < -threshold:
+            verdict = "faster"
+        else:
+            verdict = "unchanged"
+        deltas[name] = {
+            "baseline_median_us": before["median_us"],
+            "median_us": result["median_us"],
+            "change": round(change, 4),
+            "p_value": float(p_slower if change >= 0 else p_faster),
+            "verdict": verdict,
+        }
+    return deltas
+
+
+def environment() -> Dict:
+    import xgboost
+    return dict(git_revision(), python=platform.python_version(), machine=platform.machine(),
+                cpu_count=os.cpu_count(), numpy=np.__version__, xgboost=xgboost.__version__)
+
+
+def print_results(results: Dict, deltas: Dict, markdown: bool) -> None:
+    if markdown:
+        print("| benchmark | baseline µs | current µs | change | p | verdict |")
+        print("|---|---:|---:|---:|---:|---|")
+    else:
+        print(f"{'benchmark':<28}{'median µs':>12}{'IQR µs':>10}{'baseline µs':>13}{'change':>9}{'p':>9}  verdict")
+    for name, result in results.items():
+        delta = deltas.get(name)
+        if markdown:
+            if delta:
+                print(f"| {name} | {delta['baseline_median_us']} | {result['median_us']} | {delta['change']:+.1%} | "
+                      f"{delta['p_value']:.3g} | {delta['verdict']} |")
+            else:
+                print(f"| {name} | - | {result['median_us']} | - | - | new |")
+        elif delta:
+            flag = "  ⚠️" if delta["verdict"] == "slower" else ""
+            print(f"{name:<28}{result['median_us']:>12}{result['iqr_us']:>10}{delta['baseline_median_us']:>13}"
+                  f"{delta['change']:>+9.1%}{delta['p_value']:>9.3g}  {delta['verdict']}{flag}")
+        else:
+            print(f"{name:<28}{result['median_us']:>12}{result['iqr_us']:>10}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backend hot-path microbenchmarks with a regression gate")
+    parser.add_argument("--only", help="Comma-separated benchmark names")
+    parser.add_argument("--samples", type=int, default=40, help="Samples per benchmark (over all processes)")
+    parser.add_argument("--processes", type=int, default=4, help="Measuring processes the samples are spread over")
+    parser.add_argument("--min-time", type=float, default=0.02, help="Minimum seconds per sample")
+    parser.add_argument("--baseline", help="Compare against this results JSON (exit code 1 on a regression)")
+    parser.add_argument("--save-baseline", help="Write these results as the new baseline")
+    parser.add_argument("--alpha", type=float, default=0.01, help="Significance level of the Mann-Whitney U test")
+    parser.add_argument("--threshold", type=float, default=0.05, help="Minimum median change that counts (0.05 = 5%%)")
+    parser.add_argument("--markdown", action="store_true", help="Print the comparison as a Markdown table (PR descriptions)")
+    parser.add_argument("-o", "--output", help="Write results (and deltas) as JSON to this path")
+    parser.add_argument("--role", default="bench", choices=["bench", "worker"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    names = list(BENCHMARKS)
+    if args.only:
+        names = [name.strip() for name in args.only.split(",")]
+        unknown = [name for name in names if name not in BENCHMARKS]
+        if unknown:
+            parser.error(f"Unknown benchmark(s): {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+
+    if args.role == "worker":
+        run_worker(names, args.samples, args.min_time, args.output)
+        return
+
+    samples = run_processes(names, args.processes, args.samples, args.min_time)
+    results = {name: summarize_samples(values) for name, values in samples.items()}
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "environment": environment(),
+        "config": {"samples": args.samples, "processes": args.processes, "min_time": args.min_time,
+                   "fixture_seed": FIXTURE_SEED, "fixture_users": FIXTURE_USERS},
+        "results": results,
+    }
+    deltas = {}
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for key in ("python", "machine", "cpu_count", "xgboost"):
+            if baseline.get("environment", {}).get(key) != report["environment"][key]:
+                print(f"⚠️  Baseline {key} differs ({baseline.get('environment', {}).get(key)} vs "
+                      f"{report['environment'][key]}); deltas may not be comparable", file=sys.stderr)
+        deltas = compare(results, baseline["results"], args.alpha, args.threshold)
+        regressions = [name for name, delta in deltas.items() if delta["verdict"] == "slower"]
+        report["baseline"] = {"path": args.baseline, "commit": baseline.get("environment", {}).get("commit"),
+                              "alpha": args.alpha, "threshold": args.threshold, "deltas": deltas}
+
+    print_results(results, deltas, args.markdown)
+    for path in (args.output, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if regressions:
+        print(f"❌ Slower than baseline: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Memory benchmark: N independently started workers vs N workers forked from a preloaded master.
+
+Each worker loads the model/scorer/bundles (or inherits them), runs a few predictions so it is in a
+serving state, and then stays alive while /proc/<pid>/smaps_rollup is read. Reported per mode:
+    pss_total_mb   - proportional set size summed over all processes (real node memory cost)
+    uss_avg_mb     - memory private to each worker (what one extra worker costs)
+    rss_avg_mb     - resident size per worker (counts shared pages in every worker)
+
+Usage (from the project root, Linux only):
+    python benchmarks/prefork_memory.py --workers 4
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+READY = "__READY__"
+
+
+def read_memory(pid: int) -> dict:
+    """Rss / Pss / Uss (kB) from smaps_rollup"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def sample_users(count: int) -> list:
+    """Complete synthetic answers (first option of every question)"""
+    with open(os.path.join(BASE_DIR, "data", "feature_dictionary.json"), "r", encoding="utf-8") as f:
+        definitions = json.load(f)["feature_definitions"]
+    base = {}
+    for feature, info in definitions.items():
+        options = info.get("options")
+        base[feature] = int(next(iter(options))) if isinstance(options, dict) and options else 1
+    base.update({"q55": 1, "q52": 1})
+    return [dict(base) for _ in range(count)]
+
+
+def warm_up(predictions: int) -> None:
+    """Load (or reuse inherited) components and serve a few predictions, quietly"""
+    from backend.backend import preload_shared_components
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = preload_shared_components()["risk_predictor"]
+        for user in sample_users(predictions):
+            predictor.predict(user)
+
+
+def summarize(mode: str, worker_pids: list, master_pid: int = None) -> dict:
+    workers = [read_memory(pid) for pid in worker_pids]
+    master = read_memory(master_pid) if master_pid else None
+    pss_total = sum(w["pss_kb"] for w in workers) + (master["pss_kb"] if master else 0)
+    return {
+        "mode": mode,
+        "workers": len(workers),
+        "pss_total_mb": round(pss_total / 1024, 1),
+        "uss_avg_mb": round(sum(w["uss_kb"] for w in workers) / len(workers) / 1024, 1),
+        "rss_avg_mb": round(sum(w["rss_kb"] for w in workers) / len(workers) / 1024, 1),
+        "master_pss_mb": round(master["pss_kb"] / 1024, 1) if master else None,
+    }
+
+
+def run_independent(workers: int, predictions: int) -> dict:
+    """Every worker is a fresh interpreter that loads everything itself (like plain `uvicorn --workers`)"""
+    procs = [
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--role", "worker", "--predictions", str(predictions)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=BASE_DIR
+        )
+        for _ in range(workers)
+    ]
+    try:
+        for proc in procs:
+            for line in proc.stdout:
+                if line.strip() == READY:
+                    break
+        time.sleep(0.5)
+        return summarize("independent", [proc.pid for proc in procs])
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+
+
+def run_prefork(workers: int, predictions: int) -> dict:
+    """Master preloads and freezes, then forks the workers (like api/serve_prefork.py)"""
+    from backend.backend import preload_shared_components
+    with contextlib.redirect_stdout(io.StringIO()):
+        gc.disable()
+        preload_shared_components()
+        gc.collect()
+        gc.freeze()
+        gc.enable()
+
+    children = []
+    for _ in range(workers):
+        ready_r, ready_w = os.pipe()
+        release_r, release_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            os.close(release_w)
+            # Drop the pipe ends inherited from earlier siblings, or they would never see EOF
+            for _, sibling_ready_r, sibling_release_w in children:
+                os.close(sibling_ready_r)
+                os.close(sibling_release_w)
+            warm_up(predictions)
+            os.write(ready_w, b"1")
+            os.read(release_r, 1)  # block until the parent has measured
+            os._exit(0)
+        os.close(ready_w)
+        os.close(release_r)
+        children.append((pid, ready_r, release_w))
+
+    try:
+        for _, ready_r, _ in children:
+            os.read(ready_r, 1)
+        time.sleep(0.5)
+        return summarize("prefork", [pid for pid, _, _ in children], master_pid=os.getpid())
+    finally:
+        for pid, ready_r, release_w in children:
+            os.close(release_w)
+            os.close(ready_r)
+            os.waitpid(pid, 0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare worker memory: independent vs pre-forked")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--predictions", type=int, default=20, help="Warm-up predictions per worker")
+    parser.add_argument("--role", default="bench", choices=["bench", "worker"], help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        warm_up(args.predictions)
+        print(READY, flush=True)
+        sys.stdin.read()  # stay alive until the benchmark has measured us
+        return
+
+    independent = run_independent(args.workers, args.predictions)
+    prefork = run_prefork(args.workers, args.predictions)
+    report = {
+        "independent": independent,
+        "prefork": prefork,
+        "pss_saved_mb": round(independent["pss_total_mb"] - prefork["pss_total_mb"], 1),
+        "pss_saved_pct": round(100 * (1 - prefork["pss_total_mb"] / independent["pss_total_mb"]), 1),
+    }
+
+    print(f"{'mode':<12}{'workers':>8}{'PSS total MB':>14}{'USS/worker MB':>15}{'RSS/worker MB':>15}")
+    for row in (independent, prefork):
+        print(f"{row['mode']:<12}{row['workers']:>8}{row['pss_total_mb']:>14}{row['uss_avg_mb']:>15}{row['rss_avg_mb']:>15}")
+    print(f"Pre-fork saves {report['pss_saved_mb']} MB PSS ({report['pss_saved_pct']}%)")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Replay captured /assess traffic (backend/request_capture.py, HIV_CAPTURE_PATH) against one or more
+builds, for before/after numbers on a real-world traffic shape.
+
+Requests are re-issued open-loop on the recorded arrival pattern: request i is sent at
+(arrived_at[i] - arrived_at[0]) / --speed after the start, so --speed 1 reproduces the recorded
+rate and bursts, --speed 10 the same shape ten times faster. Latency is measured from that scheduled
+time. Each build is served on the stand-ins (benchmarks/stand_ins.py) with Gemini answering from the
+recording: same prompt, same response, recorded generation time (or --gemini-ms), so differences
+between builds come from the code, not from the LLM.
+
+Per build: throughput, error rate, latency percentiles, stage mismatches against the recorded
+responses, and how many Gemini prompts were served from the recording (a drop in hits means the
+build changed its prompts). Several --build directories (e.g. git worktrees) are replayed one after
+the other and compared with the first.
+
+Usage (from the project root):
+    HIV_CAPTURE_PATH=captures/assess-{pid}.jsonl HIV_CAPTURE_SALT=... uvicorn api.api:app   # record
+    git worktree add ../hiv-main main
+    python benchmarks/replay.py 'captures/assess-*.jsonl' --build ../hiv-main --build . --speed 5 -o replay.json
+    python benchmarks/replay.py captures/assess-1234.jsonl --url http://staging:8000   # no LLM replay
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from load_test import git_revision, start_server, summarize  # noqa: E402  (benchmarks/ is on sys.path)
+
+
+def load_requests(patterns: List[str], route: str = "/assess") -> List[Dict]:
+    """Captured requests from all files (one per worker), merged in arrival order"""
+    requests = []
+    for pattern in patterns:
+        paths = sorted(glob.glob(pattern))
+        if not paths:
+            raise FileNotFoundError(f"No capture files match {pattern}")
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("type") == "request" and record.get("route") == route:
+                        requests.append(record)
+    requests.sort(key=lambda record: record["arrived_at"])
+    return requests
+
+
+async def replay(url: str, requests: List[Dict], speed: float, timeout: float, max_connections: int) -> List[Dict]:
+    import httpx
+
+    async def send(client, record: Dict, scheduled: float) -> Dict:
+        result = {"ok": False, "error": None, "stage_mismatch": False}
+        try:
+            response = await client.post("/assess", json=record["body"], timeout=timeout)
+            if response.status_code < 400:
+                result["ok"] = True
+                body = response.json()
+                stage = body.get("result", {}).get("risk_prediction", {}).get("risk_stage")
+                if record.get("risk_stage") is not None and stage is not None:
+                    result["stage_mismatch"] = stage != record["risk_stage"]
+            else:
+                result["error"] = f"http_{response.status_code}"
+        except httpx.TimeoutException:
+            result["error"] = "timeout"
+        except httpx.HTTPError as e:
+            result["error"] = type(e).__name__
+        result["latency_ms"] = (time.perf_counter() - scheduled) * 1000
+        return result
+
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    first_arrival = requests[0]["arrived_at"]
+    tasks = []
+    async with httpx.AsyncClient(base_url=url, limits=limits) as client:
+        started = time.perf_counter()
+        for record in requests:
+            scheduled = started + (record["arrived_at"] - first_arrival) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(client, record, scheduled)))
+        return await asyncio.gather(*tasks)
+
+
+def llm_replay_counts(url: str) -> Dict[str, int]:
+    """Hits/misses of the recorded Gemini responses, from the stand-in server's /metrics"""
+    import httpx
+    counts = {}
+    try:
+        for line in httpx.get(f"{url}/metrics", timeout=10).text.splitlines():
+            if line.startswith("hiv_standin_llm_replay_total{"):
+                outcome = line.split('outcome="', 1)[1].split('"', 1)[0]
+                counts[outcome] = int(float(line.rsplit(" ", 1)[1]))
+    except httpx.HTTPError:
+        pass
+    return counts
+
+
+def run_build(build_dir: str, captures: List[str], requests: List[Dict], args, port: int) -> Dict:
+    build_dir = os.path.abspath(build_dir)
+    extra_args = ["--app-dir", build_dir]
+    for pattern in captures:
+        extra_args += ["--llm-recording", pattern]
+    log_path = os.path.join(tempfile.gettempdir(), f"hiv_replay_server_{port}.log")
+    print(f"🔧 Starting {build_dir} on the stand-ins (log: {log_path}) ...", file=sys.stderr)
+    server, url = start_server(port, args.firestore_ms, args.gemini_ms, log_path, args.ready_timeout, extra_args)
+    try:
+        started = time.perf_counter()
+        records = asyncio.run(replay(url, requests, args.speed, args.timeout, args.max_connections))
+        elapsed = time.perf_counter() - started
+        llm = llm_replay_counts(url)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return dict(build=build_dir, **git_revision(build_dir), **report_for(records, elapsed), llm_replay=llm)
+
+
+def report_for(records: List[Dict], elapsed: float) -> Dict:
+    summary = summarize(records, elapsed)
+    summary["stage_mismatches"] = sum(1 for record in records if record["stage_mismatch"])
+    summary["elapsed_s"] = round(elapsed, 2)
+    return summary
+
+
+def print_report(results: List[Dict], recorded: Dict) -> None:
+    print(f"Recorded: {recorded['requests']} requests over {recorded['span_s']} s, "
+          f"p50 {recorded.get('p50_ms')} ms, p99 {recorded.get('p99_ms')} ms (as served when captured)")
+    print(f"{'build':<32}{'ok rps':>9}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'stage≠':>8}{'llm hit/miss':>14}")
+    base = results[0]
+    for result in results:
+        name = (result.get("commit") or "")[:10] or os.path.basename(result["build"])
+        name += " (dirty)" if result.get("dirty") else ""
+        llm = result.get("llm_replay") or {}
+        print(f"{name:<32}{result['throughput_rps']:>9}{100 * result['error_rate']:>7.1f}"
+              + "".join(f"{result.get(key, '-'):>9}" for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+              + f"{result['stage_mismatches']:>8}{str(llm.get('hit', '-')) + '/' + str(llm.get('miss', '-')):>14}")
+        if result is not base:
+            deltas = []
+            for key in ("p50_ms", "p99_ms"):
+                if base.get(key) and result.get(key):
+                    deltas.append(f"{key[:-3]} {100 * (result[key] - base[key]) / base[key]:+.1f}%")
+            print(f"{'':<32}vs first build: {', '.join(deltas) or '-'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay captured /assess traffic against one or more builds")
+    parser.add_argument("captures", nargs="+", help="Capture files (globs allowed, e.g. 'captures/assess-*.jsonl')")
+    parser.add_argument("--build", action="append", help="Checkout to replay against (repeatable; default: this one)")
+    parser.add_argument("--url", help="Replay against a running server instead (Gemini is then not replayed)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Arrival-time acceleration (1 = as recorded)")
+    parser.add_argument("--limit", type=int, help="Only the first N captured requests")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--gemini-ms", type=float, default=None,
+                        help="Fixed Gemini latency instead of the recorded generation times")
+    parser.add_argument("--firestore-ms", type=float, default=None)
+    parser.add_argument("--port", type=int, default=8810)
+    parser.add_argument("--ready-timeout", type=float, default=180.0)
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this path")
+    args = parser.parse_args()
+
+    requests = load_requests(args.captures)
+    if args.limit:
+        requests = requests[:args.limit]
+    if not requests:
+        parser.error("No captured /assess requests found")
+    span = requests[-1]["arrived_at"] - requests[0]["arrived_at"]
+    recorded = summarize([{"ok": r["status"] < 400, "error": f"http_{r['status']}", "latency_ms": r["duration_ms"]}
+                          for r in requests], max(span, 1e-9))
+    recorded["span_s"] = round(span, 2)
+    print(f"📼 {len(requests)} requests over {span:.1f}s, replayed at {args.speed:g}x "
+          f"({span / args.speed:.1f}s)", file=sys.stderr)
+
+    results = []
+    if args.url:
+        started = time.perf_counter()
+        records = asyncio.run(replay(args.url, requests, args.speed, args.timeout, args.max_connections))
+        results.append(dict(build=args.url, commit=None, **report_for(records, time.perf_counter() - started)))
+    else:
+        for i, build in enumerate(args.build or [BASE_DIR]):
+            results.append(run_build(build, args.captures, requests, args, args.port + i))
+
+    print_report(results, recorded)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(),
+                "config": {"captures": args.captures, "requests": len(requests), "speed": args.speed,
+                           "gemini_ms": args.gemini_ms if args.gemini_ms is not None else "recorded"},
+                "recorded": recorded,
+                "builds": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+"""
+Local stand-ins for Firestore and Gemini, so the API can be load-tested without credentials, quotas
+or network noise.
+
+- InMemoryFirestore: the subset of the firebase_admin Firestore client that api/api.py and
+  api/backfill.py use (collection/document/set/get/update, subcollections, order_by/limit/stream,
+  collection_group/start_after/select, write batches), thread-safe, with a
+  fixed per-operation latency (HIV_STANDIN_FIRESTORE_MS) to stand in for the network round trip.
+- StandInGenerativeModel: answers plan and cultural-adaptation prompts with canned, parseable JSON
+  after a simulated generation time (HIV_STANDIN_GEMINI_MS median, lognormal jitter
+  HIV_STANDIN_GEMINI_JITTER), so the Gemini code paths (client pools, deadlines, load shedding)
+  still run.
+- RecordedGenerativeModel: serves the Gemini responses of a traffic capture (backend/request_capture.py)
+  by prompt hash, with the recorded generation time, so replays (benchmarks/replay.py) get the same
+  plans as the captured traffic. Prompts that are not in the recording get the canned answer.
+
+install() patches firebase_admin and google.generativeai in-process; it must run before the API's
+startup event. Run this file to serve the API on the stand-ins (used by benchmarks/load_test.py and
+benchmarks/replay.py; --app-dir serves another checkout, e.g. a git worktree of an older commit):
+    python benchmarks/stand_ins.py --port 8800 --gemini-ms 800 --firestore-ms 15
+    python benchmarks/stand_ins.py --llm-recording capture.jsonl --app-dir ../hiv-main
+"""
+
+import argparse
+import contextlib
+import copy
+import glob
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from typing import Dict, List, Optional
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+RISK_LEVELS = ["Low", "Moderate", "High", "Very High"]
+
+
+def _sleep_ms(ms: float) -> None:
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+
+
+def _field(data: Dict, dotted: str):
+    """Value of a dotted field path ("metadata.timestamp"), None if absent"""
+    for part in dotted.split("."):
+        if not isinstance(data, dict) or part not in data:
+            return None
+        data = data[part]
+    return data
+
+
+class _Snapshot:
+    def __init__(self, reference: "_DocumentReference", data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[Dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str):
+        return _field(self._data or {}, field)
+
+
+class _DocumentReference:
+    def __init__(self, client: "InMemoryFirestore", collection_path: str, doc_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f"{collection_path}/{doc_id}"
+
+    def collection(self, name: str) -> "_Query":
+        return _Query(self._client, f"{self.path}/{name}")
+
+    def get(self) -> _Snapshot:
+        self._client._round_trip()
+        with self._client._lock:
+            data = self._client._collections.get(self._collection_path, {}).get(self.id)
+            return _Snapshot(self, copy.deepcopy(data))
+
+    def set(self, data: Dict, merge: bool = False) -> None:
+        self._client._round_trip()
+        with self._client._lock:
+            documents = self._client._collections.setdefault(self._collection_path, {})
+            if merge and self.id in documents:
+                documents[self.id].update(copy.deepcopy(data))
+            else:
+                documents[self.id] = copy.deepcopy(data)
+
+    def update(self, data: Dict) -> None:
+        self._client._round_trip()
+        with self._client._lock:
+            documents = self._client._collections.get(self._collection_path, {})
+            if self.id not in documents:
+                raise KeyError(f"No document to update: {self.path}")
+            for dotted, value in data.items():
+                target = documents[self.id]
+                *parents, leaf = dotted.split(".")
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = copy.deepcopy(value)
+
+    def delete(self) -> None:
+        self._client._round_trip()
+        with self._client._lock:
+            self._client._collections.get(self._collection_path, {}).pop(self.id, None)
+
+
+class _Query:
+    """
+    A collection reference is a query without filters; order_by/limit/start_after/select return
+    narrowed copies. group=True queries every collection with this id (collection_group).
+    """
+
+    def __init__(self, client: "InMemoryFirestore", path: str, order: List = None, limit: int = None,
+                 group: bool = False, after: Optional[_Snapshot] = None, fields: List[str] = None):
+        self._client = client
+        self._path = path
+        self._order = order or []
+        self._limit = limit
+        self._group = group
+        self._after = after
+        self._fields = fields
+        self.id = path.rsplit("/", 1)[-1]
+
+    def _narrow(self, **changes) -> "_Query":
+        state = dict(order=self._order, limit=self._limit, group=self._group, after=self._after, fields=self._fields)
+        state.update(changes)
+        return _Query(self._client, self._path, **state)
+
+    def document(self, doc_id: str = None) -> _DocumentReference:
+        return _DocumentReference(self._client, self._path, doc_id or uuid.uuid4().hex[:20])
+
+    def order_by(self, field: str, direction: str = "ASCENDING") -> "_Query":
+        return self._narrow(order=self._order + [(field, direction)])
+
+    def limit(self, count: int) -> "_Query":
+        return self._narrow(limit=count)
+
+    def start_after(self, snapshot: _Snapshot) -> "_Query":
+        return self._narrow(after=snapshot)
+
+    def select(self, field_paths: List[str]) -> "_Query":
+        return self._narrow(fields=list(field_paths))
+
+    def _project(self, data: Dict) -> Dict:
+        if self._fields is None:
+            return data
+        projected = {}
+        for dotted in self._fields:
+            value = _field(data, dotted)
+            if value is not None:
+                target = projected
+                *parents, leaf = dotted.split(".")
+                for part in parents:
+                    target = target.setdefault(part, {})
+                target[leaf] = value
+        return projected
+
+    def stream(self):
+        self._client._round_trip()
+        with self._client._lock:
+            if self._group:
+                collections = [path for path in self._client._collections if path.rsplit("/", 1)[-1] == self.id]
+            else:
+                collections = [self._path]
+            # (collection path, document id, data)
+            items = [(path, doc_id, copy.deepcopy(data))
+                     for path in collections
+                     for doc_id, data in self._client._collections.get(path, {}).items()]
+        for field, direction in reversed(self._order):
+            if field == "__name__":
+                items.sort(key=lambda item: f"{item[0]}/{item[1]}", reverse=(direction == "DESCENDING"))
+                continue
+            # Like Firestore, ordering on a field drops documents that do not have it
+            items = [item for item in items if _field(item[2], field) is not None]
+            items.sort(key=lambda item: _field(item[2], field), reverse=(direction == "DESCENDING"))
+        if self._after is not None:
+            paths = [f"{path}/{doc_id}" for path, doc_id, _ in items]
+            cursor = self._after.reference.path
+            if cursor in paths:
+                items = items[paths.index(cursor) + 1:]
+            else:
+                # Cursor document is gone: only ordering by __name__ can still place it
+                items = [item for item, path in zip(items, paths) if path > cursor]
+        if self._limit is not None:
+            items = items[:self._limit]
+        return iter([_Snapshot(_DocumentReference(self._client, path, doc_id), self._project(data))
+                     for path, doc_id, data in items])
+
+    def get(self) -> List[_Snapshot]:
+        return list(self.stream())
+
+
+class _WriteBatch:
+    """Writes applied together in one round trip, at most 500 per batch like a Firestore WriteBatch"""
+
+    MAX_WRITES = 500
+
+    def __init__(self, client: "InMemoryFirestore"):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference: _DocumentReference, data: Dict, merge: bool = False) -> None:
+        self._writes.append((reference.set, (data, merge)))
+
+    def update(self, reference: _DocumentReference, data: Dict) -> None:
+        self._writes.append((reference.update, (data,)))
+
+    def delete(self, reference: _DocumentReference) -> None:
+        self._writes.append((reference.delete, ()))
+
+    def commit(self) -> None:
+        if len(self._writes) > self.MAX_WRITES:
+            raise ValueError(f"A batch holds at most {self.MAX_WRITES} writes, got {len(self._writes)}")
+        self._client._round_trip()
+        with self._client._no_latency():
+            for write, args in self._writes:
+                write(*args)
+        self._writes = []
+
+
+class InMemoryFirestore:
+    """Thread-safe in-memory Firestore client (what firestore.client() returns)"""
+
+    def __init__(self, latency_ms: float = None):
+        self.latency_ms = float(os.getenv("HIV_STANDIN_FIRESTORE_MS", "10")) if latency_ms is None else latency_ms
+        self._lock = threading.Lock()
+        self._batching = threading.local()
+        # collection path -> {document id: data}
+        self._collections: Dict[str, Dict[str, Dict]] = {}
+
+    def _round_trip(self) -> None:
+        if not getattr(self._batching, "active", False):
+            _sleep_ms(self.latency_ms)
+
+    @contextlib.contextmanager
+    def _no_latency(self):
+        """A batch commit pays one round trip for all of its writes"""
+        self._batching.active = True
+        try:
+            yield
+        finally:
+            self._batching.active = False
+
+    def collection(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def collection_group(self, collection_id: str) -> _Query:
+        return _Query(self, collection_id, group=True)
+
+    def document(self, path: str) -> _DocumentReference:
+        collection_path, doc_id = path.rsplit("/", 1)
+        return _DocumentReference(self, collection_path, doc_id)
+
+    def batch(self) -> _WriteBatch:
+        return _WriteBatch(self)
+
+    def document_count(self) -> int:
+        with self._lock:
+            return sum(len(documents) for documents in self._collections.values())
+
+
+class StandInGenerativeModel:
+    """genai.GenerativeModel stand-in: canned plan / adaptation JSON after a simulated generation time"""
+
+    def __init__(self, model_name: str = "gemini-2.5-flash", latency_ms: float = None, jitter: float = None):
+        self.model_name = model_name
+        self.latency_ms = float(os.getenv("HIV_STANDIN_GEMINI_MS", "800")) if latency_ms is None else latency_ms
+        self.jitter = float(os.getenv("HIV_STANDIN_GEMINI_JITTER", "0.3")) if jitter is None else jitter
+
+    def _generation_time(self) -> None:
+        if self.latency_ms > 0:
+            _sleep_ms(self.latency_ms * math.exp(random.gauss(0.0, self.jitter)) if self.jitter > 0 else self.latency_ms)
+
+    def count_tokens(self, contents) -> types.SimpleNamespace:
+        _sleep_ms(min(self.latency_ms, 50.0))
+        return types.SimpleNamespace(total_tokens=max(1, len(str(contents)) // 4))
+
+    def generate_content(self, prompt: str, **kwargs) -> types.SimpleNamespace:
+        self._generation_time()
+        if "ORIGINAL SEGMENTS" in prompt:
+            text = self._adaptation(prompt)
+        else:
+            text = self._plan(prompt)
+        return types.SimpleNamespace(text=text)
+
+    @staticmethod
+    def _plan(prompt: str) -> str:
+        level = "High"
+        for line in prompt.splitlines():
+            if line.startswith("RISK LEVEL:"):
+                level = line.split(":", 1)[1].strip()
+        phases = 3 if level in ("Low", "Moderate") else 4
+        plan = {
+            "personalized_plan": [
+                {
+                    "phase_title": f"Step {i}: building safer habits",
+                    "week_range": f"Weeks {2 * i - 1}-{2 * i}",
+                    "core_habit": f"Practice one protective habit every day (phase {i})",
+                    "weekly_activities": [
+                        f"Week {2 * i - 1}: Write down one situation where you want to make a safer choice",
+                        f"Week {2 * i}: Talk to a trusted friend or a clinic about your plan",
+                    ],
+                    "why_this_matters_for_you": f"This phase targets your {level.lower()} risk factors step by step.",
+                }
+                for i in range(1, phases + 1)
+            ],
+            "plan_summary": {
+                "total_weeks": 2 * phases,
+                "your_main_focus": "Building safer habits for long-term wellbeing",
+                "key_to_success": "Small, consistent steps",
+            },
+        }
+        return "```json\n" + json.dumps(plan) + "\n```"
+
+    @staticmethod
+    def _adaptation(prompt: str) -> str:
+        # The numbered segments are the JSON list between these two markers of the adaptation prompt
+        body = prompt.split("ORIGINAL SEGMENTS (in English):", 1)[1].split("Return ONLY", 1)[0]
+        segments = json.loads(body.strip())
+        adapted = [{"id": item["id"], "adapted": f"[adapted] {item['text']}"} for item in segments]
+        return json.dumps({"segments": adapted})
+
+
+def load_llm_recording(paths: List[str]) -> Dict[str, Dict]:
+    """prompt_sha256 -> recorded {"response", "seconds"} from capture files (globs allowed)"""
+    recording = {}
+    for pattern in paths:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("type") == "llm":
+                        recording[record["prompt_sha256"]] = record
+    return recording
+
+
+class RecordedGenerativeModel(StandInGenerativeModel):
+    """Replays captured Gemini responses by prompt hash; unknown prompts fall back to the canned answers"""
+
+    def __init__(self, recording: Dict[str, Dict], model_name: str = "gemini-2.5-flash", latency_ms: float = None,
+                 on_lookup=None):
+        # latency_ms None: sleep for the recorded generation time (misses: the recorded median)
+        self.fixed_latency = latency_ms is not None
+        if latency_ms is None:
+            seconds = sorted(record.get("seconds", 0.0) for record in recording.values())
+            latency_ms = seconds[len(seconds) // 2] * 1000 if seconds else 0.0
+        super().__init__(model_name, latency_ms=latency_ms, jitter=0.0)
+        self.recording = recording
+        self._on_lookup = on_lookup
+
+    def generate_content(self, prompt: str, **kwargs) -> types.SimpleNamespace:
+        record = self.recording.get(hashlib.sha256(prompt.encode()).hexdigest())
+        if self._on_lookup is not None:
+            self._on_lookup(record is not None)
+        if record is None:
+            return super().generate_content(prompt, **kwargs)
+        _sleep_ms(self.latency_ms if self.fixed_latency else record.get("seconds", 0.0) * 1000)
+        return types.SimpleNamespace(text=record["response"])
+
+
+def install(firestore_ms: float = None, gemini_ms: float = None, llm_recording: List[str] = None) -> InMemoryFirestore:
+    """Route firebase_admin and google.generativeai to the stand-ins (call before the API starts up)"""
+    import firebase_admin
+    import google.generativeai as genai
+    from firebase_admin import credentials, firestore
+
+    client = InMemoryFirestore(firestore_ms)
+    credentials.Certificate = lambda path: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: client
+
+    # Keep async jobs, results and stand-in adaptations out of the real databases
+    scratch = tempfile.mkdtemp(prefix="hiv-standin-")
+    os.environ.setdefault("HIV_JOB_QUEUE_PATH", os.path.join(scratch, "jobs.sqlite3"))
+    os.environ.setdefault("HIV_TRANSLATION_MEMORY_PATH", os.path.join(scratch, "translation_memory.sqlite3"))
+    os.environ.setdefault("HIV_RESULT_STORE_PATH", os.path.join(scratch, "results.sqlite3"))
+
+    genai.configure = lambda *args, **kwargs: None
+    if llm_recording:
+        recording = load_llm_recording(llm_recording)
+        print(f"📼 Serving {len(recording)} recorded Gemini responses")
+        on_lookup = None
+        try:
+            # Hit/miss counts on /metrics (the replay reads them); builds without the registry just skip this
+            from backend.metrics import REGISTRY
+            lookups = REGISTRY.counter("hiv_standin_llm_replay_total", "Replayed Gemini prompts", ["outcome"])
+            on_lookup = lambda hit: lookups.inc(outcome="hit" if hit else "miss")
+        except ImportError:
+            pass
+        genai.GenerativeModel = lambda model_name="gemini-2.5-flash", **kwargs: RecordedGenerativeModel(
+            recording, model_name, gemini_ms, on_lookup
+        )
+    else:
+        genai.GenerativeModel = lambda model_name="gemini-2.5-flash", **kwargs: StandInGenerativeModel(model_name, gemini_ms)
+    os.environ.setdefault("GEMINI_API_KEY", "stand-in")
+    return client
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve api/api.py on in-memory Firestore and a simulated Gemini")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--firestore-ms", type=float, default=None, help="Latency per Firestore operation")
+    parser.add_argument("--gemini-ms", type=float, default=None,
+                        help="Median Gemini generation time (with --llm-recording: fixed, instead of the recorded times)")
+    parser.add_argument("--llm-recording", action="append", help="Capture file(s) to serve Gemini responses from")
+    parser.add_argument("--app-dir", help="Checkout whose api/api.py is served (default: this one)")
+    args = parser.parse_args()
+
+    if args.app_dir:
+        sys.path.insert(0, os.path.abspath(args.app_dir))
+    install(args.firestore_ms, args.gemini_ms, args.llm_recording)
+
+    import uvicorn
+    from api.api import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""HIVPreventionSystem.batch_process: input order, duplicates, per-user errors and parity with predict (rule-based planner)"""
+
+import pytest
+
+from backend.backend import HIVPreventionSystem
+from backend.warmup import synthetic_inputs
+
+
+@pytest.fixture(scope="module")
+def system(tmp_path_factory):
+    with pytest.MonkeyPatch.context() as patch:
+        # No Gemini: plans come from the rule-based planner, adaptation from the localized bundles
+        patch.delenv("GEMINI_API_KEY", raising=False)
+        patch.delenv("HIV_RESULT_STORE_PATH", raising=False)
+        patch.setenv("HIV_TRANSLATION_MEMORY_PATH",
+                     str(tmp_path_factory.mktemp("tm") / "translation_memory.sqlite3"))
+        yield HIVPreventionSystem()
+
+
+def without_timestamp(prediction):
+    return {key: value for key, value in prediction.items() if key != "timestamp"}
+
+
+def test_batch_process(system):
+    inputs = synthetic_inputs(system.risk_predictor.scoring_system.feature_info, 5)
+    inputs[1] = dict(inputs[1], preferred_language="si")
+    malformed = dict(inputs[2], q1="not a number")
+    users = [inputs[0], inputs[1], malformed, inputs[3], inputs[0], inputs[4], inputs[3]]
+
+    batch = system.batch_process(users)
+    results = batch["results"]
+
+    assert len(results) == len(users)
+    assert batch["unique_inputs"] == 5
+    assert (batch["users_succeeded"], batch["users_failed"]) == (6, 1)
+
+    # The malformed user gets its own error; the rest of the batch is unaffected
+    assert results[2] == {"success": False, "input_index": 2, "error": "Non-numeric answer for: q1"}
+
+    # Duplicates map to the same result
+    assert results[4] == results[0]
+    assert results[6] == results[3]
+    assert len({results[i]["result_id"] for i in (0, 1, 3, 5)}) == 4
+
+    # Input order is kept and the batched XGBoost/scoring path matches single-user predict
+    for position in (0, 1, 3, 4, 5, 6):
+        single = system.risk_predictor.predict(users[position])
+        assert without_timestamp(results[position]["risk_prediction"]) == without_timestamp(single)
+        assert results[position]["intervention_plan"]
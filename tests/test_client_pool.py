@@ -0,0 +1,74 @@
+"""ClientPool: concurrency limit and one health check per pool (not per client)"""
+
+import itertools
+
+import pytest
+
+from backend.client_pool import ClientPool
+
+
+class Checks:
+    """Health check that records the clients it was called with and fails on demand"""
+
+    def __init__(self):
+        self.checked = []
+        self.fail = False
+
+    def __call__(self, client):
+        self.checked.append(client)
+        if self.fail:
+            raise ConnectionError("unreachable")
+
+
+def make_pool(checks, size=8, interval=300.0):
+    ids = itertools.count()
+    return ClientPool("test", lambda: next(ids), size=size, health_check=checks,
+                      health_check_interval=interval, acquire_timeout=0.1)
+
+
+def test_warm_up_checks_one_client():
+    checks = Checks()
+    pool = make_pool(checks)
+
+    assert pool.warm_up() is True
+    assert len(checks.checked) == 1
+
+    checks.fail = True
+    assert pool.warm_up() is False
+    assert pool.stats()["failed_health_checks"] == 1
+
+
+def test_at_most_one_check_per_interval():
+    checks = Checks()
+    pool = make_pool(checks, size=4, interval=3600)
+    for _ in range(20):
+        with pool.acquire():
+            pass
+    assert checks.checked == []
+
+    pool.health_check_interval = 0.0
+    with pool.acquire(), pool.acquire():
+        pass
+    assert 1 <= len(checks.checked) <= 2  # each acquire may start a new interval, never one per client
+
+
+def test_failed_check_rebuilds_the_client():
+    checks = Checks()
+    pool = make_pool(checks, size=1, interval=0.0)
+    with pool.acquire() as client:
+        original = client
+    checks.fail = True
+
+    with pool.acquire() as client:
+        assert client != original
+    assert pool.stats()["replacements"] == 1
+
+
+def test_size_limits_concurrent_calls():
+    pool = make_pool(Checks(), size=2)
+    with pool.acquire(), pool.acquire():
+        assert pool.stats()["in_use"] == 2
+        with pytest.raises(RuntimeError):
+            with pool.acquire():
+                pass
+    assert pool.stats()["in_use"] == 0
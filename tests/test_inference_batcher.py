@@ -0,0 +1,122 @@
+"""InferenceBatcher: per-caller results, error fan-out, no window for a lone caller and model-only timing"""
+
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+import pytest
+
+from backend.inference_batcher import InferenceBatcher
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CountingModel:
+    """Wraps a model and records the number of rows of every predict_proba call"""
+
+    def __init__(self, model, delay: float = 0.0):
+        self.model = model
+        self.delay = delay
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(len(X))
+        time.sleep(self.delay)
+        return self.model.predict_proba(X)
+
+
+class FailingModel:
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(len(X))
+        time.sleep(self.delay)
+        raise RuntimeError("model exploded")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(os.path.join(BASE_DIR, "models", "hiv_risk_model.pkl"))
+
+
+def run_concurrently(batcher, rows):
+    """predict_proba for every row from its own thread, all released at once"""
+    barrier = threading.Barrier(len(rows))
+    results, errors = [None] * len(rows), [None] * len(rows)
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = batcher.predict_proba(rows[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(rows))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results, errors
+
+
+def test_concurrent_callers_get_their_own_rows(model):
+    rng = np.random.default_rng(7)
+    n_features = model.n_features_in_
+    rows = [rng.integers(1, 6, size=(1, n_features)).astype(float) for _ in range(24)]
+    counting = CountingModel(model, delay=0.02)
+    batcher = InferenceBatcher(counting, window_ms=50, max_batch=8)
+
+    results, errors = run_concurrently(batcher, rows)
+
+    assert errors == [None] * len(rows)
+    for row, probabilities in zip(rows, results):
+        np.testing.assert_allclose(probabilities, model.predict_proba(row)[0], rtol=1e-6)
+    assert sum(counting.calls) == len(rows)
+    assert max(counting.calls) > 1  # requests really were batched
+    assert max(counting.calls) <= 8
+
+
+def test_model_error_reaches_every_caller_in_the_batch():
+    failing = FailingModel()
+    batcher = InferenceBatcher(failing, window_ms=50, max_batch=16)
+    rows = [np.full((1, 3), float(i)) for i in range(6)]
+
+    results, errors = run_concurrently(batcher, rows)
+
+    assert results == [None] * len(rows)
+    assert all(isinstance(error, RuntimeError) and "model exploded" in str(error) for error in errors)
+    assert sum(failing.calls) == len(rows)
+    # The batcher recovers: the next caller leads a fresh batch
+    with pytest.raises(RuntimeError):
+        batcher.predict_proba(rows[0])
+
+
+def test_single_caller_does_not_wait_for_the_window(model):
+    row = np.full((1, model.n_features_in_), 2.0)
+    batcher = InferenceBatcher(CountingModel(model), window_ms=500, max_batch=32)
+    batcher.predict_proba(row)  # first call pays any one-off model setup
+
+    started = time.perf_counter()
+    probabilities = batcher.predict_proba(row)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.1
+    np.testing.assert_allclose(probabilities, model.predict_proba(row)[0], rtol=1e-6)
+
+
+def test_model_time_excludes_the_batching_window(model):
+    row = np.full((1, model.n_features_in_), 2.0)
+    batcher = InferenceBatcher(CountingModel(model, delay=0.02), window_ms=300, max_batch=8)
+    batcher._in_flight = 1  # another prediction is in flight, so the leader holds the window open
+
+    started = time.perf_counter()
+    probabilities, seconds = batcher.predict_proba_timed(row)
+    elapsed = time.perf_counter() - started
+
+    assert elapsed >= 0.3
+    assert 0.02 <= seconds < 0.1  # only the model call
+    np.testing.assert_allclose(probabilities, model.predict_proba(row)[0], rtol=1e-6)
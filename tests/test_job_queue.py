@@ -0,0 +1,142 @@
+"""JobQueue leases, retries and purge, and JobWorkerPool resilience (SQLite file under tmp_path)"""
+
+import threading
+import time
+
+import pytest
+
+from backend.job_queue import JobQueue, JobWorkerPool
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def row(queue, job_id):
+    return queue._conn.execute(
+        "SELECT status, result, error, attempts, worker_id, available_at, lease_expires_at FROM jobs WHERE id = ?",
+        (job_id,)
+    ).fetchone()
+
+
+def test_stale_worker_cannot_complete_or_fail(queue_path):
+    queue = JobQueue(queue_path, lease_seconds=60)
+    job_id = queue.enqueue({"n": 1})
+    assert queue.claim("w1")["id"] == job_id
+    # w1's lease runs out and w2 takes the job over
+    queue._conn.execute("UPDATE jobs SET lease_expires_at = 0 WHERE id = ?", (job_id,))
+    assert queue.claim("w2")["id"] == job_id
+    before = row(queue, job_id)
+
+    assert queue.complete(job_id, {"from": "w1"}, "w1") is False
+    assert queue.fail(job_id, "late failure", "w1") == "lease_lost"
+    assert row(queue, job_id) == before
+
+    assert queue.complete(job_id, {"from": "w2"}, "w2") is True
+    assert queue.get(job_id)["result"] == {"from": "w2"}
+    # A failure arriving after the job finished does not reopen it
+    assert queue.fail(job_id, "late failure", "w2") == "lease_lost"
+    assert queue.get(job_id)["status"] == "succeeded"
+
+
+def test_lease_renewal_keeps_long_handler_job(queue_path):
+    runs = []
+
+    def handler(payload):
+        runs.append(payload)
+        time.sleep(4)
+        return {"ok": True}
+
+    # Two pools (two processes' worth) on one file; the job runs far longer than its lease
+    first = JobWorkerPool(JobQueue(queue_path, lease_seconds=1.5), handler, workers=1, poll_interval=0.05)
+    second = JobWorkerPool(JobQueue(queue_path, lease_seconds=1.5), handler, workers=1, poll_interval=0.05)
+    first.start()
+    try:
+        job_id = first.job_queue.enqueue({"n": 1})
+        assert wait_for(lambda: runs)
+        second.start()
+        job = first.job_queue.wait(job_id, timeout=15)
+    finally:
+        first.stop()
+        second.stop()
+    assert job["status"] == "succeeded"
+    assert job["attempts"] == 1
+    assert len(runs) == 1
+
+
+def test_retry_backoff_until_max_attempts(queue_path):
+    queue = JobQueue(queue_path, max_attempts=3, retry_backoff_seconds=0.2)
+    job_id = queue.enqueue({"n": 1})
+    delays = []
+    for attempt in range(1, 4):
+        job = queue.claim("w")
+        assert job["id"] == job_id and job["attempt"] == attempt
+        failed_at = time.time()
+        status = queue.fail(job_id, f"boom {attempt}", "w")
+        if attempt < 3:
+            assert status == "queued"
+            delays.append(row(queue, job_id)[5] - failed_at)
+            # Not runnable before the backoff has passed
+            assert queue.claim("w") is None
+            queue._conn.execute("UPDATE jobs SET available_at = 0 WHERE id = ?", (job_id,))
+        else:
+            assert status == "failed"
+    assert delays[0] == pytest.approx(0.2, abs=0.05)
+    assert delays[1] == pytest.approx(0.4, abs=0.05)
+    job = queue.get(job_id)
+    assert job["status"] == "failed" and job["attempts"] == 3 and job["error"] == "boom 3"
+    assert queue.claim("w") is None
+
+
+def test_purge_deletes_only_old_finished_jobs(queue_path):
+    queue = JobQueue(queue_path, max_attempts=1)
+    succeeded, failed, recent, queued = (queue.enqueue({"n": n}) for n in range(4))
+    for job_id in (succeeded, failed, recent):
+        assert queue.claim("w")["id"] == job_id
+        if job_id == failed:
+            queue.fail(job_id, "boom", "w")
+        else:
+            queue.complete(job_id, {"ok": True}, "w")
+    queue._conn.execute("UPDATE jobs SET updated_at = 0 WHERE id IN (?, ?, ?)", (succeeded, failed, queued))
+
+    assert queue.purge(older_than_seconds=3600) == 2
+    assert queue.get(succeeded) is None and queue.get(failed) is None
+    assert queue.get(queued)["status"] == "queued"
+    assert queue.get(recent)["status"] == "succeeded"
+
+
+def test_worker_thread_survives_handler_and_storage_errors(queue_path):
+    def handler(payload):
+        if payload["kind"] == "raise":
+            raise RuntimeError("handler broke")
+        if payload["kind"] == "unstorable":
+            return {"value": object()}  # not JSON serializable: complete() raises
+        return {"ok": True}
+
+    queue = JobQueue(queue_path, max_attempts=1)
+    pool = JobWorkerPool(queue, handler, workers=1, poll_interval=0.05)
+    pool.start()
+    try:
+        raised = queue.enqueue({"kind": "raise"})
+        unstorable = queue.enqueue({"kind": "unstorable"})
+        fine = queue.enqueue({"kind": "fine"})
+        results = {job_id: queue.wait(job_id, timeout=10) for job_id in (raised, unstorable, fine)}
+        workers = [thread for thread in pool._threads if thread.name.startswith("job-worker")]
+        assert all(thread.is_alive() for thread in workers)
+    finally:
+        pool.stop()
+    assert results[raised]["status"] == "failed"
+    assert "handler broke" in results[raised]["error"]
+    assert results[unstorable]["status"] == "failed"
+    assert results[unstorable]["error"].startswith("Result could not be stored")
+    assert results[fine]["status"] == "succeeded"
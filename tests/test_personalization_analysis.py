@@ -0,0 +1,82 @@
+"""PersonalizationAnalyzer vs the original pairwise _compare_users/_analyze_personalization baseline"""
+
+import random
+
+import pytest
+
+from backend.backend import HIVPreventionSystem
+from backend.personalization_analysis import PersonalizationAnalyzer, StreamingPersonalizationStats
+
+INTERVENTIONS = [f"Intervention {i}" for i in range(8)]
+FEATURES = [f"q{i}" for i in range(6)]
+SUMMARY_FIELDS = ("total_comparisons", "same_stage_comparisons", "truly_personalized", "personalization_rate")
+
+
+def population(n, seed=3):
+    """Fixed population of process_user-shaped results with overlapping plans and factors"""
+    rng = random.Random(seed)
+    results = []
+    for i in range(n):
+        plan = rng.sample(INTERVENTIONS, rng.randint(1, 5))
+        # Duplicate names within a plan count once, as in the set-based baseline
+        plan.append(plan[0])
+        results.append({
+            "user_id": f"user-{i}",
+            "risk_prediction": {
+                "risk_stage": rng.randrange(4),
+                "personalized_factors": [{"feature": feature} for feature in rng.sample(FEATURES, 4)],
+            },
+            "intervention_plan": {"personalized_plan": [{"name": name} for name in plan]},
+        })
+    return results
+
+
+def baseline(results):
+    """The O(n^2) loop batch_process ran before the vectorized analyzer"""
+    comparisons = [
+        HIVPreventionSystem._compare_users(None, results[i], results[j])
+        for i in range(len(results)) for j in range(i + 1, len(results))
+    ]
+    return HIVPreventionSystem._analyze_personalization(None, comparisons), comparisons
+
+
+@pytest.fixture(scope="module")
+def results():
+    return population(120)
+
+
+def test_exact_mode_matches_the_baseline(results):
+    expected_analysis, expected_comparisons = baseline(results)
+
+    analysis, comparisons = PersonalizationAnalyzer(block_rows=32).analyze(results, include_pairwise=True)
+
+    assert analysis["method"] == "exact"
+    for field in SUMMARY_FIELDS:
+        assert analysis[field] == expected_analysis[field]
+    assert analysis["analysis"] == expected_analysis["analysis"]
+    assert comparisons == expected_comparisons
+
+
+def test_streaming_stats_match_the_baseline(results):
+    expected_analysis, _ = baseline(results)
+    stats = StreamingPersonalizationStats()
+    for result in results:
+        stats.add(result)
+
+    summary = stats.summary()
+
+    assert summary["method"] == "exact_streaming"
+    for field in SUMMARY_FIELDS:
+        assert summary[field] == expected_analysis[field]
+
+
+def test_sampled_mode_stays_close_to_the_exact_rate():
+    results = population(600, seed=11)
+    exact, _ = PersonalizationAnalyzer().analyze(results)
+
+    sampled, comparisons = PersonalizationAnalyzer(max_exact_pairs=0, sample_pairs=20_000).analyze(results)
+
+    assert comparisons is None
+    assert sampled["method"].startswith("minhash_sample")
+    assert sampled["same_stage_comparisons"] == exact["same_stage_comparisons"]
+    assert abs(sampled["personalization_rate"] - exact["personalization_rate"]) < 0.02
@@ -0,0 +1,86 @@
+"""ResultStore retention (count-based eviction and TTL) and plan replacement"""
+
+import pytest
+
+from backend.result_store import ResultStore
+
+
+def result(result_id, plan="original"):
+    return {"result_id": result_id, "intervention_plan": {"plan": plan}, "system_metadata": {"source": "test"}}
+
+
+def age(store, result_id, seconds):
+    """Pretend a result was last written `seconds` earlier"""
+    store._conn.execute("UPDATE results SET updated_at = updated_at - ? WHERE result_id = ?", (seconds, result_id))
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "results.sqlite3")
+
+
+def test_defaults_to_process_private_memory(monkeypatch):
+    monkeypatch.delenv("HIV_RESULT_STORE_PATH", raising=False)
+    store = ResultStore()
+    assert store.path == ":memory:"
+    store.put("r1", result("r1"))
+    assert store.get("r1")["intervention_plan"] == {"plan": "original"}
+
+
+def test_evicts_least_recently_written_beyond_max_entries(store_path, monkeypatch):
+    monkeypatch.setattr(ResultStore, "EVICT_EVERY", 1)
+    store = ResultStore(store_path, max_entries=3)
+    for i in range(5):
+        store.put(f"r{i}", result(f"r{i}"))
+    assert [store.get(f"r{i}") is not None for i in range(5)] == [False, False, True, True, True]
+    # Rewriting r2 makes it the most recent, so r3 goes next
+    store.put("r2", result("r2"))
+    store.put("r5", result("r5"))
+
+    assert len(store) == 3
+    assert [store.get(f"r{i}") is not None for i in range(6)] == [False, False, True, False, True, True]
+
+
+def test_replace_plan_on_evicted_result_does_not_resurrect_it(store_path, monkeypatch):
+    monkeypatch.setattr(ResultStore, "EVICT_EVERY", 1)
+    store = ResultStore(store_path, max_entries=1)
+    store.put("old", result("old"))
+    store.put("new", result("new"))
+
+    assert store.replace_plan("old", {"plan": "adapted"}, is_provisional=False) is False
+    assert store.get("old") is None
+    assert len(store) == 1
+
+    assert store.replace_plan("new", {"plan": "adapted"}, is_provisional=False) is True
+    replaced = store.get("new")
+    assert replaced["intervention_plan"] == {"plan": "adapted"}
+    assert replaced["system_metadata"] == {"source": "test", "is_provisional": False}
+
+
+def test_expired_results_are_deleted_on_get_and_eviction(store_path, monkeypatch):
+    monkeypatch.setattr(ResultStore, "EVICT_EVERY", 2)
+    store = ResultStore(store_path, ttl_seconds=60)
+    store.put("expired", result("expired"))
+    store.put("stale", result("stale"))
+    age(store, "expired", 120)
+    age(store, "stale", 120)
+
+    # get deletes the row, it does not just hide it
+    assert store.get("expired") is None
+    assert len(store) == 1
+    assert store.replace_plan("stale", {"plan": "adapted"}) is False
+
+    # The next eviction pass removes the expired rows nobody asked for
+    store.put("fresh", result("fresh"))
+    store.put("fresh2", result("fresh2"))
+    assert len(store) == 2
+    assert store.get("fresh") is not None
+
+
+def test_expired_results_from_a_previous_run_are_purged_on_open(store_path):
+    store = ResultStore(store_path, ttl_seconds=60)
+    store.put("r1", result("r1"))
+    age(store, "r1", 120)
+    store.close()
+
+    assert len(ResultStore(store_path, ttl_seconds=60)) == 0
@@ -0,0 +1,91 @@
+"""ShadowEvaluator: agreement/confusion accounting, column matching and dropping when the queue is full"""
+
+import threading
+import time
+
+import numpy as np
+
+from backend.shadow_model import SHADOW_DROPPED, ShadowEvaluator
+
+
+class StageModel:
+    """Candidate whose stage is the value of its first feature column (one-hot probabilities)"""
+
+    def __init__(self):
+        self.seen = []
+
+    def predict_proba(self, X):
+        self.seen.append(np.array(X))
+        return np.eye(4)[X[:, 0].astype(int)]
+
+
+class BlockingModel(StageModel):
+    """StageModel that holds the shadow thread until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def predict_proba(self, X):
+        self.entered.set()
+        self.release.wait(10)
+        return super().predict_proba(X)
+
+
+def wait_for_rows(evaluator, rows, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if evaluator.stats()["rows_compared"] >= rows:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_agreement_and_confusion_accounting():
+    candidate = StageModel()
+    # The candidate reads serving column "b" only
+    evaluator = ShadowEvaluator(candidate, ["a", "b"], ["b"], batch_size=64)
+    serving_stages = np.array([0, 1, 2, 3, 3, 1])
+    candidate_stages = np.array([0, 1, 2, 3, 2, 0])
+    features = np.column_stack([np.full(6, 9.0), candidate_stages.astype(float)])
+    serving = np.eye(4)[serving_stages]
+
+    evaluator.submit(features[:4], serving[:4], 0.002)
+    evaluator.submit(features[4:], serving[4:], 0.005)
+    assert wait_for_rows(evaluator, 6)
+
+    stats = evaluator.stats()
+    assert stats["rows_compared"] == 6
+    assert stats["stage_agreement"] == round(4 / 6, 4)
+    expected = np.zeros((4, 4), dtype=int)
+    np.add.at(expected, (serving_stages, candidate_stages), 1)
+    assert stats["confusion_matrix"] == expected.tolist()
+    # One-hot rows: disagreement means a full probability swap
+    assert stats["max_probability_delta"] == 1.0
+    assert stats["mean_max_probability_delta"] == round(2 / 6, 4)
+    # Per-row serving time, weighted by rows
+    assert stats["serving_ms_per_row"] == round((4 * 0.002 + 2 * 0.005) / 6 * 1000, 4)
+    assert all(seen.shape[1] == 1 for seen in candidate.seen)
+
+
+def test_full_queue_drops_rows_without_blocking():
+    candidate = BlockingModel()
+    evaluator = ShadowEvaluator(candidate, ["stage"], queue_size=2, batch_size=1)
+    row = np.zeros((1, 1))
+    probabilities = np.eye(4)[[0]]
+    dropped_before = SHADOW_DROPPED.value(reason="queue_full")
+
+    evaluator.submit(row, probabilities, 0.001)
+    assert candidate.entered.wait(5)  # the shadow thread is busy with the first row
+    started = time.perf_counter()
+    evaluator.submit(row, probabilities, 0.001)
+    evaluator.submit(row, probabilities, 0.001)
+    evaluator.submit(np.zeros((3, 1)), np.eye(4)[[0, 0, 0]], 0.001)  # queue full: all 3 rows dropped
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 0.1
+    assert SHADOW_DROPPED.value(reason="queue_full") == dropped_before + 3
+    candidate.release.set()
+    assert wait_for_rows(evaluator, 3)
+    assert evaluator.stats()["rows_compared"] == 3
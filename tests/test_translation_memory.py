@@ -0,0 +1,60 @@
+"""TranslationMemory: buffered recency/hit updates and LRU eviction"""
+
+import sqlite3
+
+import pytest
+
+from backend.translation_memory import TranslationMemory
+
+
+@pytest.fixture
+def memory_path(tmp_path):
+    return str(tmp_path / "translation_memory.sqlite3")
+
+
+def hits(path, source):
+    """Hit count as another process would see it"""
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT hits FROM segments WHERE source = ?", (source,)).fetchone()[0]
+
+
+def test_lookups_do_not_write_until_flushed(memory_path):
+    memory = TranslationMemory(memory_path, flush_interval=3600)
+    memory.store_many({"hello": "ayubowan"}, "si", "default")
+
+    for _ in range(3):
+        assert memory.lookup_many(["hello", "missing"], "si", "default") == {"hello": "ayubowan"}
+    assert hits(memory_path, "hello") == 0
+
+    memory.flush()
+    assert hits(memory_path, "hello") == 3
+
+
+def test_lookups_flush_after_the_interval(memory_path):
+    memory = TranslationMemory(memory_path, flush_interval=0)
+    memory.store_many({"hello": "vanakkam"}, "ta", "default")
+
+    memory.lookup_many(["hello"], "ta", "default")
+    assert hits(memory_path, "hello") == 1
+
+
+def test_eviction_sees_buffered_recency(memory_path):
+    memory = TranslationMemory(memory_path, max_entries=2, flush_interval=3600)
+    memory.store_many({"old": "a"}, "si", "default")
+    memory.store_many({"used": "b"}, "si", "default")
+    # "old" is read after "used" was written, so "used" is now the least recently used
+    memory.lookup_many(["old"], "si", "default")
+
+    memory.store_many({"new": "c"}, "si", "default")
+
+    assert memory.lookup_many(["old", "used", "new"], "si", "default") == {"old": "a", "new": "c"}
+    assert len(memory) == 2
+
+
+def test_close_writes_buffered_updates(memory_path):
+    memory = TranslationMemory(memory_path, flush_interval=3600)
+    memory.store_many({"hello": "ayubowan"}, "si", "default")
+    memory.lookup_many(["hello"], "si", "default")
+    memory.close()
+
+    assert hits(memory_path, "hello") == 1
@@ -0,0 +1,55 @@
+"""Warm-up traffic stays out of the shadow model stats and the micro-batch size metric"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from backend.backend import preload_shared_components
+from backend.inference_batcher import BATCH_SIZE
+from backend.warmup import synthetic_inputs, warm_up_system
+
+
+class RecordingShadow:
+    """Stands in for ShadowEvaluator and keeps every submitted batch"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, features, serving_probabilities, serving_seconds_per_row):
+        self.submitted.append(len(features))
+
+
+@pytest.fixture
+def predictor(monkeypatch):
+    predictor = preload_shared_components()["risk_predictor"]
+    monkeypatch.setattr(predictor, "shadow", RecordingShadow())
+    return predictor
+
+
+def batch_size_count():
+    snapshot = BATCH_SIZE.snapshot()
+    return snapshot["count"] if snapshot else 0
+
+
+def test_warm_up_predictions_are_not_recorded(predictor):
+    system = SimpleNamespace(risk_predictor=predictor, fallback_planner=None, localized_content=None,
+                             translation_memory=None, planner_pool=None, adaptor_pool=None)
+    batches_before = batch_size_count()
+
+    statuses = warm_up_system(system, samples=8)
+
+    assert statuses["model"]["status"] == "ok"
+    assert predictor.shadow.submitted == []
+    assert batch_size_count() == batches_before
+
+
+def test_served_predictions_are_recorded(predictor):
+    inputs = synthetic_inputs(predictor.scoring_system.feature_info, 3)
+    batches_before = batch_size_count()
+
+    predictor.predict(inputs[0])
+    predictions, errors = predictor.predict_batch(inputs)
+
+    assert errors == [None] * len(inputs)
+    assert predictor.shadow.submitted == [1, len(inputs)]
+    assert batch_size_count() == batches_before + 1